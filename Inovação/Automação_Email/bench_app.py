@@ -0,0 +1,236 @@
+"""Roteiro de uso do email_deploy.py contra o fake_google.py, sem rede
+
+Roda o app com o AppTest do Streamlit, executa as ações de um usuário e mede,
+para cada uma, o tempo do rerun e quantas requisições/chamadas de API ela
+gerou. Uma ação que termina com erro na tela (st.error ou envio que falhou)
+interrompe o roteiro. Com --check, sai com erro se alguma ação ficar fora da
+faixa de chamadas esperada (call_budget): acima pega regressões no volume de
+chamadas, abaixo pega ações que deixaram de chamar a API.
+
+Uso: python bench_app.py --eventos 300 --reruns 5 --check
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from google.oauth2.credentials import Credentials
+from streamlit.testing.v1 import AppTest
+
+from fake_google import FakeGoogle, fake_id_token, make_events, USER_EMAIL
+from google_services import SCOPES
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_deploy.py")
+BATCH_MEETINGS = 10
+CALENDARS = 2  # Principal + a agenda compartilhada do fake_google
+BATCH_LABEL = "Reuniões (convidados externos ainda não confirmados de cada uma):"
+
+
+def call_budget(event_pages: int):
+    """Faixa (mínimo, máximo) de requisições HTTP e de chamadas de API por ação
+
+    Abrir o app: token, getProfile + sendAs (perfil), calendarList, as páginas
+    do events.list de cada agenda e o getProfile que marca o início do
+    histórico de respostas. Os reruns seguintes devem sair inteiros do cache.
+    """
+    first_sync = CALENDARS * event_pages
+    open_app = (5 + first_sync, 5 + first_sync)
+    return {
+        # ação: ((HTTP mín., HTTP máx.), (API mín., API máx.))
+        "abrir o app": (open_app, open_app),
+        "rerun sem ação": ((0, 0), (0, 0)),
+        "mudar para 7 dias": ((0, 0), (0, 0)),
+        "escolher reunião e convidados": ((0, 0), (0, 0)),
+        "enviar confirmação": ((1, 1), (1, 1)),
+        "enviar em lote": ((1, 1), (BATCH_MEETINGS, BATCH_MEETINGS)),
+        "atualizar agenda": ((CALENDARS, CALENDARS), (CALENDARS, CALENDARS)),
+    }
+
+
+def make_credentials(fake: FakeGoogle) -> Credentials:
+    """Credenciais já vencidas: o primeiro rerun passa pelo endpoint de token"""
+    creds = Credentials(
+        token="fake-access",
+        refresh_token="fake-refresh",
+        id_token=fake_id_token(USER_EMAIL),
+        token_uri=fake.token_uri,
+        client_id="bench",
+        client_secret="bench",
+        scopes=SCOPES,
+    )
+    creds.expiry = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    return creds
+
+
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+class Bench:
+    def __init__(self, fake: FakeGoogle):
+        self.fake = fake
+        self.results = []
+        self.at = AppTest.from_file(APP_PATH, default_timeout=120)
+        self.at.secrets["oauth"] = {
+            "client_id": "bench",
+            "client_secret": "bench",
+            "redirect_uris": ["http://localhost:8501"],
+        }
+        self.at.session_state["creds"] = make_credentials(fake)
+
+    def errors(self):
+        """Erros visíveis na tela: st.error e linhas de envio que falharam"""
+        errors = [element.value for element in self.at.error]
+        for table in self.at.dataframe:
+            frame = table.value
+            if "Status" in frame.columns:
+                failed = frame[frame["Status"] != "✅ enviado"]
+                errors += [
+                    f"{row['Reunião']}: {row['Erro']}" for _, row in failed.iterrows()
+                ]
+        return errors
+
+    def measure(self, action, step):
+        """Executa step() (que termina num rerun) e registra tempo e chamadas"""
+        http_before, api_before = self.fake.snapshot()
+        started = time.perf_counter()
+        step()
+        elapsed = time.perf_counter() - started
+        http_after, api_after = self.fake.snapshot()
+        if self.at.exception:
+            raise RuntimeError(f"{action}: {self.at.exception[0].message}")
+        errors = self.errors()
+        if errors:
+            shown = "; ".join(errors[:3])
+            raise RuntimeError(f"{action}: {len(errors)} erro(s) na tela: {shown}")
+        http = http_after - http_before
+        api = api_after - api_before
+        self.results.append(
+            {
+                "action": action,
+                "seconds": elapsed,
+                "http_requests": sum(http.values()),
+                "api_calls": sum(api.values()),
+                "by_method": dict(api),
+            }
+        )
+
+    def run(self, reruns: int):
+        at = self.at
+        self.measure("abrir o app", at.run)
+
+        rerun_times = []
+        for _ in range(reruns):
+            self.measure("rerun sem ação", at.run)
+            rerun_times.append(self.results.pop())
+        median = statistics.median(r["seconds"] for r in rerun_times)
+        self.results.append(
+            {
+                **rerun_times[-1],
+                "seconds": median,
+                "http_requests": max(r["http_requests"] for r in rerun_times),
+                "api_calls": max(r["api_calls"] for r in rerun_times),
+            }
+        )
+
+        self.measure(
+            "mudar para 7 dias",
+            lambda: widget(at.radio, "Data:").set_value("Próximos 7 dias").run(),
+        )
+
+        def choose_guests():
+            event_box = widget(at.selectbox, "Evento:")
+            event_box.set_value(event_box.options[0]).run()
+            guests = widget(at.multiselect, "Convidados:")
+            guests.set_value(guests.options[:1]).run()
+
+        self.measure("escolher reunião e convidados", choose_guests)
+        self.measure(
+            "enviar confirmação", lambda: widget(at.button, "Enviar").click().run()
+        )
+
+        def send_batch():
+            # A confirmação anterior muda o padrão do multiselect, e com ele a
+            # identidade do widget: sem este rerun a seleção abaixo se perderia
+            at.run()
+            # O padrão já traz só as reuniões com convidados pendentes
+            chosen = widget(at.multiselect, BATCH_LABEL).value[:BATCH_MEETINGS]
+            widget(at.multiselect, BATCH_LABEL).set_value(chosen).run()
+            selected = widget(at.multiselect, BATCH_LABEL).value
+            if selected != chosen:
+                raise RuntimeError(
+                    f"enviar em lote: seleção não aplicada ({len(selected)} "
+                    f"reuniões marcadas em vez de {len(chosen)})"
+                )
+            widget(at.button, "Enviar em lote").click().run()
+            sent = at.success[-1].value if at.success else ""
+            if not sent.startswith(f"{BATCH_MEETINGS}/{BATCH_MEETINGS} "):
+                raise RuntimeError(f"enviar em lote: {sent or 'sem resultado'}")
+
+        self.measure("enviar em lote", send_batch)
+
+        self.fake.touch_event(next(iter(self.fake.events)), summary="Reunião remarcada")
+        self.measure(
+            "atualizar agenda",
+            lambda: widget(at.button, "🔄 Atualizar agenda").click().run(),
+        )
+        return self.results
+
+
+def print_report(results, budget):
+    print(f"{'ação':<32}{'tempo (ms)':>12}{'HTTP':>7}{'API':>6}  esperado (HTTP/API)")
+    failures = []
+    for r in results:
+        (min_http, max_http), (min_api, max_api) = budget[r["action"]]
+        over = r["http_requests"] > max_http or r["api_calls"] > max_api
+        under = r["http_requests"] < min_http or r["api_calls"] < min_api
+        if over or under:
+            failures.append(r["action"])
+        flag = "  ← ACIMA" if over else "  ← ABAIXO" if under else ""
+        print(
+            f"{r['action']:<32}{r['seconds'] * 1000:>12.1f}{r['http_requests']:>7}"
+            f"{r['api_calls']:>6}  {min_http}-{max_http}/{min_api}-{max_api}{flag}"
+        )
+        if r["by_method"]:
+            detail = ", ".join(f"{k}={v}" for k, v in sorted(r["by_method"].items()))
+            print(f"{'':<32}  {detail}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eventos", type=int, default=300)
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--json", help="Salva os resultados neste arquivo")
+    parser.add_argument(
+        "--check", action="store_true", help="Falha se passar do orçamento"
+    )
+    args = parser.parse_args()
+
+    fake = FakeGoogle(make_events(args.eventos)).start()
+    fake.install()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ["CONFIRMACAO_CACHE_DIR"] = cache_dir
+        try:
+            results = Bench(fake).run(args.reruns)
+        finally:
+            fake.stop()
+
+    event_pages = max(1, math.ceil(args.eventos / fake.page_size_cap))
+    failures = print_report(results, call_budget(event_pages))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.check and failures:
+        print(f"Fora da faixa de chamadas: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+
+from event_cache import EventCache, event_sort_key
+from google_services import HTTP_TIMEOUT_SECONDS
+
+# --- Configurações ---
+# Agendas sincronizadas ao mesmo tempo (cada uma numa thread com conexão própria)
+MAX_PARALLEL_CALENDARS = 4
+
+_pool = ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_CALENDARS, thread_name_prefix="calendar-sync"
+)
+_thread_local = threading.local()
+
+
+def list_calendars(calendar_service) -> List[dict]:
+    """Agendas do usuário: [{"id", "summary", "primary", "selected"}], a principal primeiro"""
+    calendars = []
+    page_token = None
+    while True:
+        page = (
+            calendar_service.calendarList()
+            .list(pageToken=page_token, showHidden=False)
+            .execute()
+        )
+        for entry in page.get("items", []):
+            calendars.append(
+                {
+                    # A principal fica como "primary": mesmo cache do scheduler.py
+                    "id": "primary" if entry.get("primary") else entry["id"],
+                    "summary": entry.get("summaryOverride") or entry.get("summary", ""),
+                    "primary": entry.get("primary", False),
+                    "selected": entry.get("selected", False),
+                }
+            )
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+    return sorted(calendars, key=lambda c: (not c["primary"], c["summary"].lower()))
+
+
+def _thread_calendar_service(creds):
+    """Calendar com transporte próprio da thread (httplib2.Http não é thread-safe)"""
+    cached = getattr(_thread_local, "calendar", None)
+    if cached is None or cached[0] is not creds:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+        service = build(
+            "calendar", "v3", http=http, static_discovery=True, cache_discovery=False
+        )
+        cached = _thread_local.calendar = (creds, service)
+    return cached[1]
+
+
+def _sync_one(cache: EventCache, creds, force: bool):
+    cache.sync(_thread_calendar_service(creds), force=force)
+
+
+def sync_calendars(
+    caches: Iterable[EventCache], creds, force: bool = False
+) -> Dict[str, Optional[Exception]]:
+    """Sincroniza as agendas em paralelo; devolve {agenda: erro ou None}
+
+    O tempo total é o da agenda mais lenta, não a soma de todas.
+    """
+    futures = {
+        cache.calendar_id: _pool.submit(_sync_one, cache, creds, force)
+        for cache in caches
+    }
+    return {calendar_id: future.exception() for calendar_id, future in futures.items()}
+
+
+def merge_events(event_lists: Iterable[List[dict]]) -> List[dict]:
+    """Junta os eventos das agendas sem repetir a mesma reunião
+
+    Uma reunião que aparece em duas agendas tem o mesmo iCalUID; as ocorrências
+    de um evento recorrente também, por isso o início entra na chave. Fica a
+    cópia da primeira agenda (a principal).
+    """
+    merged = {}
+    for events in event_lists:
+        for event in events:
+            key = (event.get("iCalUID") or event["id"], event_sort_key(event))
+            merged.setdefault(key, event)
+    return sorted(merged.values(), key=event_sort_key)
@@ -0,0 +1,132 @@
+import base64
+import datetime
+from email.mime.text import MIMEText
+
+from event_cache import event_date
+
+# Convidados com este domínio são da casa e não recebem confirmação
+INTERNAL_DOMAIN = "@polijunior.com.br"
+
+# Identifica a mensagem padrão no registro de envios (ledger.py); mudar o
+# texto do modelo pede uma nova versão aqui
+CONFIRMATION_TEMPLATE = "confirmacao-padrao-v1"
+
+# Define a string do dia para a mensagem
+DIAS_SEMANA = [
+    "segunda-feira",
+    "terça-feira",
+    "quarta-feira",
+    "quinta-feira",
+    "sexta-feira",
+    "sábado",
+    "domingo",
+]
+
+
+def first_name_from_email(email):
+    return email.split("@")[0].split(".")[0].capitalize()
+
+
+# --- Agrupa convidados por evento ---
+def group_guests(events):
+    """{título: {"event", "guests": [(email, nome)]}} só com convidados externos"""
+    grouped = {}
+    for ev in events:
+        guests = [
+            att
+            for att in ev.get("attendees", [])
+            if not att["email"].endswith(INTERNAL_DOMAIN)
+        ]
+        if not guests:
+            continue
+        label = ev["summary"]
+        if label not in grouped:
+            grouped[label] = {"event": ev, "guests": []}
+        for att in guests:
+            # Tenta pegar o displayName, se não, o email, e se não, usa o nome do email
+            name = att.get("displayName", att.get("email", att["email"].split("@")[0]))
+            grouped[label]["guests"].append((att["email"], name))
+    return grouped
+
+
+# --- Agrupa por dia e depois por reunião ---
+def group_events_by_day(events):
+    """{dia: group_guests(eventos do dia)}, em ordem cronológica"""
+    by_day = {}
+    for ev in events:
+        by_day.setdefault(event_date(ev), []).append(ev)
+    return {
+        day: grouped
+        for day, day_events in sorted(by_day.items())
+        if (grouped := group_guests(day_events))
+    }
+
+
+# --- Saudação ---
+def build_greeting(emails):
+    """'Bom dia, Ana!', 'Bom dia, Ana e Bia!' ou 'Bom dia, Ana, Bia e Caio!'"""
+    first_names = [first_name_from_email(email) for email in emails]
+    if not first_names:
+        return "Bom dia!"
+    if len(first_names) == 1:
+        return f"Bom dia, {first_names[0]}!"
+    return f"Bom dia, {', '.join(first_names[:-1])} e {first_names[-1]}!"
+
+
+# --- Horário ---
+def format_horario(ev):
+    """'às 14h30' para eventos com horário, 'no dia dd/mm/aaaa' para dia inteiro"""
+    start_info = ev["start"]
+    # Verifica se é um evento de dia inteiro ('date') ou com horário específico ('dateTime')
+    if "dateTime" in start_info:
+        time_h = datetime.datetime.fromisoformat(
+            start_info["dateTime"].replace("Z", "+00:00")
+        ).strftime("%Hh%M")
+        return f"às {time_h}"
+    if "date" in start_info:
+        time_h = datetime.datetime.fromisoformat(start_info["date"]).strftime(
+            "%d/%m/%Y"
+        )
+        return f"no dia {time_h}"
+    return ""
+
+
+# --- Dia relativo ---
+def describe_day(data_evento, hoje):
+    """'hoje', 'amanhã', 'nesta/na próxima <dia>' ou 'no dia dd/mm/aaaa'"""
+    delta = (data_evento - hoje).days
+    if delta == 0:
+        return "hoje"
+    if delta == 1:
+        return "amanhã"
+    if 1 < delta < 7:
+        dia_semana_nome = DIAS_SEMANA[data_evento.weekday()]
+        # Mesma semana do ano: "nesta"; caso contrário "na próxima"
+        if hoje.isocalendar()[1] == data_evento.isocalendar()[1]:
+            return f"nesta {dia_semana_nome}"
+        return f"na próxima {dia_semana_nome}"
+    return f"no dia {data_evento.strftime('%d/%m/%Y')}"
+
+
+def default_body(ev, emails, hoje=None):
+    """Texto padrão da confirmação (sem a assinatura)"""
+    hoje = hoje or datetime.datetime.now().date()
+    dia_mensagem = describe_day(event_date(ev), hoje)
+    return (
+        f"{build_greeting(emails)}\nTudo bem?\n\n"
+        f"Gostaria de confirmar, tudo certo para nossa conversa {dia_mensagem} {format_horario(ev)}?\n\n"
+        "Nos vemos em breve!"
+    )
+
+
+def confirmation_subject(ev):
+    return f"Confirmação: {ev['summary']}"
+
+
+# --- MIME ---
+def build_raw_message(emails, subject, body, signature=""):
+    """Mensagem MIME em base64url, pronta para messages().send"""
+    mime = MIMEText(body + (signature or ""))  # A assinatura já vem com \n\n-- \n
+    mime["to"] = ", ".join(emails)
+    mime["subject"] = subject
+    return base64.urlsafe_b64encode(mime.as_bytes()).decode()
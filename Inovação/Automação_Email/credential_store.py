@@ -0,0 +1,54 @@
+import json
+import os
+from typing import Dict
+
+from google.oauth2.credentials import Credentials
+
+from event_cache import atomic_write_json
+
+
+class CredentialStore:
+    """Logins autorizados para o envio automático (um arquivo por usuário)
+
+    Os arquivos guardam o refresh token: ficam com permissão só do dono.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _filepath(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, key: str, creds: Credentials):
+        filepath = self._filepath(key)
+        atomic_write_json(filepath, json.loads(creds.to_json()))
+        os.chmod(filepath, 0o600)
+
+    def remove(self, key: str):
+        try:
+            os.remove(self._filepath(key))
+        except FileNotFoundError:
+            pass
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._filepath(key))
+
+    def load_all(self) -> Dict[str, Credentials]:
+        """{chave do usuário: credenciais} de todos os logins autorizados"""
+        if not os.path.isdir(self.directory):
+            return {}
+        loaded = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            try:
+                with open(
+                    os.path.join(self.directory, filename), encoding="utf-8"
+                ) as f:
+                    info = json.load(f)
+                creds = Credentials.from_authorized_user_info(info)
+            except (OSError, ValueError):
+                # Arquivo corrompido ou incompleto: ignora só este usuário
+                continue
+            loaded[filename[: -len(".json")]] = creds
+        return loaded
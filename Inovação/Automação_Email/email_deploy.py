@@ -1,23 +1,38 @@
 import streamlit as st
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from googleapiclient.errors import HttpError
-from email.mime.text import MIMEText
-import base64
 import datetime
-from bs4 import BeautifulSoup
+import os
 from google.auth.exceptions import RefreshError
+from event_cache import EventCache, cache_key
+from calendars import list_calendars, merge_events, sync_calendars
+from profile_cache import ProfileCache, credential_key, fetch_signature
+from google_services import SCOPES, build_services, credential_fingerprint
+from credential_store import CredentialStore
+from confirmation import (
+    CONFIRMATION_TEMPLATE,
+    DIAS_SEMANA,
+    build_raw_message,
+    confirmation_subject,
+    default_body,
+    group_events_by_day,
+)
+from ledger import SendLedger
+from replies import (
+    CONFIRMED,
+    DECLINED,
+    REPLIED,
+    UNANSWERED,
+    ReplyTracker,
+    meeting_status,
+)
+from sender import OutgoingMessage, send_batch
 
-# --- Escopos Google ---
-SCOPES = [
-    "openid",
-    "https://www.googleapis.com/auth/userinfo.email",
-    "https://www.googleapis.com/auth/calendar.readonly",
-    "https://www.googleapis.com/auth/gmail.send",
-    "https://www.googleapis.com/auth/gmail.settings.basic",
-    "https://www.googleapis.com/auth/gmail.readonly",
-]
+# Cache local das agendas (persiste entre sessões)
+CACHE_DIR = os.environ.get("CONFIRMACAO_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache"
+)
 
 
 # --- Carrega config do OAuth via st.secrets ---
@@ -167,198 +182,260 @@ def login():
         st.stop()
 
 
-def get_user_signature(gmail_service):
+def get_user_signature(gmail_service, user_email):
     """
-    Busca a assinatura do Gmail do usuário logado e a converte para texto simples.
-    A assinatura é prefixada com o separador padrão "-- \n".
+    Assinatura do Gmail em texto simples, prefixada com o separador "-- \n".
+    Retorna None em caso de erro (para não guardar uma assinatura vazia no cache).
     """
     try:
-        # Tenta obter a configuração "sendAs" para o e-mail primário do usuário
-        user_profile = gmail_service.users().getProfile(userId="me").execute()
-        user_email = user_profile.get("emailAddress")
-
-        if not user_email:
-            st.warning(
-                "Não foi possível obter o endereço de e-mail do usuário para buscar a assinatura."
-            )
-            return ""
-
-        # Busca a configuração "sendAs" específica para o email do usuário
-        send_as_settings = (
-            gmail_service.users()
-            .settings()
-            .sendAs()
-            .get(userId="me", sendAsEmail=user_email)
-            .execute()
+        return fetch_signature(gmail_service, user_email)
+    except HttpError as error:
+        st.warning(
+            f"Erro ao buscar assinatura do Gmail: {error}. A assinatura não será adicionada."
         )
-        signature_html = send_as_settings.get("signature", "")
+        return None
+    except Exception as e:
+        st.error(
+            f"Um erro inesperado ocorreu ao buscar a assinatura: {e}. A assinatura não será adicionada."
+        )
+        return None
 
-        if not signature_html.strip():
-            # Nenhuma assinatura configurada ou está vazia para este alias
-            return ""
 
-        # Converte a assinatura de HTML para texto simples
-        soup = BeautifulSoup(signature_html, "html.parser")
-        signature_plain = soup.get_text(
-            separator="\n"
-        ).strip()  # Usa newline como separador
+@st.cache_resource
+def get_profile_cache():
+    return ProfileCache(os.path.join(CACHE_DIR, "profiles"))
 
-        if signature_plain:
-            return f"\n\n-- \n{signature_plain}"  # Formato padrão de separador de assinatura
-        return ""
 
-    except HttpError as error:
-        # Se o erro for 404, significa que o 'sendAsEmail' específico não foi encontrado.
-        # Isso pode acontecer se o e-mail principal não tiver uma entrada 'sendAs' explícita (raro)
-        # ou se for um alias. Vamos tentar listar todos e pegar o primário.
-        if error.resp.status == 404:
-            try:
-                aliases_result = (
-                    gmail_service.users()
-                    .settings()
-                    .sendAs()
-                    .list(userId="me")
-                    .execute()
-                )
-                aliases = aliases_result.get("sendAs", [])
-                if not aliases:
-                    return ""  # Nenhuma configuração 'sendAs' encontrada
+def load_user_profile(gmail_service, creds, force=False):
+    """E-mail e assinatura do usuário, do cache em disco quando ainda válidos
 
-                chosen_alias = next(
-                    (alias for alias in aliases if alias.get("isPrimary")), None
-                )
-                if (
-                    not chosen_alias and aliases
-                ):  # Fallback para o primeiro da lista se nenhum for primário
-                    chosen_alias = aliases[0]
-
-                if chosen_alias:
-                    signature_html = chosen_alias.get("signature", "")
-                    if signature_html.strip():
-                        soup = BeautifulSoup(signature_html, "html.parser")
-                        signature_plain = soup.get_text(separator="\n").strip()
-                        if signature_plain:
-                            return f"\n\n-- \n{signature_plain}"
-                return ""  # Nenhuma assinatura encontrada nos aliases
-            except HttpError as inner_error:
-                st.warning(
-                    f"Erro ao tentar buscar assinaturas alternativas: {inner_error}"
-                )
-                return ""
-        else:
-            st.warning(
-                f"Erro ao buscar assinatura do Gmail: {error}. A assinatura não será adicionada."
-            )
-        return ""
-    except Exception as e:
-        st.error(
-            f"Um erro inesperado ocorreu ao buscar a assinatura: {e}. A assinatura não será adicionada."
+    Evita getProfile + sendAs (e o parse do HTML) a cada nova sessão.
+    """
+    key = credential_key(creds)
+    if key and not force:
+        cached = get_profile_cache().get(key)
+        if cached:
+            return cached
+
+    user_email = (
+        gmail_service.users().getProfile(userId="me").execute().get("emailAddress")
+    )
+    if not user_email:
+        st.warning(
+            "Não foi possível obter o endereço de e-mail do usuário para buscar a assinatura."
         )
-        return ""
+        return {"email": "", "signature": ""}
+
+    signature = get_user_signature(gmail_service, user_email)
+    if signature is None:
+        return {"email": user_email, "signature": ""}  # Erro: não vai para o cache
+    return get_profile_cache().put(key or cache_key(user_email), user_email, signature)
 
 
 # --- Serviços autenticados ---
-# Coloque esta parte dentro de um if para garantir que creds não é None
-creds = login()  # login() agora sempre retorna creds ou para a execução
+@st.cache_resource(max_entries=64)
+def get_google_services(_creds, fingerprint):
+    """Serviços construídos uma vez por login e reaproveitados entre reruns
+
+    Compartilhados entre sessões e threads: cada thread usa a própria conexão.
+    """
+    return build_services(_creds)
 
-if creds:
-    try:
-        cal_service = build("calendar", "v3", credentials=creds)
-        gmail_service = build("gmail", "v1", credentials=creds)
-        st.success("Conectado aos serviços Google!")  # Feedback opcional
-    except Exception as e:
-        st.error(f"Erro ao construir serviços Google: {e}")
-        st.stop()
-else:
-    # Esta parte não deveria ser alcançada se login() usa st.stop() corretamente
-    st.error("Credenciais não disponíveis após o login.")
-    st.stop()
 
-# Certifique-se que 'creds' e 'gmail_service' estão disponíveis aqui
-if "creds" not in st.session_state or not st.session_state.creds.valid:
+creds = login()  # login() sempre retorna creds ou para a execução
+
+if not creds.valid and not creds.refresh_token:
     st.warning("Por favor, faça login para continuar.")
     st.stop()
 
-# Construa o gmail_service se ainda não o fez ou se ele não estiver na session_state
-# Esta lógica pode já existir na sua seção de "Serviços autenticados"
-if "gmail_service" not in st.session_state:
+try:
+    services = get_google_services(creds, credential_fingerprint(creds))
+    st.success("Conectado aos serviços Google!")  # Feedback opcional
+except Exception as e:
+    st.error(f"Erro ao construir serviços Google: {e}")
+    st.stop()
+
+cal_service = services.calendar
+gmail_service_instance = services.gmail
+
+# E-mail e assinatura do usuário (cache em disco com validade)
+if "user_email" not in st.session_state:
     try:
-        st.session_state.gmail_service = build(
-            "gmail", "v1", credentials=st.session_state.creds
-        )
-    except Exception as e:
-        st.error(f"Erro ao construir o serviço Gmail: {e}")
+        profile = load_user_profile(gmail_service_instance, st.session_state.creds)
+    except HttpError as e:
+        st.error(f"Erro ao identificar o usuário: {e}")
         st.stop()
+    st.session_state.user_email = profile["email"]
+    st.session_state.user_signature = profile["signature"]
+
+
+# --- Cache local da agenda ---
+@st.cache_resource
+def get_event_cache(user_email, calendar_id="primary"):
+    """Um cache por usuário e agenda, compartilhado entre as sessões"""
+    filename = f"{cache_key(user_email)}__{cache_key(calendar_id)}.json"
+    return EventCache(os.path.join(CACHE_DIR, "events", filename), calendar_id)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_calendar_list(user_email):
+    """Agendas do usuário (a lista muda pouco: revalidada a cada hora)"""
+    return list_calendars(cal_service)
+
 
-gmail_service_instance = st.session_state.gmail_service
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_events_outside_cache(user_email, calendar_id, start_date, end_date):
+    """Intervalos fora da janela sincronizada, revalidados a cada 5 minutos"""
+    cache = get_event_cache(user_email, calendar_id)
+    return cache.fetch_between(cal_service, start_date, end_date)
+
+
+def sync_calendar(calendar_ids=("primary",), force=False):
+    """Traz só o que mudou em cada agenda (no máximo uma vez por minuto), todas em paralelo"""
+    caches = [
+        get_event_cache(st.session_state.user_email, calendar_id)
+        for calendar_id in calendar_ids
+    ]
+    errors = sync_calendars(caches, st.session_state.creds, force=force)
+    for calendar_id, error in errors.items():
+        if error is not None:
+            st.error(f"Erro ao sincronizar a agenda {calendar_id}: {error}")
+    return caches
+
+
+# --- Registro de envios ---
+@st.cache_resource
+def get_send_ledger():
+    """Mesmo banco usado pelo scheduler.py: nenhum convidado é confirmado duas vezes"""
+    return SendLedger(os.path.join(CACHE_DIR, "ledger.db"))
+
+
+@st.cache_resource
+def get_reply_tracker():
+    return ReplyTracker(get_send_ledger())
+
+
+REPLY_BADGES = {
+    CONFIRMED: "✅ confirmou",
+    DECLINED: "❌ recusou",
+    REPLIED: "💬 respondeu (conferir)",
+    UNANSWERED: "⏳ sem resposta",
+}
+
+
+def pending_guests(data, confirmed_index):
+    """Convidados da reunião que ainda não receberam confirmação"""
+    event_id = data["event"]["id"]
+    return [
+        g for g in data["guests"] if (event_id, g[0].lower()) not in confirmed_index
+    ]
 
 
 # --- Busca eventos num dia ---
-def fetch_events_for_date(date):
-    # ... (seu código existente)
-    if isinstance(date, datetime.date):
-        date = datetime.datetime.combine(date, datetime.time.min)
+def fetch_events_for_date(date, calendar_ids=("primary",)):
+    """Eventos do dia lidos do cache local (sincronizado de forma incremental)"""
+    return fetch_events_between(date, date, calendar_ids)
 
-    start = date.replace(hour=0, minute=0, second=0, microsecond=0).isoformat() + "Z"
-    end = (date + datetime.timedelta(days=1)).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    ).isoformat() + "Z"
 
-    try:
-        events = (
-            cal_service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start,
-                timeMax=end,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-            .get("items", [])
-        )
-        return events
-    except HttpError as error:
-        st.error(f"Erro ao buscar eventos: {error}")
-        return []
-
-
-# --- Agrupa convidados por evento ---
-def group_guests(events):
-    # ... (seu código existente)
-    grouped = {}
-    for ev in events:
-        guests = [
-            att
-            for att in ev.get("attendees", [])
-            if not att["email"].endswith("@polijunior.com.br")  # Seu filtro de email
-        ]
-        if not guests:
+# --- Busca eventos num intervalo de datas ---
+def fetch_events_between(start_date, end_date, calendar_ids=("primary",)):
+    """Eventos do intervalo (inclusive) de todas as agendas, sem repetições
+
+    Uma única sincronização para todos os dias.
+    """
+    if isinstance(start_date, datetime.datetime):
+        start_date = start_date.date()
+    if isinstance(end_date, datetime.datetime):
+        end_date = end_date.date()
+    event_lists = []
+    for cache in sync_calendar(calendar_ids):
+        if cache.covers(start_date, end_date):
+            event_lists.append(cache.events_between(start_date, end_date))
             continue
-        label = ev["summary"]
-        if label not in grouped:
-            grouped[label] = {"event": ev, "guests": []}
-        for att in guests:
-            # Tenta pegar o displayName, se não, o email, e se não, usa o nome do email
-            name = att.get("displayName", att.get("email", att["email"].split("@")[0]))
-            grouped[label]["guests"].append((att["email"], name))
-    return grouped
+        # Fora da janela do cache (ex: datas passadas): busca direto na API
+        try:
+            event_lists.append(
+                fetch_events_outside_cache(
+                    st.session_state.user_email, cache.calendar_id, start_date, end_date
+                )
+            )
+        except HttpError as error:
+            st.error(f"Erro ao buscar a agenda {cache.calendar_id}: {error}")
+    return merge_events(event_lists)
 
 
 # --- Interface ---
 st.title("🔔 Confirmação de Reuniões")
 
-# escolha da data
-mode = st.radio("Data:", ["Hoje", "Amanhã", "Escolher"])
+# Agendas consultadas: por padrão as que estão marcadas no Google Agenda
+try:
+    calendars = get_calendar_list(st.session_state.user_email)
+except HttpError as error:
+    st.warning(f"Não foi possível listar as agendas, usando só a principal: {error}")
+    calendars = [
+        {"id": "primary", "summary": "Principal", "primary": True, "selected": True}
+    ]
+calendar_names = {c["id"]: c["summary"] for c in calendars}
+calendar_ids = st.multiselect(
+    "Agendas:",
+    list(calendar_names),
+    default=[c["id"] for c in calendars if c["primary"] or c["selected"]],
+    format_func=lambda calendar_id: calendar_names[calendar_id],
+)
+if not calendar_ids:
+    st.info("Selecione ao menos uma agenda.")
+    st.stop()
+
+if st.button("🔄 Atualizar agenda"):
+    sync_calendar(calendar_ids, force=True)
+
+# Envio automático: o scheduler.py usa o login salvo para confirmar as reuniões
+credential_store = CredentialStore(os.path.join(CACHE_DIR, "credentials"))
+user_key = cache_key(st.session_state.user_email)
+auto_confirm = st.toggle(
+    "🤖 Confirmar automaticamente minhas reuniões (24h antes)",
+    value=credential_store.contains(user_key),
+)
+if auto_confirm != credential_store.contains(user_key):
+    if auto_confirm:
+        credential_store.save(user_key, st.session_state.creds)
+    else:
+        credential_store.remove(user_key)
+
+# escolha da data (ou de um intervalo, buscado de uma vez só)
+mode = st.radio("Data:", ["Hoje", "Amanhã", "Escolher", "Próximos 7 dias", "Intervalo"])
+today = datetime.date.today()
 if mode == "Hoje":
-    sel_date = datetime.datetime.now()
+    range_start = range_end = today
 elif mode == "Amanhã":
-    sel_date = datetime.datetime.now() + datetime.timedelta(days=1)
+    range_start = range_end = today + datetime.timedelta(days=1)
+elif mode == "Escolher":
+    range_start = range_end = st.date_input("Escolha a data", today)
+elif mode == "Próximos 7 dias":
+    range_start, range_end = today, today + datetime.timedelta(days=6)
 else:
-    sel_date = st.date_input("Escolha a data", datetime.date.today())
+    chosen_range = st.date_input(
+        "Escolha o intervalo", (today, today + datetime.timedelta(days=6))
+    )
+    if len(chosen_range) != 2:
+        st.info("Selecione a data final do intervalo.")
+        st.stop()
+    range_start, range_end = chosen_range
 
-events = fetch_events_for_date(sel_date)
-grouped = group_guests(events)
+events = fetch_events_between(range_start, range_end, calendar_ids)
+by_day = group_events_by_day(events)
+
+# Rótulos únicos por dia: a mesma reunião pode se repetir na semana
+grouped = {}
+for day, day_grouped in by_day.items():
+    for summary, day_data in day_grouped.items():
+        if range_start == range_end:
+            label = summary
+        else:
+            label = (
+                f"{day.strftime('%d/%m')} ({DIAS_SEMANA[day.weekday()]}) — {summary}"
+            )
+        grouped[label] = day_data
 
 if not grouped:
     st.warning(
@@ -366,8 +443,142 @@ if not grouped:
     )  # Mensagem mais clara
     st.stop()
 
+if range_start != range_end:
+    st.caption(
+        f"{len(grouped)} reunião(ões) com convidados externos em {len(by_day)} dia(s)."
+    )
+
+# Assinatura carregada junto com o perfil do usuário
+user_signature_text = st.session_state.get("user_signature", "")
+
+# Quem já foi confirmado: uma consulta ao registro para todas as reuniões da tela
+send_ledger = get_send_ledger()
+confirmed_index = send_ledger.confirmed(d["event"]["id"] for d in grouped.values())
+
+
+# Respostas às confirmações: só o que chegou desde a última consulta
+reply_tracker = get_reply_tracker()
+try:
+    reply_tracker.poll(gmail_service_instance, user_key)
+except HttpError as error:
+    st.warning(f"Não foi possível verificar as respostas: {error}")
+reply_statuses = reply_tracker.statuses(
+    entry.thread_id for entry in confirmed_index.values()
+)
+
+
+def meeting_reply_status(data):
+    """None se nada foi enviado; senão confirmou, recusou, respondeu ou sem resposta"""
+    event_id = data["event"]["id"]
+    entries = [
+        confirmed_index[(event_id, g[0].lower())]
+        for g in data["guests"]
+        if (event_id, g[0].lower()) in confirmed_index
+    ]
+    return meeting_status(entries, reply_statuses)
+
+
+def meeting_label(label):
+    status = meeting_reply_status(grouped[label])
+    if status is None:
+        return label
+    sent = "📨" if not pending_guests(grouped[label], confirmed_index) else "📨 parcial"
+    return f"{label} — {sent}, {REPLY_BADGES[status]}"
+
+
+# --- Respostas ---
+with st.expander("📬 Respostas às confirmações"):
+    reply_rows = [
+        {"Reunião": label, "Situação": REPLY_BADGES[status]}
+        for label, data in grouped.items()
+        if (status := meeting_reply_status(data)) is not None
+    ]
+    if reply_rows:
+        st.dataframe(reply_rows, use_container_width=True)
+    else:
+        st.caption("Nenhuma confirmação enviada para as reuniões exibidas.")
+    if st.button("🔄 Verificar respostas"):
+        try:
+            reply_tracker.poll(gmail_service_instance, user_key, force=True)
+            st.rerun()
+        except HttpError as error:
+            st.error(f"Erro ao verificar respostas: {error}")
+
+
+# --- Envio em lote ---
+with st.expander("📨 Enviar confirmações em lote"):
+    batch_labels = st.multiselect(
+        "Reuniões (convidados externos ainda não confirmados de cada uma):",
+        list(grouped.keys()),
+        default=[
+            label
+            for label, data in grouped.items()
+            if pending_guests(data, confirmed_index)
+        ],
+        format_func=meeting_label,
+    )
+    st.caption("Cada reunião recebe a mensagem padrão com a sua assinatura.")
+    if st.button("Enviar em lote", disabled=not batch_labels):
+        outgoing = []
+        reserved = {}  # rótulo -> (evento, destinatários reservados)
+        for label in batch_labels:
+            batch_event = grouped[label]["event"]
+            batch_emails = send_ledger.reserve(
+                batch_event["id"],
+                [g[0] for g in grouped[label]["guests"]],
+                CONFIRMATION_TEMPLATE,
+                user_key,
+            )
+            if not batch_emails:
+                continue
+            reserved[label] = (batch_event["id"], batch_emails)
+            outgoing.append(
+                OutgoingMessage(
+                    key=label,
+                    raw=build_raw_message(
+                        batch_emails,
+                        confirmation_subject(batch_event),
+                        default_body(batch_event, batch_emails),
+                        user_signature_text,
+                    ),
+                    recipients=batch_emails,
+                )
+            )
+        skipped = len(batch_labels) - len(outgoing)
+        if skipped:
+            st.info(f"{skipped} reunião(ões) já confirmada(s) foram ignoradas.")
+        with st.spinner(f"Enviando {len(outgoing)} confirmação(ões)..."):
+            report = send_batch(gmail_service_instance, outgoing)
+        for result in report.results:
+            event_id, batch_emails = reserved[result.key]
+            if result.ok:
+                send_ledger.mark_sent(
+                    event_id,
+                    batch_emails,
+                    CONFIRMATION_TEMPLATE,
+                    result.message_id,
+                    result.thread_id,
+                )
+            else:
+                send_ledger.release(event_id, batch_emails, CONFIRMATION_TEMPLATE)
+        st.dataframe(
+            [
+                {
+                    "Reunião": result.key,
+                    "Status": "✅ enviado" if result.ok else "❌ falhou",
+                    "Erro": result.error or "",
+                }
+                for result in report.results
+            ],
+            use_container_width=True,
+        )
+        st.success(
+            f"{report.sent}/{len(outgoing)} enviados em {report.elapsed_seconds:.1f}s "
+            f"({report.throughput:.1f} e-mails/s)."
+        )
+
 # seleção de evento
-event_label = st.selectbox("Evento:", list(grouped.keys()))
+event_label = st.selectbox("Evento:", list(grouped.keys()), format_func=meeting_label)
 if not event_label:  # Caso não haja eventos após o filtro
     st.warning("Nenhum evento selecionável.")
     st.stop()
@@ -376,9 +587,18 @@ data = grouped[event_label]
 ev = data["event"]
 guest_list = data["guests"]
 
-# seleção de convidados
+# seleção de convidados (os já confirmados aparecem marcados)
+confirmed_names = {
+    g[1] for g in guest_list if (ev["id"], g[0].lower()) in confirmed_index
+}
 names = [g[1] for g in guest_list]
-chosen = st.multiselect("Convidados:", names)
+chosen = st.multiselect(
+    "Convidados:",
+    names,
+    format_func=lambda name: (
+        f"📨 {name} (já enviado)" if name in confirmed_names else name
+    ),
+)
 
 if not chosen:
     st.info("Selecione ao menos um convidado.")
@@ -387,95 +607,9 @@ if not chosen:
 # prepara saudação
 selected = [g for g in guest_list if g[1] in chosen]
 emails = [g[0] for g in selected]
-names_sel = [g[1] for g in selected]
-
-# Lógica de saudação aprimorada
-if len(names_sel) == 1:
-    first_name = emails[0].split("@")[0].split(".")[0].capitalize()
-    greet = f"Bom dia, {first_name}!"
-elif len(names_sel) == 2:
-    first_names = [email.split("@")[0].split(".")[0].capitalize() for email in emails]
-    greet = f"Bom dia, {first_names[0]} e {first_names[1]}!"
-elif len(names_sel) > 2:
-    first_names = [email.split("@")[0].split(".")[0].capitalize() for email in emails]
-    greet = f"Bom dia, {', '.join(first_names[:-1])} e {first_names[-1]}!"
-else:  # Caso names_sel esteja vazio por algum motivo (não deveria acontecer se 'chosen' não estiver vazio)
-    greet = "Bom dia!"
-
-
-# formata horário
-start_info = ev["start"]
-# Verifica se é um evento de dia inteiro ('date') ou com horário específico ('dateTime')
-if "dateTime" in start_info:
-    start_dt_str = start_info.get("dateTime")
-    time_h = datetime.datetime.fromisoformat(
-        start_dt_str.replace("Z", "+00:00")
-    ).strftime(
-        "%Hh%M"
-    )  # Adiciona minutos e trata fuso horário
-    horario_confirmacao = f"às {time_h}"
-elif "date" in start_info:
-    start_dt_str = start_info.get("date")
-    time_h = datetime.datetime.fromisoformat(start_dt_str).strftime(
-        "%d/%m/%Y"
-    )  # Formata a data
-    horario_confirmacao = f"no dia {time_h}"
-else:
-    time_h = "(horário não especificado)"  # Fallback
-    horario_confirmacao = ""
-
-# Buscar a assinatura do usuário e armazenar no cache da sessão
-if "user_signature" not in st.session_state:
-    st.session_state.user_signature = get_user_signature(gmail_service_instance)
-user_signature_text = st.session_state.user_signature
-
-# Data atual (sem hora)
-hoje = datetime.datetime.now().date()
-data_selecionada = (
-    sel_date.date() if isinstance(sel_date, datetime.datetime) else sel_date
-)
-
-# Define a string do dia para a mensagem
-dias_semana = [
-    "segunda-feira",
-    "terça-feira",
-    "quarta-feira",
-    "quinta-feira",
-    "sexta-feira",
-    "sábado",
-    "domingo",
-]
-
-# Forçar recálculo do delta toda vez que a página é atualizada
-delta = (data_selecionada - hoje).days
-
-if delta == 0:
-    dia_mensagem = "hoje"
-elif delta == 1:
-    dia_mensagem = "amanhã"
-elif delta > 1 and delta < 7:
-    # Verificar se é na mesma semana para decidir entre "nesta" ou "na próxima"
-    hoje_semana = hoje.isocalendar()[1]  # Número da semana do ano
-    sel_semana = data_selecionada.isocalendar()[1]
-
-    # Usa o nome do dia da semana
-    dia_semana_nome = dias_semana[data_selecionada.weekday()]
-
-    # Se for na mesma semana, usa "nesta", caso contrário "na próxima"
-    if hoje_semana == sel_semana:
-        dia_mensagem = f"nesta {dia_semana_nome}"
-    else:
-        dia_mensagem = f"na próxima {dia_semana_nome}"
-else:
-    # Caso fora da próxima semana, usa data completa
-    dia_mensagem = f"no dia {data_selecionada.strftime('%d/%m/%Y')}"
 
 # Construir o corpo da mensagem com a data correta
-default_body_text = (
-    f"{greet}\nTudo bem?\n\n"
-    f"Gostaria de confirmar, tudo certo para nossa conversa {dia_mensagem} {horario_confirmacao}?\n\n"
-    "Nos vemos em breve!"
-)
+default_body_text = default_body(ev, emails)
 
 msg_body_edited_by_user = st.text_area("Mensagem:", default_body_text, height=200)
 
@@ -493,32 +627,58 @@ else:
         "Nenhuma assinatura automática será adicionada (não configurada ou não encontrada)."
     )
 
+if st.button("🔄 Recarregar assinatura"):
+    profile = load_user_profile(
+        gmail_service_instance, st.session_state.creds, force=True
+    )
+    st.session_state.user_email = profile["email"]
+    st.session_state.user_signature = profile["signature"]
+    st.rerun()
+
 
 if st.button("Enviar"):
     if not msg_body_edited_by_user.strip():
         st.warning("A mensagem não pode estar vazia.")
     else:
-        # Corpo do e-mail final é o que o usuário digitou + a assinatura
-        final_email_content = msg_body_edited_by_user
-        if user_signature_text:
-            final_email_content += (
-                user_signature_text  # A assinatura já vem com \n\n-- \n
+        # Mensagem editada conta como outro modelo: pode ir para quem já recebeu a padrão
+        template = (
+            CONFIRMATION_TEMPLATE
+            if msg_body_edited_by_user == default_body_text
+            else msg_body_edited_by_user
+        )
+        reserved_emails = send_ledger.reserve(ev["id"], emails, template, user_key)
+        if len(reserved_emails) < len(emails):
+            # Alguém já recebeu esta mensagem (outro clique ou outro usuário)
+            send_ledger.release(ev["id"], reserved_emails, template)
+            already_sent = sorted(set(emails) - set(reserved_emails))
+            st.warning(
+                f"Esta mensagem já foi enviada para: {', '.join(already_sent)}. "
+                "Remova-os da seleção ou altere a mensagem."
             )
+            st.stop()
 
-        mime = MIMEText(final_email_content)
-        mime["to"] = ", ".join(emails)  # 'emails' deve estar definido
-        mime["subject"] = (
-            f"Confirmação: {event_label}"  # 'event_label' deve estar definido
+        # Corpo do e-mail final é o que o usuário digitou + a assinatura
+        raw = build_raw_message(
+            emails,
+            confirmation_subject(ev),
+            msg_body_edited_by_user,
+            user_signature_text,
         )
 
-        raw = base64.urlsafe_b64encode(mime.as_bytes()).decode()
-
         try:
-            gmail_service_instance.users().messages().send(
-                userId="me", body={"raw": raw}
-            ).execute()
+            sent = (
+                gmail_service_instance.users()
+                .messages()
+                .send(userId="me", body={"raw": raw})
+                .execute()
+            )
+            send_ledger.mark_sent(
+                ev["id"], emails, template, sent.get("id"), sent.get("threadId")
+            )
             st.success("E-mail enviado com sucesso!")
         except HttpError as e:
+            send_ledger.release(ev["id"], emails, template)
             st.error(f"Erro ao enviar: {e}")
         except Exception as e_gen:
+            send_ledger.release(ev["id"], emails, template)
             st.error(f"Um erro inesperado ocorreu ao enviar: {e_gen}")
@@ -0,0 +1,241 @@
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+# --- Configurações ---
+# Janela da sincronização completa (eventos fora dela não ficam no cache)
+FULL_SYNC_LOOKBACK_DAYS = 7
+FULL_SYNC_LOOKAHEAD_DAYS = 90
+# Quando sobram menos dias que isso à frente, a janela é refeita do zero
+RESYNC_LOOKAHEAD_DAYS = 30
+# Reruns dentro deste intervalo leem só da memória, sem tocar na API
+MIN_SYNC_INTERVAL_SECONDS = 60
+PAGE_SIZE = 2500  # Máximo aceito pelo events.list
+
+
+def atomic_write_json(filepath: str, data):
+    """Grava em arquivo temporário e troca pelo definitivo de forma atômica"""
+    directory = os.path.dirname(filepath)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cache_key(value: str) -> str:
+    """Nome de arquivo seguro a partir de e-mail ou ID de agenda"""
+    return re.sub(r"[^a-z0-9._-]", "_", value.lower())
+
+
+def event_date(event: dict) -> Optional[datetime.date]:
+    """Dia do evento no fuso em que ele foi marcado (o que o usuário vê)"""
+    start = event.get("start", {})
+    if "dateTime" in start:
+        return datetime.date.fromisoformat(start["dateTime"][:10])
+    if "date" in start:
+        return datetime.date.fromisoformat(start["date"])
+    return None
+
+
+def event_sort_key(event: dict) -> str:
+    start = event.get("start", {})
+    return start.get("dateTime") or start.get("date") or ""
+
+
+def _window_bounds(start: datetime.date, end: datetime.date) -> dict:
+    """timeMin/timeMax com um dia de folga: o dia do evento é o do fuso dele"""
+    margin = datetime.timedelta(days=1)
+    return {
+        "timeMin": datetime.datetime.combine(
+            start - margin, datetime.time.min, datetime.timezone.utc
+        ).isoformat(),
+        "timeMax": datetime.datetime.combine(
+            end + margin, datetime.time.min, datetime.timezone.utc
+        ).isoformat(),
+    }
+
+
+class EventCache:
+    """Cópia local de uma agenda mantida em dia com o syncToken do Calendar
+
+    A sincronização completa baixa só a janela de alguns dias atrás até alguns
+    meses à frente; as seguintes trazem só o que mudou desde o último token.
+    Datas fora da janela são buscadas direto na API (fetch_between).
+    """
+
+    def __init__(
+        self,
+        cache_path: str,
+        calendar_id: str = "primary",
+        min_sync_interval: float = MIN_SYNC_INTERVAL_SECONDS,
+    ):
+        self.cache_path = cache_path
+        self.calendar_id = calendar_id
+        self.min_sync_interval = min_sync_interval
+        self._lock = threading.Lock()
+        self.events: Dict[str, dict] = {}
+        self.sync_token: Optional[str] = None
+        self.window_start: Optional[datetime.date] = None
+        self.window_end: Optional[datetime.date] = None
+        self.synced_at = 0.0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        window = data.get("window")
+        if not window:
+            return  # Cache sem janela (formato antigo): refaz a sincronização
+        self.window_start = datetime.date.fromisoformat(window[0])
+        self.window_end = datetime.date.fromisoformat(window[1])
+        self.events = data.get("events", {})
+        self.sync_token = data.get("sync_token")
+        # Nunca confia no relógio salvo: o primeiro uso sempre busca o delta
+        self.synced_at = 0.0
+
+    def _save(self):
+        atomic_write_json(
+            self.cache_path,
+            {
+                "calendar_id": self.calendar_id,
+                "sync_token": self.sync_token,
+                "window": [self.window_start.isoformat(), self.window_end.isoformat()],
+                "events": self.events,
+            },
+        )
+
+    def covers(self, start: datetime.date, end: datetime.date) -> bool:
+        """Se o intervalo está inteiro dentro da janela sincronizada"""
+        return (
+            self.window_start is not None
+            and self.window_start <= start
+            and end <= self.window_end
+        )
+
+    def _list_pages(self, service, sync_token: Optional[str], window=None):
+        params = {
+            "calendarId": self.calendar_id,
+            "singleEvents": True,
+            "maxResults": PAGE_SIZE,
+        }
+        if sync_token:
+            # O syncToken não aceita timeMin/timeMax: o delta é podado depois
+            params["syncToken"] = sync_token
+        else:
+            params.update(_window_bounds(*window))
+            params["showDeleted"] = False
+
+        page_token = None
+        while True:
+            if page_token:
+                params["pageToken"] = page_token
+            page = service.events().list(**params).execute()
+            yield page
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+
+    def sync(self, service, force: bool = False) -> bool:
+        """Aplica as alterações da agenda; retorna se algo mudou"""
+        with self._lock:
+            if not force and time.time() - self.synced_at < self.min_sync_interval:
+                return False
+            today = datetime.date.today()
+            full_sync = (
+                self.sync_token is None
+                or self.window_end is None
+                or (self.window_end - today).days < RESYNC_LOOKAHEAD_DAYS
+            )
+            try:
+                changed, next_token = self._fetch(service, self.sync_token, full_sync)
+            except HttpError as error:
+                if error.resp.status != 410:
+                    raise
+                # Token expirado (410 Gone): recomeça com sincronização completa
+                full_sync = True
+                changed, next_token = self._fetch(service, None, full_sync)
+
+            token_changed = next_token != self.sync_token
+            self.sync_token = next_token
+            self.synced_at = time.time()
+            if changed or token_changed:
+                self._save()
+            return changed
+
+    def _fetch(self, service, sync_token: Optional[str], full_sync: bool):
+        today = datetime.date.today()
+        window_start = today - datetime.timedelta(days=FULL_SYNC_LOOKBACK_DAYS)
+        if full_sync:
+            events = {}
+            window_end = today + datetime.timedelta(days=FULL_SYNC_LOOKAHEAD_DAYS)
+            sync_token = None
+        else:
+            events = dict(self.events)
+            window_end = self.window_end
+        next_token = None
+        for page in self._list_pages(service, sync_token, (window_start, window_end)):
+            for event in page.get("items", []):
+                if event.get("status") == "cancelled":
+                    events.pop(event["id"], None)
+                else:
+                    events[event["id"]] = event
+            next_token = page.get("nextSyncToken") or next_token
+
+        # O delta traz alterações de qualquer data, e o início da janela anda
+        # com os dias: fica só o que está dentro dela
+        events = {
+            event_id: event
+            for event_id, event in events.items()
+            if (day := event_date(event)) is not None
+            and window_start <= day <= window_end
+        }
+        changed = events != self.events
+        self.events = events
+        self.window_start = window_start
+        self.window_end = window_end
+        return changed, next_token
+
+    def fetch_between(
+        self, service, start: datetime.date, end: datetime.date
+    ) -> List[dict]:
+        """Eventos do intervalo buscados direto na API, sem passar pelo cache
+
+        Para datas fora da janela sincronizada (ex: reuniões já passadas).
+        """
+        selected = [
+            event
+            for page in self._list_pages(service, None, (start, end))
+            for event in page.get("items", [])
+            if event.get("status") != "cancelled"
+            and (day := event_date(event)) is not None
+            and start <= day <= end
+        ]
+        return sorted(selected, key=event_sort_key)
+
+    def events_between(self, start: datetime.date, end: datetime.date) -> List[dict]:
+        """Eventos com início entre as duas datas (inclusive), em ordem"""
+        selected = [
+            event
+            for event in self.events.values()
+            if (day := event_date(event)) is not None and start <= day <= end
+        ]
+        return sorted(selected, key=event_sort_key)
+
+    def events_on(self, date: datetime.date) -> List[dict]:
+        return self.events_between(date, date)
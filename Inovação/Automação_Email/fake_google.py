@@ -0,0 +1,321 @@
+"""Servidor local que imita as APIs do Google usadas pelo app (para o bench_app.py)
+
+Atende o endpoint de token do OAuth, Calendar calendarList.list e
+events.list (com páginas e syncToken) e Gmail send / sendAs / getProfile / history / threads, inclusive
+o endpoint de lote. Conta cada requisição HTTP e cada chamada de API.
+"""
+
+import base64
+import datetime
+import email.parser
+import itertools
+import json
+import threading
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit, urlunsplit
+
+import httplib2
+
+USER_EMAIL = "bench.user@polijunior.com.br"
+SIGNATURE_HTML = "<div>Bench User<br>Consultor de Negócios | Poli Júnior</div>"
+TIMEZONE = datetime.timezone(datetime.timedelta(hours=-3))
+# Agenda compartilhada marcada pelo usuário; devolve as mesmas reuniões da
+# principal (mesmo iCalUID), como um time que copia as reuniões dos clientes
+SHARED_CALENDAR_ID = "time.comercial@group.calendar.google.com"
+
+
+def fake_id_token(email: str) -> str:
+    """JWT sem assinatura válida, só com o claim de e-mail (basta para o app)"""
+
+    def encode(data):
+        raw = json.dumps(data).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    return ".".join([encode({"alg": "none"}), encode({"email": email}), "assinatura"])
+
+
+def make_events(count: int, days: int = 7, start=None):
+    """Reuniões com um convidado interno e até dois externos, espalhadas nos dias"""
+    start = start or datetime.datetime.now(TIMEZONE).replace(
+        hour=9, minute=0, second=0, microsecond=0
+    )
+    events = []
+    for i in range(count):
+        begin = start + datetime.timedelta(
+            days=i % days, hours=(i // days) % 9, minutes=30 * (i % 2)
+        )
+        attendees = [{"email": USER_EMAIL, "responseStatus": "accepted"}]
+        for j in range(1 + i % 2):
+            attendees.append(
+                {
+                    "email": f"contato{j}.cliente{i}@empresa{i % 20}.com.br",
+                    "displayName": f"Contato {j} Cliente {i}",
+                }
+            )
+        events.append(
+            {
+                "id": f"evt{i:05d}",
+                "iCalUID": f"evt{i:05d}@google.com",
+                "status": "confirmed",
+                "summary": f"Reunião Cliente {i}",
+                "start": {"dateTime": begin.isoformat()},
+                "end": {"dateTime": (begin + datetime.timedelta(hours=1)).isoformat()},
+                "attendees": attendees,
+                "updated_version": 0,
+            }
+        )
+    return events
+
+
+class FakeGoogle:
+    """Estado das APIs falsas; rode com start() e aponte o app com install()"""
+
+    def __init__(self, events=None, page_size_cap: int = 250):
+        self.lock = threading.Lock()
+        self.http_requests = Counter()
+        self.api_calls = Counter()
+        self.page_size_cap = page_size_cap
+        self.version = 0
+        self.events = {ev["id"]: ev for ev in (events or [])}
+        self.sent = []
+        self.history_id = 1000
+        self._ids = itertools.count(1)
+        self.server = None
+        self._original_http = None
+
+    # --- Controle ---
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, status, body, content_type="application/json"):
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                # /batch (batchPath do Gmail) ou /batch/<api>/<versão>
+                if urlsplit(self.path).path.split("/")[1] == "batch":
+                    fake._count_http("batch")
+                    content_type, payload = fake.handle_batch(
+                        self.headers["Content-Type"], body
+                    )
+                    self._respond(200, payload, content_type)
+                    return
+                status, response = fake.dispatch(method, self.path, body)
+                self._respond(status, response)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._original_http is not None:
+            httplib2.Http = self._original_http
+            self._original_http = None
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def token_uri(self) -> str:
+        return f"{self.base_url}/token"
+
+    def install(self):
+        """Redireciona todo httplib2.Http (usado por google_services) para cá
+        até o stop()"""
+        netloc = urlsplit(self.base_url).netloc
+        original = httplib2.Http
+
+        class LocalHttp(original):
+            def request(self, uri, *args, **kwargs):
+                parts = urlsplit(uri)
+                uri = urlunsplit(("http", netloc, parts.path, parts.query, ""))
+                return super().request(uri, *args, **kwargs)
+
+        self._original_http = original
+        httplib2.Http = LocalHttp
+
+    def snapshot(self):
+        with self.lock:
+            return Counter(self.http_requests), Counter(self.api_calls)
+
+    def touch_event(self, event_id: str, **changes):
+        """Simula uma alteração na agenda (entra no próximo delta do syncToken)"""
+        with self.lock:
+            self.version += 1
+            self.events[event_id].update(changes, updated_version=self.version)
+
+    # --- Roteamento ---
+    def _count_http(self, name):
+        with self.lock:
+            self.http_requests[name] += 1
+
+    def _count_api(self, name):
+        with self.lock:
+            self.api_calls[name] += 1
+
+    def dispatch(self, method, path, body, from_batch=False):
+        parts = urlsplit(path)
+        segments = [unquote(s) for s in parts.path.strip("/").split("/")]
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        route = self._route(method, segments)
+        if route is None:
+            return 404, {"error": {"code": 404, "message": f"{method} {path}"}}
+        name, handler = route
+        if not from_batch:
+            self._count_http(name)
+        self._count_api(name)
+        return handler(segments, query, body)
+
+    def _route(self, method, s):
+        if s == ["token"] and method == "POST":
+            return "oauth.token", self._token
+        if s == ["calendar", "v3", "users", "me", "calendarList"]:
+            return "calendar.calendarList.list", self._calendar_list
+        if s[:2] == ["calendar", "v3"] and s[-1] == "events":
+            return "calendar.events.list", self._events_list
+        if s[:4] != ["gmail", "v1", "users", "me"]:
+            return None
+        rest = s[4:]
+        if rest == ["profile"]:
+            return "gmail.getProfile", self._profile
+        if rest == ["messages", "send"] and method == "POST":
+            return "gmail.messages.send", self._send
+        if rest[:2] == ["settings", "sendAs"]:
+            return "gmail.sendAs", self._send_as
+        if rest == ["history"]:
+            return "gmail.history.list", self._history
+        if rest[:1] == ["threads"] and len(rest) == 2:
+            return "gmail.threads.get", self._thread
+        if rest[:1] == ["messages"] and len(rest) == 2:
+            return "gmail.messages.get", self._message
+        return None
+
+    # --- Endpoints ---
+    def _token(self, segments, query, body):
+        return 200, {
+            "access_token": f"fake-access-{uuid.uuid4().hex[:8]}",
+            "expires_in": 3600,
+            "token_type": "Bearer",
+            "id_token": fake_id_token(USER_EMAIL),
+        }
+
+    def _calendar_list(self, segments, query, body):
+        return 200, {
+            "items": [
+                {"id": USER_EMAIL, "summary": USER_EMAIL, "primary": True},
+                {
+                    "id": SHARED_CALENDAR_ID,
+                    "summary": "Time Comercial",
+                    "selected": True,
+                },
+            ]
+        }
+
+    def _events_list(self, segments, query, body):
+        with self.lock:
+            if "syncToken" in query:
+                since = int(query["syncToken"].split("-")[1])
+                items = [
+                    ev for ev in self.events.values() if ev["updated_version"] > since
+                ]
+            else:
+                items = list(self.events.values())
+            items.sort(key=lambda ev: ev["id"])
+            page_size = min(int(query.get("maxResults", 250)), self.page_size_cap)
+            offset = int(query.get("pageToken", 0))
+            page = items[offset : offset + page_size]
+            response = {
+                "items": [
+                    {k: v for k, v in ev.items() if k != "updated_version"}
+                    for ev in page
+                ]
+            }
+            if offset + page_size < len(items):
+                response["nextPageToken"] = str(offset + page_size)
+            else:
+                response["nextSyncToken"] = f"sync-{self.version}"
+        return 200, response
+
+    def _profile(self, segments, query, body):
+        return 200, {"emailAddress": USER_EMAIL, "historyId": str(self.history_id)}
+
+    def _send_as(self, segments, query, body):
+        send_as = {
+            "sendAsEmail": USER_EMAIL,
+            "signature": SIGNATURE_HTML,
+            "isPrimary": True,
+        }
+        if len(segments) > 6:
+            return 200, send_as
+        return 200, {"sendAs": [send_as]}
+
+    def _send(self, segments, query, body):
+        n = next(self._ids)
+        with self.lock:
+            self.sent.append(json.loads(body or b"{}").get("raw", ""))
+            self.history_id += 1
+        return 200, {"id": f"msg{n}", "threadId": f"thr{n}", "labelIds": ["SENT"]}
+
+    def _history(self, segments, query, body):
+        return 200, {"historyId": str(self.history_id)}
+
+    def _thread(self, segments, query, body):
+        return 200, {
+            "id": segments[-1],
+            "messages": [{"id": "m", "labelIds": ["SENT"]}],
+        }
+
+    def _message(self, segments, query, body):
+        return 200, {"id": segments[-1], "snippet": ""}
+
+    # --- Lote (multipart/mixed) ---
+    def handle_batch(self, content_type, body):
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body
+        )
+        boundary = uuid.uuid4().hex
+        chunks = []
+        for part in message.get_payload():
+            request = part.get_payload()
+            head, _, inner_body = request.partition("\r\n\r\n")
+            if not _:
+                head, _, inner_body = request.partition("\n\n")
+            method, path, _version = head.splitlines()[0].split(" ", 2)
+            status, response = self.dispatch(
+                method, path, inner_body.encode("utf-8"), from_batch=True
+            )
+            # Desdobra o cabeçalho (IDs longos vêm quebrados em várias linhas)
+            content_id = "".join(part["Content-ID"].splitlines())
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:]}\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(response)}\r\n"
+            )
+        payload = "".join(chunks) + f"--{boundary}--\r\n"
+        return f"multipart/mixed; boundary={boundary}", payload.encode("utf-8")
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from typing import NamedTuple
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+
+# --- Escopos Google ---
+SCOPES = [
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "https://www.googleapis.com/auth/calendar.readonly",
+    "https://www.googleapis.com/auth/gmail.send",
+    "https://www.googleapis.com/auth/gmail.settings.basic",
+    "https://www.googleapis.com/auth/gmail.readonly",
+]
+
+# --- Configurações ---
+HTTP_TIMEOUT_SECONDS = 30
+
+
+class ThreadLocalHttp:
+    """Transporte autorizado com um httplib2.Http por thread
+
+    O httplib2.Http não é thread-safe: os serviços do discovery são
+    compartilhados entre sessões e threads, mas cada thread faz as requisições
+    pela própria conexão.
+    """
+
+    def __init__(self, creds):
+        self.credentials = creds
+        self._local = threading.local()
+
+    def _http(self) -> AuthorizedHttp:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(
+                self.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+            )
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._http(), name)
+
+
+class GoogleServices(NamedTuple):
+    calendar: object
+    gmail: object
+    http: ThreadLocalHttp
+
+
+def credential_fingerprint(creds) -> str:
+    """Identifica um login (muda a cada novo consentimento, não a cada refresh)"""
+    secret = getattr(creds, "refresh_token", None) or getattr(creds, "token", "")
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()
+
+
+def build_services(creds) -> GoogleServices:
+    """Calendar e Gmail sobre o mesmo transporte autorizado (uma conexão por thread)
+
+    Os documentos de discovery vêm empacotados na biblioteca (static_discovery),
+    sem busca pela rede; o AuthorizedHttp renova o token sozinho quando expira e
+    mantém a conexão HTTP aberta entre as chamadas da mesma thread.
+    """
+    http = ThreadLocalHttp(creds)
+    options = {"http": http, "static_discovery": True, "cache_discovery": False}
+    return GoogleServices(
+        calendar=build("calendar", "v3", **options),
+        gmail=build("gmail", "v1", **options),
+        http=http,
+    )
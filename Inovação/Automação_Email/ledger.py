@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# --- Configurações ---
+# Reservas sem confirmação de envio depois disso são consideradas abandonadas
+# (processo que caiu no meio do envio) e podem ser refeitas
+PENDING_TIMEOUT_SECONDS = 10 * 60
+
+PENDING = "pending"
+SENT = "sent"
+
+
+class LedgerEntry(NamedTuple):
+    event_id: str
+    recipient: str
+    template_hash: str
+    sender: str
+    status: str
+    message_id: Optional[str]
+    thread_id: Optional[str]
+    updated_at: float
+
+
+def template_hash(template: str) -> str:
+    """Identifica o modelo da mensagem (e não o texto final, que muda com a data)"""
+    return hashlib.sha256(template.strip().encode("utf-8")).hexdigest()[:16]
+
+
+class SendLedger:
+    """Registro persistente de confirmações, compartilhado entre app e scheduler
+
+    Cada (evento, destinatário, modelo) é reservado antes do envio por um
+    INSERT na chave primária, o que é atômico mesmo entre processos: dois
+    cliques em "Enviar", ou dois usuários confirmando a mesma reunião, não
+    geram e-mails duplicados. A reserva vira SENT quando o Gmail aceita a
+    mensagem e é desfeita se o envio falha.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sends ("
+                " event_id TEXT NOT NULL, recipient TEXT NOT NULL,"
+                " template_hash TEXT NOT NULL, sender TEXT NOT NULL,"
+                " status TEXT NOT NULL, message_id TEXT, thread_id TEXT,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (event_id, recipient, template_hash))"
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10))
+
+    def reserve(
+        self, event_id: str, recipients: Iterable[str], template: str, sender: str
+    ) -> List[str]:
+        """Reserva os destinatários ainda não confirmados e devolve só esses"""
+        digest = template_hash(template)
+        now = time.time()
+        reserved = []
+        with self._connect() as conn, conn:
+            conn.execute(
+                "DELETE FROM sends WHERE event_id = ? AND status = ? AND updated_at < ?",
+                (event_id, PENDING, now - PENDING_TIMEOUT_SECONDS),
+            )
+            for recipient in recipients:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO sends"
+                    " (event_id, recipient, template_hash, sender, status, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (event_id, recipient.lower(), digest, sender, PENDING, now),
+                )
+                if cursor.rowcount == 1:
+                    reserved.append(recipient)
+        return reserved
+
+    def mark_sent(
+        self,
+        event_id: str,
+        recipients: Iterable[str],
+        template: str,
+        message_id: Optional[str] = None,
+        thread_id: Optional[str] = None,
+    ):
+        digest = template_hash(template)
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "UPDATE sends SET status = ?, message_id = ?, thread_id = ?,"
+                " updated_at = ?"
+                " WHERE event_id = ? AND recipient = ? AND template_hash = ?",
+                [
+                    (
+                        SENT,
+                        message_id,
+                        thread_id,
+                        time.time(),
+                        event_id,
+                        r.lower(),
+                        digest,
+                    )
+                    for r in recipients
+                ],
+            )
+
+    def release(self, event_id: str, recipients: Iterable[str], template: str):
+        """Desfaz reservas de um envio que falhou"""
+        digest = template_hash(template)
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "DELETE FROM sends WHERE event_id = ? AND recipient = ?"
+                " AND template_hash = ? AND status = ?",
+                [(event_id, r.lower(), digest, PENDING) for r in recipients],
+            )
+
+    def confirmed(self, event_ids: Iterable[str]) -> Dict[Tuple[str, str], LedgerEntry]:
+        """Índice {(evento, destinatário): envio} dos eventos informados
+
+        Uma consulta só para a tela inteira; depois disso cada convidado é
+        verificado por busca no dicionário, sem voltar ao banco.
+        """
+        event_ids = list(dict.fromkeys(event_ids))
+        if not event_ids:
+            return {}
+        placeholders = ", ".join("?" * len(event_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT event_id, recipient, template_hash, sender, status,"
+                " message_id, thread_id, updated_at FROM sends"
+                f" WHERE status = ? AND event_id IN ({placeholders})"
+                " ORDER BY updated_at",
+                (SENT, *event_ids),
+            ).fetchall()
+        return {(row[0], row[1]): LedgerEntry(*row) for row in rows}
+
+    def sent_threads(self, sender: str, since: float = 0.0) -> Set[str]:
+        """Threads das confirmações enviadas por um usuário (para acompanhar respostas)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT thread_id FROM sends WHERE sender = ? AND status = ?"
+                " AND thread_id IS NOT NULL AND updated_at >= ?",
+                (sender, SENT, since),
+            ).fetchall()
+        return {row[0] for row in rows}
@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from typing import Optional
+
+from googleapiclient.errors import HttpError
+
+from event_cache import atomic_write_json, cache_key
+
+# --- Configurações ---
+# Validade do perfil (e-mail + assinatura) salvo em disco
+PROFILE_TTL_SECONDS = 24 * 3600
+
+# Assinaturas com estes elementos vão para o BeautifulSoup
+_COMPLEX_HTML_RE = re.compile(r"<(table|style|script|ul|ol)\b", re.IGNORECASE)
+_LINE_BREAK_TAG_RE = re.compile(r"<br\s*/?>|</(p|div|li|h\d|tr)\s*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def credential_key(creds) -> Optional[str]:
+    """Chave do usuário sem chamar a API: e-mail do id_token ou hash do refresh token"""
+    id_token = getattr(creds, "id_token", None)
+    if isinstance(id_token, str) and id_token.count(".") == 2:
+        payload = id_token.split(".")[1]
+        try:
+            claims = json.loads(
+                base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+            )
+            if claims.get("email"):
+                return cache_key(claims["email"])
+        except ValueError:
+            pass
+    refresh_token = getattr(creds, "refresh_token", None)
+    if refresh_token:
+        return hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()[:32]
+    return None
+
+
+def signature_to_text(signature_html: str) -> str:
+    """Converte a assinatura HTML em texto; o BeautifulSoup só entra nos casos complexos"""
+    if not signature_html.strip():
+        return ""
+    if "<" not in signature_html:
+        return html.unescape(signature_html).strip()
+    if _COMPLEX_HTML_RE.search(signature_html):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(signature_html, "html.parser")
+        return soup.get_text(separator="\n").strip()
+
+    text = _LINE_BREAK_TAG_RE.sub("\n", signature_html)
+    text = html.unescape(_TAG_RE.sub("", text))
+    lines = [line.strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def _as_signature(signature_html: str) -> str:
+    signature_plain = signature_to_text(signature_html or "")
+    # Formato padrão de separador de assinatura
+    return f"\n\n-- \n{signature_plain}" if signature_plain else ""
+
+
+def fetch_signature(gmail_service, user_email: str) -> str:
+    """Assinatura do endereço em texto simples (erros da API são propagados)"""
+    try:
+        send_as_settings = (
+            gmail_service.users()
+            .settings()
+            .sendAs()
+            .get(userId="me", sendAsEmail=user_email)
+            .execute()
+        )
+        return _as_signature(send_as_settings.get("signature", ""))
+    except HttpError as error:
+        # 404: o e-mail principal não tem entrada 'sendAs' própria (raro) ou é
+        # um alias; lista todos e usa o primário
+        if error.resp.status != 404:
+            raise
+    aliases = (
+        gmail_service.users().settings().sendAs().list(userId="me").execute()
+    ).get("sendAs", [])
+    if not aliases:
+        return ""
+    # Fallback para o primeiro da lista se nenhum for primário
+    chosen_alias = next(
+        (alias for alias in aliases if alias.get("isPrimary")), aliases[0]
+    )
+    return _as_signature(chosen_alias.get("signature", ""))
+
+
+class ProfileCache:
+    """Perfil do usuário (e-mail e assinatura em texto) salvo em disco com TTL"""
+
+    def __init__(self, cache_dir: str, ttl: float = PROFILE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _filepath(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._filepath(key), "r", encoding="utf-8") as f:
+                profile = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - profile.get("fetched_at", 0) > self.ttl:
+            return None
+        return profile
+
+    def put(self, key: str, email: str, signature: str) -> dict:
+        profile = {"email": email, "signature": signature, "fetched_at": time.time()}
+        atomic_write_json(self._filepath(key), profile)
+        return profile
@@ -0,0 +1,265 @@
+import html
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import closing
+from typing import Dict, Iterable, Optional
+
+from googleapiclient.errors import HttpError
+
+from ledger import SendLedger
+
+# --- Configurações ---
+# Reruns dentro deste intervalo não consultam o histórico do Gmail
+MIN_POLL_INTERVAL_SECONDS = 60
+# Só acompanha confirmações enviadas nos últimos dias
+TRACK_DAYS = 14
+
+CONFIRMED = "confirmed"
+DECLINED = "declined"
+REPLIED = "replied"  # Respondeu, mas sem confirmar nem recusar: vale conferir
+UNANSWERED = "unanswered"
+
+# Respostas com estes termos contam como recusa (a recusa prevalece)
+_DECLINE_RE = re.compile(
+    r"\b(nao (vou|vamos|posso|podemos|poderei|poderemos|consigo|conseguimos"
+    r"|conseguiremos|conseguirei|irei|iremos|estarei|estaremos)"
+    r"|remarcar|reagendar|desmarcar|cancelar|cancelad[ao]|adiar|infelizmente)\b"
+)
+# E estes como confirmação; qualquer outra resposta fica como REPLIED
+_CONFIRM_RE = re.compile(
+    r"\b(confirm\w*|combinado|certo|ok|sim|perfeito|pode ser|tudo certo"
+    r"|estarei|estaremos|presen(ca|te)|nos vemos|ate (la|amanha))\b"
+)
+# Início da mensagem citada na resposta (Gmail, Outlook, em português e inglês):
+# o snippet costuma trazer o texto da própria confirmação logo depois
+_QUOTE_RE = re.compile(
+    r"\bem [^\n]{0,200}?escreveu:|\bon [^\n]{0,200}?wrote:"
+    r"|-{2,} ?(mensagem original|original message)"
+    r"|\bde: [^\n]{0,200}?enviad[ao]:|\bfrom: [^\n]{0,200}?sent:"
+    r"|(^|\s)>"
+)
+# Cabeçalhos que identificam respostas automáticas (ausência, férias etc.)
+AUTO_REPLY_HEADERS = ["Auto-Submitted", "X-Autoreply", "X-Autorespond", "Precedence"]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def strip_quote(text: str) -> str:
+    """Só o que o convidado escreveu, sem a mensagem citada (texto normalizado)"""
+    match = _QUOTE_RE.search(text)
+    return text[: match.start()] if match else text
+
+
+def classify_reply(snippet: str) -> str:
+    # O snippet vem com entidades HTML (ex: &gt; nas linhas citadas)
+    text = strip_quote(_normalize(html.unescape(snippet)))
+    if _DECLINE_RE.search(text):
+        return DECLINED
+    if _CONFIRM_RE.search(text):
+        return CONFIRMED
+    return REPLIED
+
+
+def is_auto_reply(message: dict) -> bool:
+    """Resposta automática (RFC 3834 e os cabeçalhos usados na prática)"""
+    headers = {
+        header["name"].lower(): header.get("value", "").strip().lower()
+        for header in message.get("payload", {}).get("headers", [])
+    }
+    if headers.get("auto-submitted", "no") != "no":
+        return True
+    if "x-autoreply" in headers or "x-autorespond" in headers:
+        return True
+    return headers.get("precedence") in ("auto_reply", "bulk", "junk", "list")
+
+
+class ReplyTracker:
+    """Acompanha as respostas às confirmações pelo histórico do Gmail
+
+    Guarda o último historyId de cada usuário e, a cada consulta, lê só as
+    mensagens que chegaram depois dele (users.history.list): o custo
+    acompanha o volume de e-mails novos, não o tamanho da caixa. Só as
+    mensagens recebidas nas threads das confirmações são abertas.
+    """
+
+    def __init__(self, ledger: SendLedger, min_poll_interval=MIN_POLL_INTERVAL_SECONDS):
+        self.ledger = ledger
+        self.db_path = ledger.db_path
+        self.min_poll_interval = min_poll_interval
+        self._polled_at: Dict[str, float] = {}
+        with self._connect() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reply_cursor ("
+                " user_key TEXT PRIMARY KEY, history_id TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS replies ("
+                " thread_id TEXT PRIMARY KEY, status TEXT NOT NULL,"
+                " message_id TEXT, snippet TEXT, received_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10))
+
+    def _history_id(self, user_key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT history_id FROM reply_cursor WHERE user_key = ?", (user_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _save_history_id(self, user_key: str, history_id: str):
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reply_cursor VALUES (?, ?)",
+                (user_key, str(history_id)),
+            )
+
+    def _record(self, thread_id: str, message: dict):
+        snippet = message.get("snippet", "")
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    classify_reply(snippet),
+                    message["id"],
+                    snippet,
+                    int(message.get("internalDate", 0)) / 1000 or time.time(),
+                ),
+            )
+
+    def _record_latest(self, gmail_service, thread_id: str, message_ids) -> bool:
+        """Registra a mensagem mais recente que não é resposta automática"""
+        for message_id in reversed(message_ids):
+            message = self._get_message(gmail_service, message_id)
+            if not is_auto_reply(message):
+                self._record(thread_id, message)
+                return True
+        return False
+
+    def _check_thread(self, gmail_service, thread_id: str):
+        """Última resposta do convidado numa thread (usado só sem historyId válido)"""
+        thread = (
+            gmail_service.users()
+            .threads()
+            .get(userId="me", id=thread_id, format="minimal")
+            .execute()
+        )
+        received = [
+            m["id"]
+            for m in thread.get("messages", [])
+            if "SENT" not in m.get("labelIds", [])
+        ]
+        self._record_latest(gmail_service, thread_id, received)
+
+    def _get_message(self, gmail_service, message_id: str) -> dict:
+        return (
+            gmail_service.users()
+            .messages()
+            .get(
+                userId="me",
+                id=message_id,
+                format="metadata",
+                metadataHeaders=AUTO_REPLY_HEADERS,
+            )
+            .execute()
+        )
+
+    def _full_check(self, gmail_service, user_key: str, threads: Iterable[str]):
+        """Sem ponto de partida: marca o historyId atual e confere as threads uma vez"""
+        profile = gmail_service.users().getProfile(userId="me").execute()
+        for thread_id in threads:
+            try:
+                self._check_thread(gmail_service, thread_id)
+            except HttpError as error:
+                if error.resp.status != 404:  # Thread apagada: fica sem resposta
+                    raise
+        self._save_history_id(user_key, profile["historyId"])
+
+    def poll(self, gmail_service, user_key: str, force: bool = False) -> int:
+        """Processa as mensagens novas desde o último historyId; devolve quantas
+        respostas foram registradas"""
+        now = time.time()
+        if (
+            not force
+            and now - self._polled_at.get(user_key, 0) < self.min_poll_interval
+        ):
+            return 0
+        self._polled_at[user_key] = now
+
+        threads = self.ledger.sent_threads(user_key, now - TRACK_DAYS * 86400)
+        history_id = self._history_id(user_key)
+        if history_id is None:
+            self._full_check(gmail_service, user_key, threads)
+            return 0
+
+        replies = {}  # thread -> ids das mensagens recebidas, em ordem
+        params = {
+            "userId": "me",
+            "startHistoryId": history_id,
+            "historyTypes": ["messageAdded"],
+        }
+        try:
+            while True:
+                page = gmail_service.users().history().list(**params).execute()
+                for record in page.get("history", []):
+                    for added in record.get("messagesAdded", []):
+                        message = added["message"]
+                        if message.get("threadId") not in threads:
+                            continue
+                        if "SENT" in message.get("labelIds", []):
+                            continue
+                        replies.setdefault(message["threadId"], []).append(
+                            message["id"]
+                        )
+                history_id = page.get("historyId", history_id)
+                params["pageToken"] = page.get("nextPageToken")
+                if not params["pageToken"]:
+                    break
+        except HttpError as error:
+            # 404: historyId antigo demais (o Gmail guarda cerca de uma semana)
+            if error.resp.status != 404:
+                raise
+            self._full_check(gmail_service, user_key, threads)
+            return 0
+
+        recorded = sum(
+            self._record_latest(gmail_service, thread_id, message_ids)
+            for thread_id, message_ids in replies.items()
+        )
+        self._save_history_id(user_key, history_id)
+        return recorded
+
+    def statuses(self, thread_ids: Iterable[str]) -> Dict[str, str]:
+        """{thread: CONFIRMED | DECLINED | REPLIED}; threads sem resposta ficam de fora"""
+        thread_ids = [t for t in dict.fromkeys(thread_ids) if t]
+        if not thread_ids:
+            return {}
+        placeholders = ", ".join("?" * len(thread_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT thread_id, status FROM replies WHERE thread_id IN ({placeholders})",
+                thread_ids,
+            ).fetchall()
+        return dict(rows)
+
+
+def meeting_status(entries, reply_statuses: Dict[str, str]) -> Optional[str]:
+    """Situação de uma reunião a partir dos seus envios (LedgerEntry)
+
+    None se nada foi enviado; uma recusa em qualquer thread prevalece, depois
+    a confirmação e por último uma resposta que não foi classificada.
+    """
+    statuses = {reply_statuses.get(entry.thread_id, UNANSWERED) for entry in entries}
+    if not statuses:
+        return None
+    for status in (DECLINED, CONFIRMED, REPLIED):
+        if status in statuses:
+            return status
+    return UNANSWERED
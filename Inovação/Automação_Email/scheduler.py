@@ -0,0 +1,279 @@
+"""Serviço de confirmação automática de reuniões (sem interface).
+
+Para cada usuário que ativou o envio automático no app, mantém a agenda em
+dia por sincronização incremental e envia a confirmação padrão N horas antes
+de cada reunião com convidados externos.
+
+Uso: python scheduler.py --horas-antes 24 --workers 8
+"""
+
+import argparse
+import datetime
+import heapq
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+
+from confirmation import (
+    CONFIRMATION_TEMPLATE,
+    build_raw_message,
+    confirmation_subject,
+    default_body,
+    group_guests,
+)
+from credential_store import CredentialStore
+from event_cache import EventCache
+from google_services import build_services
+from ledger import SendLedger
+from profile_cache import ProfileCache, fetch_signature
+
+# --- Configurações ---
+CACHE_DIR = os.environ.get("CONFIRMACAO_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache"
+)
+HOURS_BEFORE = 24
+# Reuniões mais próximas que isso não recebem mais confirmação automática
+MIN_LEAD_HOURS = 1
+SYNC_INTERVAL_SECONDS = 300
+MAX_WORKERS = 8
+
+log = logging.getLogger("confirmacoes")
+
+# (horário de envio, chave do usuário, id do evento, início do evento)
+QueueEntry = Tuple[float, str, str, str]
+
+
+def event_start(ev) -> Optional[datetime.datetime]:
+    """Início com fuso; eventos de dia inteiro não são reuniões e ficam de fora"""
+    start = ev.get("start", {}).get("dateTime")
+    if not start:
+        return None
+    return datetime.datetime.fromisoformat(start.replace("Z", "+00:00"))
+
+
+# --- Um usuário ---
+class UserAgent:
+    """Agenda, serviços e perfil de um usuário; um lock serializa as chamadas
+    (o transporte httplib2 não é seguro entre threads)"""
+
+    def __init__(self, key: str, creds, profile_cache: ProfileCache):
+        self.key = key
+        self.creds = creds
+        self.profile_cache = profile_cache
+        self.lock = threading.Lock()
+        self.cache = EventCache(
+            os.path.join(CACHE_DIR, "events", f"{key}__primary.json"),
+            min_sync_interval=0,
+        )
+        self._services = None
+
+    @property
+    def services(self):
+        if self._services is None:
+            self._services = build_services(self.creds)
+        return self._services
+
+    def sync(self):
+        with self.lock:
+            self.cache.sync(self.services.calendar, force=True)
+
+    def signature(self) -> str:
+        profile = self.profile_cache.get(self.key)
+        if profile:
+            return profile["signature"]
+        gmail = self.services.gmail
+        email = gmail.users().getProfile(userId="me").execute()["emailAddress"]
+        signature = fetch_signature(gmail, email)
+        self.profile_cache.put(self.key, email, signature)
+        return signature
+
+    def send(self, ev, emails: List[str]) -> dict:
+        with self.lock:
+            raw = build_raw_message(
+                emails,
+                confirmation_subject(ev),
+                default_body(ev, emails),
+                self.signature(),
+            )
+            return (
+                self.services.gmail.users()
+                .messages()
+                .send(userId="me", body={"raw": raw})
+                .execute()
+            )
+
+
+# --- Agendador ---
+class Scheduler:
+    def __init__(
+        self,
+        credential_store: CredentialStore,
+        hours_before: float = HOURS_BEFORE,
+        max_workers: int = MAX_WORKERS,
+        sync_interval: float = SYNC_INTERVAL_SECONDS,
+    ):
+        self.credential_store = credential_store
+        self.hours_before = hours_before
+        self.sync_interval = sync_interval
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.ledger = SendLedger(os.path.join(CACHE_DIR, "ledger.db"))
+        self.profile_cache = ProfileCache(os.path.join(CACHE_DIR, "profiles"))
+        self.agents: Dict[str, UserAgent] = {}
+        self.queue: List[QueueEntry] = []  # heap ordenado pelo horário de envio
+        self.queued = set()
+        self.stop_event = threading.Event()
+
+    def refresh_agents(self):
+        """Acompanha quem ativou ou desativou o envio automático"""
+        creds_by_key = self.credential_store.load_all()
+        for key in set(self.agents) - set(creds_by_key):
+            del self.agents[key]
+        for key, creds in creds_by_key.items():
+            if key not in self.agents:
+                self.agents[key] = UserAgent(key, creds, self.profile_cache)
+
+    def _sync_agent(self, agent: UserAgent) -> List[QueueEntry]:
+        """Sincroniza a agenda e devolve as confirmações a agendar"""
+        try:
+            agent.sync()
+        except (HttpError, RefreshError) as error:
+            log.warning("Falha ao sincronizar %s: %s", agent.key, error)
+            return []
+        except Exception:
+            # Rede, credencial corrompida etc.: só este usuário fica de fora
+            log.exception("Erro inesperado ao sincronizar %s", agent.key)
+            return []
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        lead = datetime.timedelta(hours=self.hours_before)
+        entries = []
+        for ev in agent.cache.events_between(
+            now.date(), (now + lead + datetime.timedelta(days=1)).date()
+        ):
+            start = event_start(ev)
+            if start is None or not group_guests([ev]):
+                continue
+            if start - now < datetime.timedelta(hours=MIN_LEAD_HOURS):
+                continue
+            send_at = max((start - lead).timestamp(), now.timestamp())
+            entries.append((send_at, agent.key, ev["id"], start.isoformat()))
+        return entries
+
+    def sync_all(self):
+        """Sincroniza todos os usuários em paralelo (limitado pelo pool)"""
+        self.refresh_agents()
+        started = time.monotonic()
+        results = self.pool.map(self._sync_agent, list(self.agents.values()))
+        added = 0
+        for entries in results:
+            for entry in entries:
+                if entry[1:] not in self.queued:
+                    self.queued.add(entry[1:])
+                    heapq.heappush(self.queue, entry)
+                    added += 1
+        log.info(
+            "%d usuário(s) sincronizado(s) em %.1fs; %d envio(s) agendado(s), %d na fila",
+            len(self.agents),
+            time.monotonic() - started,
+            added,
+            len(self.queue),
+        )
+
+    def _send(self, entry: QueueEntry):
+        _, key, event_id, start = entry
+        agent = self.agents.get(key)
+        ev = agent.cache.events.get(event_id) if agent else None
+        current_start = event_start(ev) if ev else None
+        # Cancelado ou remarcado: a nova data gera outra entrada na sincronização
+        if current_start is None or current_start.isoformat() != start:
+            return
+        guests = group_guests([ev])
+        if not guests:
+            return
+        emails = [email for email, _ in next(iter(guests.values()))["guests"]]
+        # Quem já foi confirmado (pelo app ou por outro usuário) fica de fora
+        emails = self.ledger.reserve(event_id, emails, CONFIRMATION_TEMPLATE, key)
+        if not emails:
+            return
+        try:
+            sent = agent.send(ev, emails)
+        except (HttpError, RefreshError) as error:
+            self.ledger.release(event_id, emails, CONFIRMATION_TEMPLATE)
+            log.warning("Falha ao enviar %s / %s: %s", key, event_id, error)
+            return
+        except Exception:
+            # Libera a reserva para a próxima tentativa não esperar o timeout
+            self.ledger.release(event_id, emails, CONFIRMATION_TEMPLATE)
+            log.exception("Erro inesperado ao enviar %s / %s", key, event_id)
+            return
+        self.ledger.mark_sent(
+            event_id,
+            emails,
+            CONFIRMATION_TEMPLATE,
+            sent.get("id"),
+            sent.get("threadId"),
+        )
+        log.info(
+            "Confirmação enviada: %s / %s (%s)", key, ev["summary"], sent.get("id")
+        )
+
+    def _send_logged(self, entry: QueueEntry):
+        """_send no pool: o future é descartado, então nenhum erro pode sumir"""
+        try:
+            self._send(entry)
+        except Exception:
+            log.exception("Erro ao processar %s / %s", entry[1], entry[2])
+
+    def run(self):
+        next_sync = 0.0
+        while not self.stop_event.is_set():
+            now = time.time()
+            if now >= next_sync:
+                try:
+                    self.sync_all()
+                except Exception:
+                    log.exception("Erro na sincronização geral")
+                next_sync = time.time() + self.sync_interval
+            while self.queue and self.queue[0][0] <= time.time():
+                entry = heapq.heappop(self.queue)
+                self.queued.discard(entry[1:])
+                self.pool.submit(self._send_logged, entry)
+            wake_at = min(next_sync, self.queue[0][0] if self.queue else next_sync)
+            self.stop_event.wait(max(wake_at - time.time(), 0))
+        self.pool.shutdown(wait=True)
+
+    def stop(self, *_):
+        log.info("Encerrando...")
+        self.stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horas-antes", type=float, default=HOURS_BEFORE)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--intervalo-sync", type=float, default=SYNC_INTERVAL_SECONDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    scheduler = Scheduler(
+        CredentialStore(os.path.join(CACHE_DIR, "credentials")),
+        hours_before=args.horas_antes,
+        max_workers=args.workers,
+        sync_interval=args.intervalo_sync,
+    )
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
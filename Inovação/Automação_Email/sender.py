@@ -0,0 +1,99 @@
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from googleapiclient.errors import HttpError
+
+# --- Configurações ---
+# O Gmail recomenda no máximo 50 chamadas por requisição em lote
+BATCH_SIZE = 50
+# Pausa entre lotes para não estourar a cota por usuário
+PAUSE_BETWEEN_BATCHES_SECONDS = 1.0
+
+
+@dataclass
+class OutgoingMessage:
+    key: str  # Identifica a mensagem no resultado (ex: rótulo do evento)
+    raw: str
+    recipients: List[str] = field(default_factory=list)
+
+
+@dataclass
+class SendResult:
+    key: str
+    ok: bool
+    message_id: Optional[str] = None
+    thread_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    results: List[SendResult]
+    elapsed_seconds: float
+
+    @property
+    def sent(self):
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def throughput(self):
+        """Mensagens enviadas por segundo"""
+        return self.sent / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+def _error_text(exception):
+    if isinstance(exception, HttpError):
+        return f"HTTP {exception.resp.status}: {exception.reason}"
+    return str(exception)
+
+
+def send_batch(gmail_service, messages: List[OutgoingMessage]) -> BatchReport:
+    """Envia várias mensagens pelo endpoint de lote do Gmail
+
+    Cada lote de até BATCH_SIZE mensagens é uma única requisição HTTP; o
+    resultado de cada mensagem é reportado individualmente.
+    """
+    results = {}
+    started = time.perf_counter()
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            results[request_id] = SendResult(
+                request_id, ok=False, error=_error_text(exception)
+            )
+        else:
+            results[request_id] = SendResult(
+                request_id,
+                ok=True,
+                message_id=response.get("id"),
+                thread_id=response.get("threadId"),
+            )
+
+    for offset in range(0, len(messages), BATCH_SIZE):
+        if offset:
+            time.sleep(PAUSE_BETWEEN_BATCHES_SECONDS)
+        batch = gmail_service.new_batch_http_request(callback=callback)
+        for message in messages[offset : offset + BATCH_SIZE]:
+            batch.add(
+                gmail_service.users()
+                .messages()
+                .send(userId="me", body={"raw": message.raw}),
+                request_id=message.key,
+            )
+        try:
+            batch.execute()
+        except Exception as error:
+            # Falha do lote inteiro (HTTP, timeout, conexão): marca as mensagens
+            # que faltaram, para quem chamou poder liberar as reservas
+            for message in messages[offset : offset + BATCH_SIZE]:
+                results.setdefault(
+                    message.key,
+                    SendResult(message.key, ok=False, error=_error_text(error)),
+                )
+
+    elapsed = time.perf_counter() - started
+    return BatchReport(
+        results=[results[message.key] for message in messages],
+        elapsed_seconds=elapsed,
+    )
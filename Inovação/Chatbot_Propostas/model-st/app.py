@@ -1,22 +1,59 @@
+import profiling  # Primeiro import: marca o início do processo (perfil de startup)
 import base64
 import streamlit as st
-import openai
 import time
 import os
 import json
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
-from google import genai
-from google.genai import types
-import hashlib
 import io
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from storage import ConversationStore, generate_conversation_id
+from messages import MessageStore
+from tokens import count_tokens, preflight
+from extraction import ExtractionCache, file_hash
+from exporter import EXPORT_FORMATS, iter_bulk_zip, to_bytes
+from lifecycle import KIND_FILE, KIND_THREAD, ResourceRegistry
+from retrieval import StageIndex, format_passages_for_prompt
+from insights import (
+    LinkVerifier,
+    format_insights_for_proposal,
+    format_insights_markdown,
+    merge_insights,
+    parse_insights,
+)
+
+# Os SDKs da OpenAI e do Gemini são importados sob demanda (ver get_openai_client
+# e get_gemini_client) para não pesar no tempo até a primeira renderização.
+profiling.begin_run()
 
 # ==================== CONFIGURAÇÕES E CONSTANTES ====================
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CONVERSATIONS_DIR = os.path.join(SCRIPT_DIR, "conversations")
-os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+CACHE_DIR = os.path.join(SCRIPT_DIR, "cache")
+# Documentos de etapas de entrega usados para fundamentar as propostas
+RAG_DOCS_DIR = os.path.join(SCRIPT_DIR, "..", "training", "RAG")
+RAG_TOP_K = 4
+
+# Pesquisa de insights em paralelo (fan-out por tópico da ata)
+TOPIC_EXTRACTION_MODEL = "gemini-2.5-flash"
+RESEARCH_MAX_TOPICS = 5
+RESEARCH_MAX_WORKERS = 4
+RESEARCH_CONTEXT_CHARS = 3000
+conversation_store = ConversationStore(CONVERSATIONS_DIR)
+# Conversas sem alteração há mais dias que isso vão para o arquivo compactado
+CONVERSATION_ARCHIVE_DAYS = 30
+
+# Anexos com texto até este limite vão direto no prompt, sem file_search
+INLINE_FILE_MAX_TOKENS = 8000
+# Em assistentes com Code Interpreter, planilhas e JSON seguem como arquivo
+CODE_INTERPRETER_EXTENSIONS = (".csv", ".json")
+
+# Quantidade de mensagens exibidas por página do histórico
+HISTORY_PAGE_SIZE = 10
 
 # ==================== MODELOS DE DADOS ====================
 
@@ -29,6 +66,10 @@ class AssistantConfig(BaseModel):
     temperature: float = 0.7
     supports_files: bool = False
     supports_code_interpreter: bool = False
+    uses_local_rag: bool = False
+    # Orçamento de tokens de entrada: aviso acima do primeiro, corte acima do segundo
+    warn_input_tokens: int = 30_000
+    max_input_tokens: int = 100_000
 
 
 class Message(BaseModel):
@@ -37,15 +78,18 @@ class Message(BaseModel):
     timestamp: Optional[str] = None
 
 
-class Conversation(BaseModel):
+class ConversationSummary(BaseModel):
     id: str
     name: str
-    messages: List[Message] = []
     assistant_key: str
     created_at: str
     updated_at: str
 
 
+class Conversation(ConversationSummary):
+    messages: List[Message] = []
+
+
 # ==================== ASSISTENTES DISPONÍVEIS ====================
 
 AVAILABLE_ASSISTANTS: Dict[str, AssistantConfig] = {
@@ -66,15 +110,18 @@ AVAILABLE_ASSISTANTS: Dict[str, AssistantConfig] = {
         name="💼 Criador de Propostas Comerciais",
         description="Especialista em criar propostas comerciais persuasivas",
         supports_code_interpreter=True,
+        uses_local_rag=True,
     ),
     "pesquisador_insights": AssistantConfig(
         id="gemini-2.5-pro",
         name="🔍 Pesquisador de Insights para Proposta",
+        model="gemini-2.5-pro",
         description="Inteligência de Mercado com Google Search (Gemini)",
     ),
     "pesquisador_tendencias": AssistantConfig(
         id="gemini-2.5-pro",
         name="📈 Pesquisador de Tendências para AT",
+        model="gemini-2.5-pro",
         description="Análise de Tendências de Mercado com Google Search (Gemini)",
     ),
 }
@@ -84,80 +131,158 @@ DEFAULT_ASSISTANT = "ata_para_proposta"
 # ==================== INICIALIZAÇÃO ====================
 
 
-def initialize_client():
-    """Inicializa o cliente OpenAI com tratamento de erros"""
+def get_secret(name: str) -> Optional[str]:
+    """Lê uma chave das secrets do Streamlit ou das variáveis de ambiente"""
     try:
-        api_key = st.secrets.get("OPENAI_API_KEY") or os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            st.error("❌ API Key da OpenAI não configurada!", icon="🚨")
-            st.stop()
-        return openai.OpenAI(api_key=api_key)
+        value = st.secrets.get(name)
+    except Exception:  # Sem secrets.toml configurado
+        value = None
+    return value or os.environ.get(name)
+
+
+@st.cache_resource(show_spinner=False)
+def _create_openai_client(api_key: str):
+    openai = profiling.timed_import("openai")
+    return openai.OpenAI(api_key=api_key)
+
+
+def get_openai_client():
+    """Cliente OpenAI único por processo, criado (e importado) no primeiro uso"""
+    api_key = get_secret("OPENAI_API_KEY")
+    if not api_key:
+        st.error("❌ API Key da OpenAI não configurada!", icon="🚨")
+        st.stop()
+    try:
+        return _create_openai_client(api_key)
     except Exception as e:
         st.error(f"❌ Erro ao inicializar cliente OpenAI: {e}", icon="🚨")
         st.stop()
 
 
+@st.cache_resource(show_spinner=False)
+def _create_gemini_client(api_key: Optional[str]):
+    genai = profiling.timed_import("google.genai")
+    return genai.Client(api_key=api_key)
+
+
+def get_gemini_client():
+    """Cliente Gemini único por processo, criado (e importado) no primeiro uso"""
+    return _create_gemini_client(get_secret("GEMINI_API_KEY"))
+
+
+def get_genai_types():
+    """Módulo google.genai.types, importado sob demanda"""
+    return profiling.timed_import("google.genai.types")
+
+
 def initialize_session_state():
     """Inicializa todas as variáveis de sessão"""
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = get_current_user_id()
+
+    start_archival_job()
+
+    # Fábricas em vez de valores: a pasta de conversas só é lida na 1ª execução
     defaults = {
-        "session_id": f"session_{int(time.time())}",
-        "messages": [],
-        "thread_id": None,
-        "assistant_key": DEFAULT_ASSISTANT,
-        "current_conversation_id": None,
-        "conversations": load_all_conversations(),
-        "uploaded_files": [],
-        "stop_generation": False,
+        "session_id": lambda: f"session_{int(time.time())}",
+        "messages": new_message_store,
+        "thread_id": lambda: None,
+        "assistant_key": lambda: DEFAULT_ASSISTANT,
+        "current_conversation_id": lambda: None,
+        "conversations": load_all_conversations,
+        "uploaded_files": list,
+        "stop_generation": lambda: False,
+        "history_window": lambda: HISTORY_PAGE_SIZE,
+        "research_fanout": lambda: False,
     }
 
-    for key, value in defaults.items():
+    for key, factory in defaults.items():
         if key not in st.session_state:
-            st.session_state[key] = value
+            st.session_state[key] = factory()
+
+
+@st.cache_resource
+def start_archival_job() -> threading.Thread:
+    """Arquiva conversas antigas em segundo plano, uma vez por processo"""
+    job = threading.Thread(
+        target=conversation_store.archive_all,
+        args=(CONVERSATION_ARCHIVE_DAYS,),
+        name="arquivamento-conversas",
+        daemon=True,
+    )
+    job.start()
+    return job
 
 
 # ==================== GERENCIAMENTO DE CONVERSAS ====================
 
 
-def generate_conversation_id() -> str:
-    """Gera ID único para conversas"""
-    return hashlib.md5(f"{time.time()}".encode()).hexdigest()[:12]
+def get_current_user_id() -> str:
+    """Identifica o usuário logado para particionar as conversas"""
+    user = getattr(st, "user", None) or getattr(st, "experimental_user", None)
+    try:
+        email = getattr(user, "email", None)
+    except Exception:
+        email = None
+    return email or "anonimo"
 
 
 def save_conversation(conversation: Conversation):
-    """Salva conversa em arquivo JSON"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation.id}.json")
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(conversation.model_dump(), f, ensure_ascii=False, indent=2)
+    """Salva conversa em arquivo JSON (escrita atômica)"""
+    conversation_store.save(
+        st.session_state.user_id, conversation.id, conversation.model_dump()
+    )
 
 
 def load_conversation(conversation_id: str) -> Optional[Conversation]:
     """Carrega conversa do arquivo"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return Conversation(**data)
-    except FileNotFoundError:
-        return None
+    data = conversation_store.load(st.session_state.user_id, conversation_id)
+    return Conversation(**data) if data else None
+
 
+def update_conversation_messages(conversation_id: str, messages: MessageStore):
+    """Atualiza as mensagens da conversa sem perder alterações concorrentes"""
 
-def load_all_conversations() -> List[Conversation]:
-    """Carrega todas as conversas salvas"""
-    conversations = []
-    for filename in os.listdir(CONVERSATIONS_DIR):
-        if filename.endswith(".json"):
-            conv_id = filename.replace(".json", "")
-            conv = load_conversation(conv_id)
-            if conv:
-                conversations.append(conv)
+    def mutate(data: dict) -> dict:
+        # Mensagens descarregadas reaproveitam o conteúdo já gravado no arquivo
+        data["messages"] = messages.to_dicts(data.get("messages"))
+        data["updated_at"] = datetime.now().isoformat()
+        return data
+
+    conversation_store.update(st.session_state.user_id, conversation_id, mutate)
+
+
+def rename_conversation(conversation_id: str, new_name: str):
+    """Renomeia a conversa relendo o arquivo para não sobrescrever mensagens"""
+
+    def mutate(data: dict) -> dict:
+        data["name"] = new_name
+        return data
+
+    conversation_store.update(st.session_state.user_id, conversation_id, mutate)
+
+
+def load_all_conversations() -> List[ConversationSummary]:
+    """Carrega os metadados das conversas salvas (sem o conteúdo das mensagens)"""
+    conversations = [
+        ConversationSummary(**data)
+        for data in conversation_store.list(st.session_state.user_id)
+    ]
     return sorted(conversations, key=lambda x: x.updated_at, reverse=True)
 
 
 def delete_conversation(conversation_id: str):
-    """Deleta uma conversa"""
-    filepath = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    """Deleta uma conversa e libera suas threads e arquivos na OpenAI"""
+    conversation_store.delete(st.session_state.user_id, conversation_id)
+    get_resource_registry().release_conversation(conversation_id)
+
+
+def new_message_store(messages: Optional[List[Message]] = None) -> MessageStore:
+    """Cria o histórico compacto da sessão, opcionalmente já preenchido"""
+    store = MessageStore(conversation_store, st.session_state.user_id)
+    for msg in messages or []:
+        store.append(msg.role, msg.content, msg.timestamp)
+    return store
 
 
 def create_new_conversation() -> Conversation:
@@ -175,48 +300,29 @@ def create_new_conversation() -> Conversation:
 # ==================== UTILITÁRIOS ====================
 
 
-def format_message_for_download(messages: List[Message]) -> str:
-    """Formata mensagens para download em Markdown"""
-    output = "# Conversa Exportada\n\n"
-    output += f"**Data:** {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n\n"
-    output += "---\n\n"
-
-    for msg in messages:
-        role = "🧑 **Você**" if msg.role == "user" else "🤖 **Assistente**"
-        output += f"### {role}\n\n{msg.content}\n\n"
-        if msg.timestamp:
-            output += f"*{msg.timestamp}*\n\n"
-        output += "---\n\n"
-
-    return output
-
-
-# ==================== HANDLERS DE STREAMING ====================
-
-
-class StreamingEventHandler(openai.AssistantEventHandler):
-    def __init__(self, text_placeholder):
-        super().__init__()
-        self.text_placeholder = text_placeholder
-        self.full_response = ""
-        self.start_time = time.time()
-
-    def on_text_delta(self, delta, snapshot):
-        if st.session_state.stop_generation:
-            raise Exception("Generation stopped by user")
-
-        self.full_response += delta.value
-        self.text_placeholder.markdown(self.full_response + "▌")
-
-    def on_text_done(self, text):
-        self.text_placeholder.markdown(self.full_response)
+def export_current_conversation(format_key: str):
+    """Exporta a conversa aberta em fluxo, mensagem a mensagem"""
+    store = st.session_state.messages
+    messages = (
+        (record.role, store.content(record), record.timestamp) for record in store
+    )
+    return to_bytes(EXPORT_FORMATS[format_key].render("Conversa Exportada", messages))
 
-    def on_exception(self, exception):
-        if "stopped by user" not in str(exception):
-            st.error(f"❌ Erro: {exception}")
 
-    def get_full_response(self):
-        return self.full_response
+def iter_saved_conversations():
+    """Conversas salvas do usuário, uma por vez (arquivadas não são reidratadas)"""
+    for summary in st.session_state.conversations:
+        data = conversation_store.load(
+            st.session_state.user_id, summary.id, rehydrate=False
+        )
+        if not data:
+            continue
+        messages = (
+            (msg["role"], msg["content"], msg.get("timestamp"))
+            for msg in data.get("messages", [])
+        )
+        filename = f"{summary.updated_at[:10]}_{summary.id[:8]}"
+        yield filename, data.get("name", summary.name), messages
 
 
 # ==================== FUNÇÕES DE PROCESSAMENTO ====================
@@ -229,21 +335,211 @@ def upload_file_to_openai(file) -> Optional[str]:
         file_like = io.BytesIO(file_bytes)
         file_like.name = file.name
 
-        uploaded_file = client.files.create(file=file_like, purpose="assistants")
+        uploaded_file = get_openai_client().files.create(
+            file=file_like, purpose="assistants"
+        )
+        get_resource_registry().record(
+            KIND_FILE,
+            uploaded_file.id,
+            conversation_id=st.session_state.current_conversation_id,
+        )
         return uploaded_file.id
     except Exception as e:
         st.error(f"❌ Erro ao fazer upload: {e}")
         return None
 
 
+@st.cache_resource
+def get_resource_registry() -> ResourceRegistry:
+    """Registro das threads e arquivos criados na OpenAI, para reuso e coleta"""
+    return ResourceRegistry(os.path.join(CACHE_DIR, "openai_resources.db"))
+
+
+def create_thread(client, assistant_id: str, ephemeral: bool = False) -> str:
+    """Cria uma thread e a registra (as efêmeras são apagadas na próxima coleta)"""
+    thread = client.beta.threads.create()
+    get_resource_registry().record(
+        KIND_THREAD,
+        thread.id,
+        conversation_id=None if ephemeral else st.session_state.current_conversation_id,
+        assistant_id=assistant_id,
+        ephemeral=ephemeral,
+    )
+    return thread.id
+
+
+def restore_conversation_thread(conversation_id: str, assistant_key: str):
+    """Reabre a thread da conversa com o assistente, se ela ainda existir"""
+    assistant_info = AVAILABLE_ASSISTANTS.get(assistant_key)
+    st.session_state.thread_id = (
+        get_resource_registry().thread_for(conversation_id, assistant_info.id)
+        if assistant_info
+        else None
+    )
+
+
+@st.cache_resource
+def get_extraction_cache() -> ExtractionCache:
+    return ExtractionCache(os.path.join(CACHE_DIR, "extracted"))
+
+
+def attach_uploaded_file(file, assistant_info: AssistantConfig) -> Optional[dict]:
+    """Anexa o arquivo: texto curto vai inline, o resto é enviado à OpenAI"""
+    data = file.getvalue()
+    keep_as_file = (
+        assistant_info.supports_code_interpreter
+        and file.name.lower().endswith(CODE_INTERPRETER_EXTENSIONS)
+    )
+    text = None if keep_as_file else get_extraction_cache().extract(file.name, data)
+
+    if text is not None:
+        tokens = count_tokens(text)
+        if tokens <= INLINE_FILE_MAX_TOKENS:
+            return {
+                "name": file.name,
+                "id": f"inline_{file_hash(data)[:16]}",
+                "inline_text": text,
+                "tokens": tokens,
+            }
+
+    file.seek(0)
+    file_id = upload_file_to_openai(file)
+    if not file_id:
+        return None
+    return {"name": file.name, "id": file_id}
+
+
+def pending_inline_files(thread_id: Optional[str] = None) -> List[dict]:
+    """Anexos inline ainda não enviados para a thread (todos, se não houver)"""
+    return [
+        f
+        for f in st.session_state.uploaded_files
+        if "inline_text" in f and (thread_id is None or f.get("thread_id") != thread_id)
+    ]
+
+
+def with_inline_files(prompt: str, thread_id: Optional[str] = None) -> str:
+    """Anexa ao prompt o texto dos arquivos pequenos
+
+    Numa thread que persiste, cada arquivo é enviado uma única vez.
+    """
+    files = pending_inline_files(thread_id)
+    if not files:
+        return prompt
+    blocks = [f"[Arquivo: {f['name']}]\n{f['inline_text']}" for f in files]
+    for f in files:
+        f["thread_id"] = thread_id
+    return "{}\n\n**ARQUIVOS ANEXADOS:**\n{}".format(prompt, "\n\n".join(blocks))
+
+
+def remote_file_ids() -> List[str]:
+    return [f["id"] for f in st.session_state.uploaded_files if "inline_text" not in f]
+
+
+@st.cache_resource
+def get_stage_index() -> StageIndex:
+    """Índice local das etapas de entrega, compartilhado entre sessões"""
+    return StageIndex(
+        docs_dir=RAG_DOCS_DIR, cache_path=os.path.join(CACHE_DIR, "rag_index.json")
+    )
+
+
+def build_stage_context(query: str) -> Optional[str]:
+    """Busca as etapas de entrega mais relevantes para a consulta"""
+    try:
+        passages = get_stage_index().search(query, k=RAG_TOP_K)
+    except OSError as e:
+        st.warning(f"⚠️ Base de etapas indisponível: {e}")
+        return None
+    return format_passages_for_prompt(passages)
+
+
+def with_stage_context(prompt: str, query: Optional[str] = None) -> str:
+    """Anexa ao prompt as etapas de entrega recuperadas localmente"""
+    stage_context = build_stage_context(query or prompt)
+    if not stage_context:
+        return prompt
+    return f"""{prompt}
+
+**ETAPAS DE ENTREGA DE REFERÊNCIA (base interna):**
+{stage_context}"""
+
+
+def run_preflight(prompt: str) -> Optional[str]:
+    """Estima tokens, custo e latência antes da chamada e ajusta a entrada ao limite
+
+    Nos assistentes com thread, o histórico da sessão também conta como entrada;
+    a contagem de cada mensagem fica guardada no registro e não é refeita.
+    Devolve None se a mensagem não cabe nem com o histórico encurtado.
+    """
+    assistant_info = AVAILABLE_ASSISTANTS[st.session_state.assistant_key]
+    message_tokens = []
+    if assistant_info.id.startswith("asst_") and st.session_state.thread_id:
+        messages = st.session_state.messages
+        message_tokens = [messages.token_count(record) for record in messages]
+        inline_files = pending_inline_files(st.session_state.thread_id)
+    else:
+        inline_files = pending_inline_files()
+
+    report = preflight(
+        prompt,
+        model=assistant_info.model,
+        warn_tokens=assistant_info.warn_input_tokens,
+        max_tokens=assistant_info.max_input_tokens,
+        history_tokens=sum(f["tokens"] for f in inline_files),
+        message_tokens=message_tokens,
+    )
+    if report.blocked:
+        st.error(
+            f"🚫 A entrada passa do limite de {assistant_info.max_input_tokens:,} "
+            "tokens mesmo sem o histórico: remova anexos ou encurte a mensagem."
+        )
+        return None
+    # Lido pelo process_with_assistant para limitar o contexto da execução
+    st.session_state.history_window = report.history_messages
+    if report.history_messages is not None:
+        st.warning(
+            f"📚 O histórico passou do limite: só as {report.history_messages} "
+            "mensagens mais recentes vão como contexto."
+        )
+    st.caption(
+        f"🧮 ~{report.input_tokens:,} tokens de entrada · "
+        f"~US$ {report.estimated_cost_usd:.3f} · "
+        f"~{report.estimated_latency_seconds:.0f}s"
+    )
+    if report.trimmed:
+        st.warning(
+            f"✂️ A mensagem passou do limite de {assistant_info.max_input_tokens:,} "
+            "tokens e teve o trecho do meio removido."
+        )
+        return report.trimmed_prompt
+    if report.over_warning:
+        st.warning(
+            f"⚠️ Entrada grande (~{report.input_tokens:,} tokens): a resposta pode "
+            "demorar e custar mais que o normal."
+        )
+    return prompt
+
+
 def process_with_assistant(prompt: str, file_ids: Optional[List[str]] = None) -> str:
     # Get assistant configuration from session state
     assistant_info = AVAILABLE_ASSISTANTS[st.session_state.assistant_key]
+    client = get_openai_client()
+    StreamingEventHandler = profiling.timed_import("streaming").StreamingEventHandler
 
     # Criar thread se não existir
-    if not st.session_state.thread_id:
-        thread = client.beta.threads.create()
-        st.session_state.thread_id = thread.id
+    new_thread = not st.session_state.thread_id
+    if new_thread:
+        st.session_state.thread_id = create_thread(client, assistant_info.id)
+    registry = get_resource_registry()
+    registry.touch([st.session_state.thread_id, *(file_ids or [])])
+    registry.collect_in_background(client)
+
+    prompt = with_inline_files(prompt, st.session_state.thread_id)
+    # As etapas de referência ficam no histórico da thread: basta na primeira
+    # mensagem, em vez de repetir o bloco (e pagar os tokens) a cada turno
+    if assistant_info.uses_local_rag and new_thread:
+        prompt = with_stage_context(prompt)
 
     # Preparar mensagem
     message_params = {
@@ -273,10 +569,20 @@ def process_with_assistant(prompt: str, file_ids: Optional[List[str]] = None) ->
     response_placeholder = st.empty()
     handler = StreamingEventHandler(response_placeholder)
 
+    # Histórico encurtado no pré-voo: a execução só lê as mensagens recentes
+    # (+1 pela mensagem que acabou de entrar na thread)
+    run_params = {}
+    if st.session_state.get("history_window") is not None:
+        run_params["truncation_strategy"] = {
+            "type": "last_messages",
+            "last_messages": st.session_state.history_window + 1,
+        }
+
     with client.beta.threads.runs.stream(
         thread_id=st.session_state.thread_id,
         assistant_id=assistant_info.id,
         event_handler=handler,
+        **run_params,
     ) as stream:
         stream.until_done()
 
@@ -285,20 +591,17 @@ def process_with_assistant(prompt: str, file_ids: Optional[List[str]] = None) ->
     return response
 
 
-def process_insights_research(
-    contexto_negocio: str, instrucao_pesquisa: Optional[str] = None
-) -> Optional[str]:
+def run_insights_query(contexto_negocio: str, gemini_client=None) -> str:
     """
-    Executa pesquisa de insights usando Gemini com Google Search
+    Consulta o Gemini com Google Search e retorna o texto bruto dos insights.
+    Com o cliente já resolvido, não usa o Streamlit e pode rodar em threads.
     """
-    try:
-        # Inicializa o cliente Gemini
-        gemini_client = genai.Client(
-            api_key=st.secrets.get("GEMINI_API_KEY") or os.environ.get("GEMINI_API_KEY")
-        )
+    # Inicializa o cliente Gemini
+    gemini_client = gemini_client or get_gemini_client()
+    types = get_genai_types()
 
-        # System instruction para pesquisador de insights
-        system_instruction = """
+    # System instruction para pesquisador de insights
+    system_instruction = """
 Você é um Agente de IA especialista em pesquisa de mercado e inteligência de negócios para DADOS, ANALYTICS, INTELIGENCIA ARTIFICIAL e BUSINESS INTELLIGENCE.
 
 REGRAS DE PESQUISA:
@@ -324,49 +627,159 @@ Fonte: "nome da fonte real (ex: McKinsey & Company, BCG)",
 Link: "URL completa e real da fonte, ou null"
 """
 
-        # Mensagem do usuário
-        contents = [
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=contexto_negocio)],
-            ),
-        ]
+    # Mensagem do usuário
+    contents = [
+        types.Content(
+            role="user",
+            parts=[types.Part.from_text(text=contexto_negocio)],
+        ),
+    ]
 
-        tools = [types.Tool(googleSearch=types.GoogleSearch())]
+    tools = [types.Tool(googleSearch=types.GoogleSearch())]
 
-        generate_content_config = types.GenerateContentConfig(
-            temperature=0.7,
-            thinking_config=types.ThinkingConfig(thinking_budget=-1),
-            tools=tools,
-            system_instruction=[types.Part.from_text(text=system_instruction)],
-        )
+    generate_content_config = types.GenerateContentConfig(
+        temperature=0.7,
+        thinking_config=types.ThinkingConfig(thinking_budget=-1),
+        tools=tools,
+        system_instruction=[types.Part.from_text(text=system_instruction)],
+    )
 
-        # Gera a resposta com streaming
-        full_response = ""
-        for chunk in gemini_client.models.generate_content_stream(
-            model="gemini-2.5-pro",
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if hasattr(chunk, "text"):
-                full_response += chunk.text
+    # Gera a resposta com streaming
+    full_response = ""
+    for chunk in gemini_client.models.generate_content_stream(
+        model="gemini-2.5-pro",
+        contents=contents,
+        config=generate_content_config,
+    ):
+        if getattr(chunk, "text", None):
+            full_response += chunk.text
 
-        return full_response
+    return full_response
 
+
+def process_insights_research(
+    contexto_negocio: str, instrucao_pesquisa: Optional[str] = None
+) -> Optional[str]:
+    """
+    Executa pesquisa de insights usando Gemini com Google Search
+    """
+    try:
+        return run_insights_query(contexto_negocio)
     except Exception as e:
         st.error(f"Erro durante a pesquisa de insights: {e}", icon="🚨")
         return None
 
 
+def extract_research_topics(ata_organizada: str) -> List[str]:
+    """Extrai da ata os tópicos de negócio distintos a pesquisar (Gemini Flash)"""
+    gemini_client = get_gemini_client()
+    types = get_genai_types()
+
+    response = gemini_client.models.generate_content(
+        model=TOPIC_EXTRACTION_MODEL,
+        contents=f"""Liste os tópicos de negócio DISTINTOS desta ata que merecem pesquisa de mercado \
+(dores, objetivos, iniciativas de dados/IA). No máximo {RESEARCH_MAX_TOPICS} tópicos, \
+cada um como uma frase curta e autoexplicativa, incluindo o setor do cliente.
+
+ATA:
+{ata_organizada}""",
+        config=types.GenerateContentConfig(
+            temperature=0.2,
+            response_mime_type="application/json",
+            response_schema=list[str],
+        ),
+    )
+    topics = json.loads(response.text or "[]")
+    unique_topics = list(dict.fromkeys(t.strip() for t in topics if t and t.strip()))
+    return unique_topics[:RESEARCH_MAX_TOPICS]
+
+
+def process_insights_research_fanout(ata_organizada: str) -> Optional[str]:
+    """
+    Pesquisa de insights em paralelo: um grounded query por tópico da ata,
+    com resultados mesclados e deduplicados pela URL da fonte.
+    """
+    try:
+        topics = extract_research_topics(ata_organizada)
+    except Exception as e:
+        st.warning(f"⚠️ Não foi possível separar os tópicos da ata: {e}")
+        topics = []
+
+    if len(topics) < 2:
+        return process_insights_research(ata_organizada)
+
+    st.caption("🔀 Pesquisando em paralelo: " + " · ".join(topics))
+    contexto_resumido = ata_organizada[:RESEARCH_CONTEXT_CHARS]
+    gemini_client = get_gemini_client()
+    results: Dict[str, str] = {}
+    failures: List[str] = []
+
+    with ThreadPoolExecutor(max_workers=min(RESEARCH_MAX_WORKERS, len(topics))) as pool:
+        futures = {
+            pool.submit(
+                run_insights_query,
+                f"""Contexto do cliente (resumo da ata):
+{contexto_resumido}
+
+Pesquise insights especificamente sobre este tópico: {topic}""",
+                gemini_client,
+            ): topic
+            for topic in topics
+        }
+        for future in as_completed(futures):
+            topic = futures[future]
+            try:
+                results[topic] = future.result()
+            except Exception as e:
+                failures.append(f"{topic} ({e})")
+
+    if failures:
+        st.warning("⚠️ Tópicos sem resultado: " + "; ".join(failures))
+    if not results:
+        return None
+
+    merged = merge_insights(
+        parse_insights(results[topic]) for topic in topics if topic in results
+    )
+    if not merged:
+        # Nenhum resultado no formato estruturado: concatena os textos
+        return "\n\n".join(results[topic] for topic in topics if topic in results)
+    return format_insights_for_proposal(merged)
+
+
+@st.cache_resource
+def get_link_verifier() -> LinkVerifier:
+    """Verificador de links compartilhado entre sessões (pool HTTP + cache)"""
+    return LinkVerifier(cache_path=os.path.join(CACHE_DIR, "links.json"))
+
+
+def validate_insights(insights_text: str) -> Tuple[str, str]:
+    """
+    Estrutura os insights em registros e verifica os links em paralelo.
+    Retorna (Markdown para exibição, texto para o criador de propostas).
+    """
+    insights = parse_insights(insights_text)
+    if not insights:
+        # Resposta fora do formato esperado: segue como texto livre
+        return insights_text, insights_text
+
+    get_link_verifier().verify_insights(insights)
+    broken = sum(1 for insight in insights if insight.link_quebrado)
+    if broken:
+        st.warning(
+            f"⚠️ {broken} link(s) inacessível(is) sinalizado(s) e removido(s) da proposta."
+        )
+    return format_insights_markdown(insights), format_insights_for_proposal(insights)
+
+
 def process_tendencias_research(contexto_negocio: str) -> Optional[str]:
     """
     Executa pesquisa de tendências usando Gemini com Google Search
     """
     try:
         # Inicializa o cliente Gemini
-        gemini_client = genai.Client(
-            api_key=st.secrets.get("GEMINI_API_KEY") or os.environ.get("GEMINI_API_KEY")
-        )
+        gemini_client = get_gemini_client()
+        types = get_genai_types()
 
         # System instruction para pesquisador de tendências
         system_instruction = """
@@ -485,25 +898,31 @@ def process_ata_to_proposal_workflow(user_prompt: str):
     Processa o workflow completo: ata desorganizada -> ata organizada -> pesquisa insights -> proposta
     """
     try:
+        client = get_openai_client()
+        # A ata pode vir como anexo (ex: .docx) em vez de colada no chat
+        user_prompt = with_inline_files(user_prompt)
+
         # Etapa 1: Organizar a ata
         st.info("🔄 Organizando a ata...", icon="📝")
 
-        # Criar thread para o organizador de atas
-        thread_ata = client.beta.threads.create()
+        # Threads de uso único: registradas como efêmeras e apagadas ao final
+        thread_ata_id = create_thread(
+            client, AVAILABLE_ASSISTANTS["organizador_atas"].id, ephemeral=True
+        )
 
         # Adicionar mensagem do usuário
         client.beta.threads.messages.create(
-            thread_id=thread_ata.id, role="user", content=user_prompt
+            thread_id=thread_ata_id, role="user", content=user_prompt
         )
 
         # Executar o organizador de atas
         run_ata = client.beta.threads.runs.create_and_poll(
-            thread_id=thread_ata.id,
+            thread_id=thread_ata_id,
             assistant_id=AVAILABLE_ASSISTANTS["organizador_atas"].id,
         )
 
         # Obter a resposta organizada
-        messages_ata = client.beta.threads.messages.list(thread_id=thread_ata.id)
+        messages_ata = client.beta.threads.messages.list(thread_id=thread_ata_id)
         ata_organizada = messages_ata.data[0].content[0].text.value
 
         # Mostrar a ata organizada
@@ -515,34 +934,32 @@ def process_ata_to_proposal_workflow(user_prompt: str):
 
         # Adicionar ao histórico
         st.session_state.messages.append(
-            {
-                "role": "assistant",
-                "content": f"### 📋 Ata Organizada\n\n{ata_organizada}",
-            }
+            "assistant", f"### 📋 Ata Organizada\n\n{ata_organizada}"
         )
 
         # Etapa 2: Pesquisar Insights de Mercado
         st.info("🔄 Pesquisando insights de mercado...", icon="🔍")
 
         # Extrair contexto da ata organizada para a pesquisa
-        insights_response = process_insights_research(
-            contexto_negocio=ata_organizada,
-            instrucao_pesquisa="Pesquise insights relevantes de consultorias renomadas que possam fundamentar a proposta comercial.",
-        )
+        if st.session_state.research_fanout:
+            insights_response = process_insights_research_fanout(ata_organizada)
+        else:
+            insights_response = process_insights_research(
+                contexto_negocio=ata_organizada,
+                instrucao_pesquisa="Pesquise insights relevantes de consultorias renomadas que possam fundamentar a proposta comercial.",
+            )
         # Mostrar os insights
         if insights_response:
+            insights_markdown, insights_response = validate_insights(insights_response)
             with st.chat_message(
                 "assistant", avatar=os.path.join(SCRIPT_DIR, "assets", "img", "gpt.png")
             ):
                 st.markdown("### 🔍 Insights de Mercado")
-                st.markdown(insights_response)
+                st.markdown(insights_markdown)
 
             # Adicionar ao histórico
             st.session_state.messages.append(
-                {
-                    "role": "assistant",
-                    "content": f"### 🔍 Insights de Mercado\n\n{insights_response}",
-                }
+                "assistant", f"### 🔍 Insights de Mercado\n\n{insights_markdown}"
             )
         else:
             insights_response = "Não foi possível obter insights de mercado no momento."
@@ -551,7 +968,9 @@ def process_ata_to_proposal_workflow(user_prompt: str):
         st.info("🔄 Construindo proposta comercial...", icon="💼")
 
         # Criar thread para o criador de propostas
-        thread_proposta = client.beta.threads.create()
+        thread_proposta_id = create_thread(
+            client, AVAILABLE_ASSISTANTS["criador_propostas"].id, ephemeral=True
+        )
 
         # Adicionar a ata organizada E os insights como input para a proposta
         prompt_proposta = f"""Com base na seguinte ata organizada e nos insights de mercado, crie uma proposta comercial:
@@ -561,22 +980,23 @@ def process_ata_to_proposal_workflow(user_prompt: str):
 
 **INSIGHTS DE MERCADO:**
 {insights_response}"""
+        prompt_proposta = with_stage_context(prompt_proposta, query=ata_organizada)
 
         client.beta.threads.messages.create(
-            thread_id=thread_proposta.id,
+            thread_id=thread_proposta_id,
             role="user",
             content=prompt_proposta,
         )
 
         # Executar o criador de propostas
         run_proposta = client.beta.threads.runs.create_and_poll(
-            thread_id=thread_proposta.id,
+            thread_id=thread_proposta_id,
             assistant_id=AVAILABLE_ASSISTANTS["criador_propostas"].id,
         )
 
         # Obter a proposta criada
         messages_proposta = client.beta.threads.messages.list(
-            thread_id=thread_proposta.id
+            thread_id=thread_proposta_id
         )
         proposta_criada = messages_proposta.data[0].content[0].text.value
 
@@ -589,12 +1009,14 @@ def process_ata_to_proposal_workflow(user_prompt: str):
 
         # Adicionar ao histórico
         st.session_state.messages.append(
-            {
-                "role": "assistant",
-                "content": f"### 💼 Proposta Comercial\n\n{proposta_criada}",
-            }
+            "assistant", f"### 💼 Proposta Comercial\n\n{proposta_criada}"
         )
 
+        # As duas threads deste workflow não serão reusadas: apaga só elas, em
+        # segundo plano (as de workflows em outras sessões continuam intactas)
+        get_resource_registry().delete_in_background(
+            client, [thread_ata_id, thread_proposta_id]
+        )
         return True
 
     except Exception as e:
@@ -602,16 +1024,6 @@ def process_ata_to_proposal_workflow(user_prompt: str):
         return False
 
 
-try:
-    # Inicializa o cliente OpenAI usando as secrets do Streamlit
-    client = openai.OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-except Exception as e:
-    st.error(
-        "Chave da API da OpenAI não encontrada. Por favor, configure seus secrets no Streamlit Cloud.",
-        icon="🚨",
-    )
-    st.stop()
-
 # ==================== INTERFACE SIDEBAR ====================
 
 
@@ -624,7 +1036,8 @@ def render_sidebar():
         if st.button("➕ Nova Conversa", use_container_width=True, type="primary"):
             new_conv = create_new_conversation()
             st.session_state.current_conversation_id = new_conv.id
-            st.session_state.messages = []
+            st.session_state.messages = new_message_store()
+            st.session_state.history_window = HISTORY_PAGE_SIZE
             st.session_state.thread_id = None
             st.session_state.uploaded_files = []
             st.session_state.conversations.append(new_conv)
@@ -650,9 +1063,14 @@ def render_sidebar():
                         else "primary"
                     ),
                 ):
+                    full_conv = load_conversation(conv.id)
                     st.session_state.current_conversation_id = conv.id
-                    st.session_state.messages = [msg.dict() for msg in conv.messages]
+                    st.session_state.messages = new_message_store(
+                        full_conv.messages if full_conv else []
+                    )
+                    st.session_state.history_window = HISTORY_PAGE_SIZE
                     st.session_state.assistant_key = conv.assistant_key
+                    restore_conversation_thread(conv.id, conv.assistant_key)
                     st.rerun()
 
             with col2:
@@ -664,7 +1082,8 @@ def render_sidebar():
                     delete_conversation(conv.id)
                     st.session_state.conversations = load_all_conversations()
                     if conv.id == st.session_state.current_conversation_id:
-                        st.session_state.messages = []
+                        st.session_state.messages = new_message_store()
+                        st.session_state.history_window = HISTORY_PAGE_SIZE
                         st.session_state.current_conversation_id = None
                     st.rerun()
 
@@ -675,10 +1094,23 @@ def render_sidebar():
                 )
                 if st.button("✅ Salvar", key=f"save_name_{conv.id}"):
                     conv.name = new_name
-                    save_conversation(conv)
+                    rename_conversation(conv.id, new_name)
                     st.session_state[f"renaming_{conv.id}"] = False
                     st.rerun()
 
+        # Exportação em lote (ZIP gerado em fluxo, uma conversa por vez)
+        if st.session_state.conversations and st.button(
+            "📦 Exportar todas (ZIP)", use_container_width=True
+        ):
+            with st.spinner("Gerando ZIP..."):
+                st.download_button(
+                    label="💾 Download ZIP",
+                    data=to_bytes(iter_bulk_zip(iter_saved_conversations())),
+                    file_name=f"conversas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                    mime="application/zip",
+                    use_container_width=True,
+                )
+
         st.markdown("---")
 
         # Seletor de Assistente
@@ -703,7 +1135,8 @@ def render_sidebar():
                     st.session_state.assistant_key = selected_assistant_key
                     new_conv = create_new_conversation()
                     st.session_state.current_conversation_id = new_conv.id
-                    st.session_state.messages = []
+                    st.session_state.messages = new_message_store()
+                    st.session_state.history_window = HISTORY_PAGE_SIZE
                     st.session_state.thread_id = None
                     st.rerun()
             else:
@@ -712,6 +1145,13 @@ def render_sidebar():
         assistant_info = AVAILABLE_ASSISTANTS[st.session_state.assistant_key]
         st.info(assistant_info.description, icon="ℹ️")
 
+        if st.session_state.assistant_key == "ata_para_proposta":
+            st.session_state.research_fanout = st.toggle(
+                "⚡ Pesquisa paralela por tópico",
+                value=st.session_state.research_fanout,
+                help="Separa a ata em tópicos e pesquisa cada um em paralelo no Gemini",
+            )
+
         # Upload de Arquivos
         if assistant_info.supports_files or assistant_info.supports_code_interpreter:
             st.markdown("---")
@@ -723,13 +1163,12 @@ def render_sidebar():
             )
 
             if uploaded_file and st.button("⬆️ Enviar Arquivo"):
-                with st.spinner("Fazendo upload..."):
-                    file_id = upload_file_to_openai(uploaded_file)
-                    if file_id:
-                        st.session_state.uploaded_files.append(
-                            {"name": uploaded_file.name, "id": file_id}
-                        )
-                        st.success(f"✅ {uploaded_file.name} enviado!")
+                with st.spinner("Processando arquivo..."):
+                    attached = attach_uploaded_file(uploaded_file, assistant_info)
+                    attached_ids = {f["id"] for f in st.session_state.uploaded_files}
+                    if attached and attached["id"] not in attached_ids:
+                        st.session_state.uploaded_files.append(attached)
+                        st.success(f"✅ {uploaded_file.name} anexado!")
 
             # Arquivos enviados
             if st.session_state.uploaded_files:
@@ -737,7 +1176,12 @@ def render_sidebar():
                 for file in st.session_state.uploaded_files:
                     col1, col2 = st.columns([4, 1])
                     with col1:
-                        st.text(f"📄 {file['name']}")
+                        if "inline_text" in file:
+                            st.text(
+                                f"📄 {file['name']} (texto, ~{file['tokens']:,} tokens)"
+                            )
+                        else:
+                            st.text(f"📄 {file['name']}")
                     with col2:
                         if st.button("❌", key=f"remove_{file['id']}"):
                             st.session_state.uploaded_files.remove(file)
@@ -783,17 +1227,43 @@ def render_message_actions(message_index: int):
 
     with col1:
         if st.button("📋", key=f"copy_{message_index}", help="Copiar"):
-            st.code(st.session_state.messages[message_index]["content"])
+            messages = st.session_state.messages
+            st.code(messages.content(messages[message_index]))
 
 
-def main():
-    """Função principal"""
-    global client
+def render_chat_history():
+    """Exibe apenas a janela das últimas mensagens, com paginação para trás"""
+    messages = st.session_state.messages
+    window = st.session_state.history_window
+    first_visible = max(0, len(messages) - window)
+
+    if first_visible > 0:
+        if st.button(
+            f"⬆️ Carregar mensagens anteriores ({first_visible} ocultas)",
+            key="load_earlier",
+            use_container_width=True,
+        ):
+            st.session_state.history_window = window + HISTORY_PAGE_SIZE
+            st.rerun()
+
+    for record in messages[first_visible:]:
+        avatar_img = (
+            os.path.join(SCRIPT_DIR, "assets", "img", "user.png")
+            if record.role == "user"
+            else os.path.join(SCRIPT_DIR, "assets", "img", "gpt.png")
+        )
+
+        with st.chat_message(record.role, avatar=avatar_img):
+            # Markdown do próprio Streamlit, que escapa o HTML das mensagens
+            st.markdown(messages.content(record))
+
+            # Metadados
+            if record.timestamp:
+                st.caption(f"🕐 {record.timestamp}")
 
-    # Inicializações
-    client = initialize_client()
-    initialize_session_state()
 
+def main():
+    """Função principal"""
     # Configuração da página
     st.set_page_config(
         page_title="Agente Comercial - NDados",
@@ -802,6 +1272,13 @@ def main():
         initial_sidebar_state="expanded",
     )
 
+    # Inicializações (o cliente OpenAI só é criado no primeiro uso)
+    if not get_secret("OPENAI_API_KEY"):
+        st.error("❌ API Key da OpenAI não configurada!", icon="🚨")
+        st.stop()
+    with profiling.phase("estado da sessão"):
+        initialize_session_state()
+
     # CSS (mantido do código original)
     st.markdown(
         """
@@ -1074,12 +1551,14 @@ p, div, span, label {
     )
 
     # Renderizar sidebar
-    render_sidebar()
+    with profiling.phase("sidebar"):
+        render_sidebar()
 
     # Interface principal
     assistant_info = AVAILABLE_ASSISTANTS[st.session_state.assistant_key]
 
     st.markdown(f"## {assistant_info.name}")
+    profiling.mark("até a primeira renderização")
 
     # Mensagem inicial
     if not st.session_state.messages:
@@ -1088,33 +1567,27 @@ p, div, span, label {
         )
 
     # Exibir mensagens
-    for idx, msg in enumerate(st.session_state.messages):
-        avatar_img = (
-            os.path.join(SCRIPT_DIR, "assets", "img", "user.png")
-            if msg["role"] == "user"
-            else os.path.join(SCRIPT_DIR, "assets", "img", "gpt.png")
-        )
-
-        with st.chat_message(msg["role"], avatar=avatar_img):
-            st.markdown(msg["content"])
-
-            # Metadados
-            if msg.get("timestamp"):
-                st.caption(f"🕐 {msg['timestamp']}")
+    with profiling.phase("histórico"):
+        render_chat_history()
 
     # Botões de controle
     col1, col2, col3, col4 = st.columns([2, 2, 2, 6])
 
     with col1:
+        export_key = st.selectbox(
+            "Formato",
+            options=list(EXPORT_FORMATS.keys()),
+            format_func=lambda key: EXPORT_FORMATS[key].label,
+            key="export_format",
+            label_visibility="collapsed",
+        )
         if st.button("⬇️ Exportar Chat", use_container_width=True):
-            markdown_content = format_message_for_download(
-                [Message(**msg) for msg in st.session_state.messages]
-            )
+            export_format = EXPORT_FORMATS[export_key]
             st.download_button(
-                label="💾 Download MD",
-                data=markdown_content,
-                file_name=f"conversa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
-                mime="text/markdown",
+                label=f"💾 Download {export_format.extension.upper()}",
+                data=export_current_conversation(export_key),
+                file_name=f"conversa_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format.extension}",
+                mime=export_format.mime,
                 use_container_width=True,
             )
 
@@ -1126,7 +1599,9 @@ p, div, span, label {
                 st.rerun()
             if len(st.session_state.messages) >= 2:
                 st.session_state.messages.pop()  # Remove resposta do assistente
-                last_user_msg = st.session_state.messages[-1]["content"]
+                last_user_msg = st.session_state.messages.content(
+                    st.session_state.messages[-1]
+                )
                 st.rerun()
 
     with col3:
@@ -1138,11 +1613,15 @@ p, div, span, label {
     if prompt := st.chat_input("Digite sua mensagem aqui..."):
         st.session_state.stop_generation = False
 
+        # Pré-voo local: estimativa de tokens/custo e corte acima do orçamento
+        prompt = run_preflight(prompt)
+        if prompt is None:
+            st.stop()
+
         # Adicionar mensagem do usuário
-        user_message = Message(
-            role="user", content=prompt, timestamp=datetime.now().strftime("%H:%M:%S")
+        st.session_state.messages.append(
+            "user", prompt, datetime.now().strftime("%H:%M:%S")
         )
-        st.session_state.messages.append(user_message.model_dump())
 
         # Exibir mensagem do usuário
         with st.chat_message(
@@ -1157,49 +1636,38 @@ p, div, span, label {
             st.session_state.generating = True
 
             try:
-                file_ids = [f["id"] for f in st.session_state.uploaded_files]
+                file_ids = remote_file_ids()
 
                 if st.session_state.assistant_key == "ata_para_proposta":
                     process_ata_to_proposal_workflow(prompt)
                 elif st.session_state.assistant_key == "pesquisador_insights":
                     response = process_insights_research(prompt)
                     if response:
+                        response, _ = validate_insights(response)
                         st.markdown(response)
-                        assistant_message = Message(
-                            role="assistant",
-                            content=response,
-                            timestamp=datetime.now().strftime("%H:%M:%S"),
+                        st.session_state.messages.append(
+                            "assistant", response, datetime.now().strftime("%H:%M:%S")
                         )
-                        st.session_state.messages.append(assistant_message.model_dump())
                 elif st.session_state.assistant_key == "pesquisador_tendencias":
                     response = process_tendencias_research(prompt)
                     if response:
                         st.markdown(response)
-                        assistant_message = Message(
-                            role="assistant",
-                            content=response,
-                            timestamp=datetime.now().strftime("%H:%M:%S"),
+                        st.session_state.messages.append(
+                            "assistant", response, datetime.now().strftime("%H:%M:%S")
                         )
-                        st.session_state.messages.append(assistant_message.model_dump())
                 else:
                     response = process_with_assistant(prompt, file_ids)
 
-                    assistant_message = Message(
-                        role="assistant",
-                        content=response,
-                        timestamp=datetime.now().strftime("%H:%M:%S"),
+                    st.session_state.messages.append(
+                        "assistant", response, datetime.now().strftime("%H:%M:%S")
                     )
-                    st.session_state.messages.append(assistant_message.model_dump())
 
                 # Salvar conversa
                 if st.session_state.current_conversation_id:
-                    conv = load_conversation(st.session_state.current_conversation_id)
-                    if conv:
-                        conv.messages = [
-                            Message(**msg) for msg in st.session_state.messages
-                        ]
-                        conv.updated_at = datetime.now().isoformat()
-                        save_conversation(conv)
+                    update_conversation_messages(
+                        st.session_state.current_conversation_id,
+                        st.session_state.messages,
+                    )
 
             except Exception as e:
                 if "stopped by user" in str(e):
@@ -1212,5 +1680,18 @@ p, div, span, label {
                 st.session_state.generating = False
 
 
+def render_startup_profile():
+    """Mostra o perfil de inicialização (MODEL_ST_PROFILE=1 ou ?profile=1)"""
+    if not profiling.is_enabled(st.query_params):
+        return
+    profiling.mark("execução completa")
+    report = profiling.format_report_markdown()
+    print(report, flush=True)  # Também no log do servidor após deploys/restarts
+    with st.sidebar.expander("⏱️ Perfil de inicialização", expanded=True):
+        st.markdown(report)
+        st.caption("Detalhe por módulo: `python -X importtime -m streamlit run app.py`")
+
+
 if __name__ == "__main__":
     main()
+    render_startup_profile()
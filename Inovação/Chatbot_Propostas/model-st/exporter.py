@@ -0,0 +1,233 @@
+import html
+import io
+import re
+import zipfile
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+try:
+    import markdown as markdown_lib
+except ImportError:  # Sem a biblioteca, o HTML leva o Markdown em <pre>
+    markdown_lib = None
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+# (role, conteúdo, timestamp) — o conteúdo pode vir do disco sob demanda
+ExportMessage = Tuple[str, str, Optional[str]]
+Chunk = Union[str, bytes]
+
+ROLE_LABELS = {"user": "🧑 Você", "assistant": "🤖 Assistente"}
+
+HTML_STYLE = """body{font-family:Arial,sans-serif;max-width:860px;margin:2rem auto;
+line-height:1.5;color:#222}.msg{border-top:1px solid #ddd;padding:1rem 0}
+.ts{color:#888;font-size:.85rem}pre{white-space:pre-wrap}"""
+
+_DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+_DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+_DOCX_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    "<w:body>"
+)
+_DOCX_FOOTER = "</w:body></w:document>"
+
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+_MD_BOLD_RE = re.compile(r"(\*\*[^*]+\*\*)")
+
+
+def _exported_at() -> str:
+    return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+
+
+# ==================== FORMATOS ====================
+
+
+def iter_markdown(title: str, messages: Iterable[ExportMessage]) -> Iterator[str]:
+    """Gera o Markdown da conversa mensagem a mensagem"""
+    yield f"# {title}\n\n**Data:** {_exported_at()}\n\n---\n\n"
+    for role, content, timestamp in messages:
+        yield f"### {ROLE_LABELS.get(role, role)}\n\n{content}\n\n"
+        if timestamp:
+            yield f"*{timestamp}*\n\n"
+        yield "---\n\n"
+
+
+def _markdown_renderer():
+    """Markdown sem HTML cru: tags vindas das mensagens saem como texto"""
+    if markdown_lib is None:
+        return None
+    renderer = markdown_lib.Markdown(extensions=["tables", "fenced_code", "sane_lists"])
+    renderer.preprocessors.deregister("html_block")
+    renderer.inlinePatterns.deregister("html")
+    return renderer
+
+
+def _markdown_fragment(content: str, renderer=None) -> str:
+    if renderer is None:
+        return f"<pre>{html.escape(content)}</pre>"
+    return renderer.reset().convert(content)
+
+
+def iter_html(title: str, messages: Iterable[ExportMessage]) -> Iterator[str]:
+    """Gera um HTML autocontido da conversa mensagem a mensagem"""
+    yield (
+        f'<!DOCTYPE html><html lang="pt-BR"><head><meta charset="utf-8">'
+        f"<title>{html.escape(title)}</title><style>{HTML_STYLE}</style></head>"
+        f"<body><h1>{html.escape(title)}</h1><p><strong>Data:</strong> {_exported_at()}</p>"
+    )
+    renderer = _markdown_renderer()
+    for role, content, timestamp in messages:
+        yield f'<div class="msg"><h3>{html.escape(ROLE_LABELS.get(role, role))}</h3>'
+        yield _markdown_fragment(content, renderer)
+        if timestamp:
+            yield f'<p class="ts">{html.escape(timestamp)}</p>'
+        yield "</div>"
+    yield "</body></html>"
+
+
+def _docx_run(text: str, bold: bool = False, size: Optional[int] = None) -> str:
+    props = ""
+    if bold or size:
+        props = "<w:rPr>{}{}</w:rPr>".format(
+            "<w:b/>" if bold else "", f'<w:sz w:val="{size}"/>' if size else ""
+        )
+    escaped = html.escape(text, quote=False)
+    return f'<w:r>{props}<w:t xml:space="preserve">{escaped}</w:t></w:r>'
+
+
+def _docx_paragraph(line: str) -> str:
+    """Parágrafo do Word com o Markdown básico: títulos e negrito"""
+    heading = _MD_HEADING_RE.match(line)
+    if heading:
+        size = max(36 - 4 * len(heading.group(1)), 24)  # Meio-pontos
+        return (
+            f"<w:p>{_docx_run(heading.group(2).strip('*'), bold=True, size=size)}</w:p>"
+        )
+    runs = []
+    for part in _MD_BOLD_RE.split(line):
+        if part.startswith("**") and part.endswith("**") and len(part) > 4:
+            runs.append(_docx_run(part[2:-2], bold=True))
+        elif part:
+            runs.append(_docx_run(part))
+    return f"<w:p>{''.join(runs)}</w:p>"
+
+
+def _iter_docx_body(title: str, messages: Iterable[ExportMessage]) -> Iterator[str]:
+    yield _DOCX_HEADER
+    yield _docx_paragraph(f"# {title}")
+    yield _docx_paragraph(f"**Data:** {_exported_at()}")
+    for role, content, timestamp in messages:
+        yield _docx_paragraph(f"### {ROLE_LABELS.get(role, role)}")
+        for line in content.splitlines():
+            yield _docx_paragraph(line)
+        if timestamp:
+            yield _docx_paragraph(timestamp)
+    yield "<w:sectPr/>" + _DOCX_FOOTER
+
+
+class _ChunkSink:
+    """Destino de escrita não posicionável: o zipfile grava e nós drenamos"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[str, Iterable[Chunk]]]) -> Iterator[bytes]:
+    """Gera um ZIP em fluxo: cada entrada é escrita e liberada pedaço a pedaço"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in entries:
+            with archive.open(name, "w") as member:
+                for chunk in chunks:
+                    member.write(
+                        chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    )
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_docx(title: str, messages: Iterable[ExportMessage]) -> Iterator[bytes]:
+    """Gera o .docx (um ZIP de XMLs) sem montar o documento em memória"""
+    return iter_zip(
+        [
+            ("[Content_Types].xml", [_DOCX_CONTENT_TYPES]),
+            ("_rels/.rels", [_DOCX_RELS]),
+            ("word/document.xml", _iter_docx_body(title, messages)),
+        ]
+    )
+
+
+# ==================== REGISTRO DE FORMATOS ====================
+
+
+class ExportFormat(BaseModel):
+    label: str
+    extension: str
+    mime: str
+    render: Callable[[str, Iterable[ExportMessage]], Iterator[Chunk]]
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "md": ExportFormat(
+        label="Markdown", extension="md", mime="text/markdown", render=iter_markdown
+    ),
+    "html": ExportFormat(
+        label="HTML", extension="html", mime="text/html", render=iter_html
+    ),
+    "docx": ExportFormat(
+        label="Word (DOCX)",
+        extension="docx",
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        render=iter_docx,
+    ),
+}
+
+
+def iter_bulk_zip(
+    conversations: Iterable[Tuple[str, str, Iterable[ExportMessage]]],
+    format_key: str = "md",
+) -> Iterator[bytes]:
+    """ZIP em fluxo com várias conversas: (nome do arquivo, título, mensagens)"""
+    export_format = EXPORT_FORMATS[format_key]
+    return iter_zip(
+        (
+            f"{filename}.{export_format.extension}",
+            export_format.render(title, messages),
+        )
+        for filename, title, messages in conversations
+    )
+
+
+def to_bytes(chunks: Iterable[Chunk]) -> bytes:
+    """Junta os pedaços num único bytes (o que o st.download_button aceita)"""
+    output = io.BytesIO()
+    for chunk in chunks:
+        output.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    return output.getvalue()
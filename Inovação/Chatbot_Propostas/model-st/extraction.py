@@ -0,0 +1,135 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+from typing import Optional
+from xml.etree import ElementTree
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+TEXT_EXTENSIONS = (".txt", ".csv", ".json")
+EXTRACTABLE_EXTENSIONS = TEXT_EXTENSIONS + (".docx", ".pdf")
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def file_hash(data: bytes) -> str:
+    """Hash do conteúdo do arquivo, usado como chave do cache de extração"""
+    return hashlib.sha256(data).hexdigest()
+
+
+# ==================== EXTRATORES ====================
+
+
+def _decode_text(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "utf-16"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _extract_json(data: bytes) -> str:
+    text = _decode_text(data)
+    try:
+        # Reescreve compacto: a indentação original só gasta tokens
+        return json.dumps(json.loads(text), ensure_ascii=False, separators=(",", ":"))
+    except json.JSONDecodeError:
+        return text
+
+
+def _extract_docx(data: bytes) -> str:
+    """Lê os parágrafos do word/document.xml sem depender do python-docx"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_WORD_NS}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{_WORD_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs).strip()
+
+
+def _extract_pdf(data: bytes) -> Optional[str]:
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError:  # Sem pypdf o PDF segue para os arquivos da OpenAI
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except PyPdfError:
+        return None
+    except Exception:  # Página malformada: o PDF segue para os arquivos da OpenAI
+        return None
+    return "\n\n".join(pages).strip()
+
+
+def extract_text(filename: str, data: bytes) -> Optional[str]:
+    """Texto do arquivo, ou None se o formato não tiver extração local"""
+    extension = os.path.splitext(filename.lower())[1]
+    try:
+        if extension == ".json":
+            return _extract_json(data)
+        if extension in TEXT_EXTENSIONS:
+            return _decode_text(data)
+        if extension == ".docx":
+            return _extract_docx(data)
+        if extension == ".pdf":
+            return _extract_pdf(data)
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, ValueError):
+        return None  # Arquivo corrompido ou fora do padrão
+    return None
+
+
+# ==================== CACHE ====================
+
+
+class ExtractionCache:
+    """Cache em disco dos textos extraídos, endereçado pelo hash do arquivo"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _filepath(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.txt")
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._filepath(digest), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest: str, text: str):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self._filepath(digest))
+
+    def extract(self, filename: str, data: bytes) -> Optional[str]:
+        """Extrai o texto uma única vez por conteúdo (o mesmo arquivo reenviado
+        ou com outro nome reaproveita o resultado)"""
+        if not filename.lower().endswith(EXTRACTABLE_EXTENSIONS):
+            return None
+        digest = file_hash(data)
+        cached = self.get(digest)
+        if cached is not None:
+            return cached or None
+        text = extract_text(filename, data)
+        if text is None:
+            return None  # Sem extrator disponível: não grava, pode passar a ter
+        self.put(digest, text)
+        return text or None
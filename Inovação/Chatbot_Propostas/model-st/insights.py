@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+
+from storage import atomic_write_json
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+LINK_OK = "ok"
+LINK_BLOQUEADO = "bloqueado"  # Existe, mas recusa robôs (401/403/429)
+LINK_QUEBRADO = "quebrado"
+LINK_AUSENTE = "sem_link"
+LINK_NAO_VERIFICADO = "nao_verificado"
+
+VERIFY_TIMEOUT_SECONDS = 6
+VERIFY_MAX_WORKERS = 8
+# Intervalo mínimo entre requisições ao mesmo host
+PER_HOST_MIN_INTERVAL_SECONDS = 0.5
+# Validade do cache persistente, por resultado
+CACHE_TTL_SECONDS = {
+    LINK_OK: 7 * 24 * 3600,
+    LINK_BLOQUEADO: 7 * 24 * 3600,
+    LINK_QUEBRADO: 24 * 3600,
+}
+
+USER_AGENT = (
+    "Mozilla/5.0 (compatible; AgenteComercial/1.0; +https://www.polijunior.com.br)"
+)
+
+
+# ==================== MODELOS DE DADOS ====================
+
+
+class Insight(BaseModel):
+    conteudo: str
+    fonte: Optional[str] = None
+    link: Optional[str] = None
+    link_status: str = LINK_NAO_VERIFICADO
+
+    @property
+    def link_quebrado(self) -> bool:
+        return self.link_status == LINK_QUEBRADO
+
+
+# ==================== PARSER ====================
+
+_FIELD_RE = re.compile(
+    r"(?:^|(?<=[\s,*\"'“”]))\**(conte[uú]do|fonte|link)\**\s*:\s*",
+    re.IGNORECASE | re.MULTILINE,
+)
+_MD_LINK_RE = re.compile(r"\[[^\]]*\]\((https?://[^)\s]+)\)")
+_URL_RE = re.compile(r"https?://[^\s\"'<>)\]]+")
+_TRAILING_MARKER_RE = re.compile(r"(?:\s*(?:\d+[.)]|[-*•>#]+))+\s*$")
+
+
+def _clean_value(value: str) -> str:
+    """Remove aspas, vírgulas, marcadores de lista e quebras de linha do valor"""
+    value = _TRAILING_MARKER_RE.sub("", value.strip())
+    value = " ".join(value.split()).rstrip(",").strip().strip("*").strip()
+    if len(value) >= 2 and value[0] in "\"'“" and value[-1] in "\"'”":
+        value = value[1:-1]
+    return value.strip()
+
+
+def _extract_url(value: str) -> Optional[str]:
+    if not value or value.lower() in ("null", "none", "n/a", "-"):
+        return None
+    md_link = _MD_LINK_RE.search(value)
+    if md_link:
+        return md_link.group(1)
+    url = _URL_RE.search(value)
+    return url.group(0).rstrip(".,;") if url else None
+
+
+def parse_insights(text: str) -> List[Insight]:
+    """Converte a resposta livre do Gemini (Conteudo/Fonte/Link) em registros"""
+    text = text or ""
+    matches = list(_FIELD_RE.finditer(text))
+    insights: List[Insight] = []
+    current: Optional[Dict[str, Optional[str]]] = None
+
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        field = match.group(1).lower().replace("ú", "u")
+        value = _clean_value(text[match.end() : end])
+
+        if field == "conteudo":
+            if current and current["conteudo"]:
+                insights.append(Insight(**current))
+            current = {"conteudo": value, "fonte": None, "link": None}
+        elif current is not None:
+            current[field] = _extract_url(value) if field == "link" else value
+
+    if current and current["conteudo"]:
+        insights.append(Insight(**current))
+    for insight in insights:
+        if not insight.link:
+            insight.link_status = LINK_AUSENTE
+    return insights
+
+
+# ==================== VERIFICADOR DE LINKS ====================
+
+
+class LinkVerifier:
+    """Verifica links em paralelo com sessão HTTP compartilhada e cache em disco"""
+
+    def __init__(
+        self,
+        cache_path: str,
+        max_workers: int = VERIFY_MAX_WORKERS,
+        timeout: float = VERIFY_TIMEOUT_SECONDS,
+        per_host_interval: float = PER_HOST_MIN_INTERVAL_SECONDS,
+    ):
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.per_host_interval = per_host_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+
+        self._cache_lock = threading.Lock()
+        self._cache: Dict[str, dict] = self._load_cache()
+        self._host_locks: Dict[str, threading.Lock] = {}
+        self._host_last_request: Dict[str, float] = {}
+        self._host_guard = threading.Lock()
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with self._cache_lock:
+            snapshot = dict(self._cache)
+        atomic_write_json(self.cache_path, snapshot)
+
+    def _cached_status(self, url: str) -> Optional[str]:
+        with self._cache_lock:
+            entry = self._cache.get(url)
+        if not entry:
+            return None
+        ttl = CACHE_TTL_SECONDS.get(entry["status"], 0)
+        if time.time() - entry["checked_at"] > ttl:
+            return None
+        return entry["status"]
+
+    def _wait_host_slot(self, host: str):
+        """Respeita o intervalo mínimo entre requisições ao mesmo host"""
+        with self._host_guard:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            elapsed = time.monotonic() - self._host_last_request.get(host, 0.0)
+            if elapsed < self.per_host_interval:
+                time.sleep(self.per_host_interval - elapsed)
+            self._host_last_request[host] = time.monotonic()
+
+    def _request_status(self, url: str) -> str:
+        host = urlparse(url).netloc.lower()
+        if not host:
+            return LINK_QUEBRADO
+        try:
+            self._wait_host_slot(host)
+            response = self.session.head(
+                url, allow_redirects=True, timeout=self.timeout
+            )
+            if response.status_code in (403, 405, 501):
+                # Muitos sites não aceitam HEAD; confirma com um GET sem baixar o corpo
+                self._wait_host_slot(host)
+                response = self.session.get(
+                    url, allow_redirects=True, timeout=self.timeout, stream=True
+                )
+                response.close()
+        except requests.RequestException:
+            return LINK_QUEBRADO
+
+        if response.status_code < 400:
+            return LINK_OK
+        if response.status_code in (401, 403, 429):
+            return LINK_BLOQUEADO
+        return LINK_QUEBRADO
+
+    def check(self, url: str) -> str:
+        """Status de um link, usando o cache persistente quando válido"""
+        cached = self._cached_status(url)
+        if cached:
+            return cached
+        status = self._request_status(url)
+        with self._cache_lock:
+            self._cache[url] = {"status": status, "checked_at": time.time()}
+        return status
+
+    def check_many(self, urls: Iterable[str]) -> Dict[str, str]:
+        """Verifica vários links em paralelo (cada URL uma única vez)"""
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        if not unique_urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            statuses = dict(zip(unique_urls, pool.map(self.check, unique_urls)))
+        self._save_cache()
+        return statuses
+
+    def verify_insights(self, insights: List[Insight]) -> List[Insight]:
+        """Preenche o link_status de cada insight"""
+        statuses = self.check_many(insight.link for insight in insights)
+        for insight in insights:
+            if insight.link:
+                insight.link_status = statuses[insight.link]
+        return insights
+
+
+# ==================== MESCLAGEM ====================
+
+_TRACKING_PARAMS_RE = re.compile(r"^(utm_|gclid$|fbclid$|ref$)")
+
+
+def normalize_url(url: str) -> str:
+    """Forma canônica da URL para deduplicação (sem fragmento nem rastreadores)"""
+    parsed = urlparse(url.strip())
+    query = "&".join(
+        part
+        for part in parsed.query.split("&")
+        if part and not _TRACKING_PARAMS_RE.match(part.split("=", 1)[0].lower())
+    )
+    host = parsed.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parsed.path.rstrip("/") or "/"
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+
+def merge_insights(groups: Iterable[List[Insight]]) -> List[Insight]:
+    """Mescla listas de insights mantendo um por URL de fonte (ou por conteúdo)"""
+    merged: List[Insight] = []
+    seen = set()
+    for insights in groups:
+        for insight in insights:
+            if insight.link:
+                key = normalize_url(insight.link)
+            else:
+                key = " ".join(insight.conteudo.lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(insight)
+    return merged
+
+
+# ==================== FORMATAÇÃO ====================
+
+
+def format_insights_markdown(insights: List[Insight]) -> str:
+    """Monta o Markdown dos insights sinalizando links quebrados"""
+    blocks = []
+    for index, insight in enumerate(insights, start=1):
+        lines = [f"**{index}.** {insight.conteudo}"]
+        if insight.fonte:
+            lines.append(f"- **Fonte:** {insight.fonte}")
+        if insight.link_quebrado:
+            lines.append(f"- **Link:** ⚠️ link inacessível, não usar ({insight.link})")
+        elif insight.link:
+            lines.append(f"- **Link:** {insight.link}")
+        else:
+            lines.append("- **Link:** não informado")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def format_insights_for_proposal(insights: List[Insight]) -> str:
+    """Versão enviada ao criador de propostas: links quebrados são removidos"""
+    blocks = []
+    for insight in insights:
+        fonte = insight.fonte or "fonte não informada"
+        link = insight.link if insight.link and not insight.link_quebrado else None
+        blocks.append(
+            f'Conteudo: "{insight.conteudo}",\n'
+            f'Fonte: "{fonte}",\n'
+            f"Link: {json.dumps(link, ensure_ascii=False)}"
+        )
+    return "\n\n".join(blocks)
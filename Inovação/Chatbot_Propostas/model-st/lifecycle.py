@@ -0,0 +1,276 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import Iterable, List, Optional
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+KIND_THREAD = "thread"
+KIND_FILE = "file"
+KIND_VECTOR_STORE = "vector_store"
+
+# Tempo sem uso até o recurso ser removido da conta da OpenAI
+IDLE_TTL_SECONDS = {
+    KIND_THREAD: 30 * 24 * 3600,
+    KIND_FILE: 7 * 24 * 3600,
+    KIND_VECTOR_STORE: 7 * 24 * 3600,
+}
+# Recursos liberados só são coletados depois disso: uma thread efêmera pode
+# estar em uso num workflow de outra sessão
+EPHEMERAL_GRACE_SECONDS = 3600
+GC_MAX_WORKERS = 4
+# Intervalo mínimo entre coletas automáticas
+GC_INTERVAL_SECONDS = 3600
+LIST_PAGE_SIZE = 100
+# Status de arquivos que falharam no processamento e nunca serão usados
+FAILED_FILE_STATUSES = ("error", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    conversation_id TEXT,
+    assistant_id TEXT,
+    ephemeral INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_resources_thread
+    ON resources (conversation_id, assistant_id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_resources_alive
+    ON resources (kind, last_used_at) WHERE deleted_at IS NULL;
+"""
+
+
+def _is_not_found(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 404
+
+
+# ==================== REGISTRO ====================
+
+
+class ResourceRegistry:
+    """Registro local de threads, arquivos e vector stores criados pelo app"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._gc_lock = threading.Lock()
+        self._last_collect = 0.0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Uma conexão por operação: seguro entre threads e processos"""
+        with closing(sqlite3.connect(self.db_path, timeout=10)) as conn:
+            with conn:
+                yield conn
+
+    def record(
+        self,
+        kind: str,
+        resource_id: str,
+        conversation_id: Optional[str] = None,
+        assistant_id: Optional[str] = None,
+        ephemeral: bool = False,
+    ):
+        """Registra um recurso recém-criado na OpenAI"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resources (id, kind, conversation_id,"
+                " assistant_id, ephemeral, created_at, last_used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (resource_id, kind, conversation_id, assistant_id, ephemeral, now, now),
+            )
+
+    def touch(self, resource_ids: Iterable[str]):
+        """Renova o último uso (adia a coleta)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE resources SET last_used_at = ? WHERE id = ?",
+                [(now, resource_id) for resource_id in resource_ids],
+            )
+
+    def release(self, resource_ids: Iterable[str]):
+        """Marca recursos como descartáveis na próxima coleta"""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE resources SET ephemeral = 1 WHERE id = ?",
+                [(resource_id,) for resource_id in resource_ids],
+            )
+
+    def release_conversation(self, conversation_id: str):
+        """Libera tudo o que pertence a uma conversa apagada"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE resources SET ephemeral = 1 WHERE conversation_id = ?",
+                (conversation_id,),
+            )
+
+    def thread_for(self, conversation_id: str, assistant_id: str) -> Optional[str]:
+        """Thread ainda viva da conversa com este assistente, se houver
+
+        Só é reaproveitada a thread do mesmo par conversa/assistente: ela já
+        contém exatamente o histórico que o usuário vê na tela.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM resources WHERE kind = ? AND conversation_id = ?"
+                " AND assistant_id = ? AND ephemeral = 0 AND deleted_at IS NULL"
+                " ORDER BY last_used_at DESC LIMIT 1",
+                (KIND_THREAD, conversation_id, assistant_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _collectable(self) -> List[tuple]:
+        now = time.time()
+        clauses = " OR ".join(
+            f"(kind = '{kind}' AND last_used_at < {now - ttl})"
+            for kind, ttl in IDLE_TTL_SECONDS.items()
+        )
+        released_before = now - EPHEMERAL_GRACE_SECONDS
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT id, kind FROM resources WHERE deleted_at IS NULL"
+                f" AND ((ephemeral = 1 AND last_used_at < {released_before})"
+                f" OR {clauses})"
+            ).fetchall()
+
+    def _mark_deleted(self, resource_ids: Iterable[str]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE resources SET deleted_at = ? WHERE id = ?",
+                [(now, resource_id) for resource_id in resource_ids],
+            )
+
+    def _known_ids(self, kind: str, created_before: float) -> set:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM resources WHERE kind = ? AND deleted_at IS NULL"
+                " AND created_at < ?",
+                (kind, created_before),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    # ---------- Coleta ----------
+
+    def collect(self, client, max_workers: int = GC_MAX_WORKERS) -> dict:
+        """Remove da OpenAI os recursos descartáveis ou ociosos
+
+        Além do registro, percorre a listagem paginada de arquivos e vector
+        stores para limpar arquivos com falha, vector stores expirados e
+        registros de recursos que já não existem.
+        """
+        if not self._gc_lock.acquire(blocking=False):
+            return {"skipped": True}  # Outra coleta já está rodando
+        try:
+            self._last_collect = time.time()
+            targets = self._collectable()
+            try:
+                targets += self._sweep_listings(client)
+            except Exception:
+                pass  # Sem a listagem, ainda coleta o que está no registro
+            return self._delete(client, targets, max_workers)
+        finally:
+            self._gc_lock.release()
+
+    def _delete(self, client, targets: List[tuple], max_workers: int) -> dict:
+        """Apaga os (id, tipo) na OpenAI e marca no registro os que saíram"""
+        deleters = {
+            KIND_THREAD: client.beta.threads.delete,
+            KIND_FILE: client.files.delete,
+            KIND_VECTOR_STORE: _vector_stores(client).delete,
+        }
+
+        def delete(target):
+            resource_id, kind = target
+            try:
+                deleters[kind](resource_id)
+            except Exception as e:
+                if not _is_not_found(e):
+                    return None
+            return resource_id
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(delete, dict.fromkeys(targets)))
+
+        deleted = [resource_id for resource_id in results if resource_id]
+        self._mark_deleted(deleted)
+        return {"deleted": len(deleted), "failed": len(results) - len(deleted)}
+
+    def delete_in_background(
+        self, client, resource_ids: Iterable[str]
+    ) -> threading.Thread:
+        """Apaga já, sem esperar a coleta, só estes recursos (ex: as threads de
+        um workflow que terminou); os que falharem ficam para a coleta"""
+        resource_ids = list(resource_ids)
+        placeholders = ", ".join("?" * len(resource_ids))
+        with self._connect() as conn:
+            targets = conn.execute(
+                "SELECT id, kind FROM resources WHERE deleted_at IS NULL"
+                f" AND id IN ({placeholders})",
+                resource_ids,
+            ).fetchall()
+        job = threading.Thread(
+            target=self._delete,
+            args=(client, targets, GC_MAX_WORKERS),
+            name="descarte-openai",
+            daemon=True,
+        )
+        job.start()
+        return job
+
+    def _sweep_listings(self, client) -> List[tuple]:
+        """Recursos quebrados encontrados na listagem paginada da conta"""
+        targets = []
+        known_files = self._known_ids(KIND_FILE, created_before=time.time())
+        seen_files = set()
+        # O SDK busca as próximas páginas sob demanda (parâmetro "after")
+        for file in client.files.list(purpose="assistants", limit=LIST_PAGE_SIZE):
+            seen_files.add(file.id)
+            if getattr(file, "status", None) in FAILED_FILE_STATUSES:
+                targets.append((file.id, KIND_FILE))
+        # Registrados, mas apagados por fora (ex: pelo painel da OpenAI)
+        self._mark_deleted(known_files - seen_files)
+
+        vector_stores = _vector_stores(client)
+        for store in vector_stores.list(limit=LIST_PAGE_SIZE):
+            if getattr(store, "status", None) == "expired":
+                targets.append((store.id, KIND_VECTOR_STORE))
+        return targets
+
+    def collect_in_background(self, client) -> Optional[threading.Thread]:
+        """Dispara a coleta sem bloquear a interface (no máximo uma por intervalo)"""
+        if time.time() - self._last_collect < GC_INTERVAL_SECONDS:
+            return None
+        job = threading.Thread(
+            target=self.collect, args=(client,), name="coleta-openai", daemon=True
+        )
+        job.start()
+        return job
+
+
+def _vector_stores(client):
+    """vector_stores saiu do namespace beta nas versões novas do SDK"""
+    return getattr(client, "vector_stores", None) or client.beta.vector_stores
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from openai import OpenAI
+
+    parser = argparse.ArgumentParser(
+        description="Remove threads, arquivos e vector stores sem uso da conta"
+    )
+    parser.add_argument("db_path", help="Registro (ex: cache/openai_resources.db)")
+    args = parser.parse_args()
+    print(ResourceRegistry(args.db_path).collect(OpenAI()))
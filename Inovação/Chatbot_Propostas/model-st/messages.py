@@ -0,0 +1,156 @@
+import sys
+import weakref
+from typing import Iterator, List, Optional
+
+from storage import ConversationStore, content_hash
+from tokens import count_tokens
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+# Bytes de conteúdo mantidos em memória por sessão antes de descarregar em disco
+MESSAGE_MEMORY_CAP_BYTES = 512 * 1024
+# Mensagens mais recentes que nunca são descarregadas (janela visível)
+KEEP_RECENT_MESSAGES = 10
+# Exibido no lugar de um corpo descarregado que sumiu do disco
+MISSING_BODY_TEXT = "*[conteúdo da mensagem indisponível]*"
+
+
+# ==================== REGISTROS DE MENSAGEM ====================
+
+
+class MessageRecord:
+    """Mensagem compacta: sem __dict__, com role/timestamp internados"""
+
+    __slots__ = ("role", "timestamp", "content_hash", "size", "tokens", "_content")
+
+    def __init__(self, role: str, content: str, timestamp: Optional[str] = None):
+        self.role = sys.intern(role)
+        self.timestamp = sys.intern(timestamp) if timestamp else None
+        self.content_hash = content_hash(content)
+        self.size = len(content)
+        self.tokens: Optional[int] = None  # Contado sob demanda, uma única vez
+        self._content: Optional[str] = content
+
+    @property
+    def spilled(self) -> bool:
+        return self._content is None
+
+
+class MessageStore:
+    """Histórico da sessão com teto de memória e descarga das mensagens antigas"""
+
+    def __init__(
+        self,
+        body_store: ConversationStore,
+        user_id: str,
+        memory_cap_bytes: int = MESSAGE_MEMORY_CAP_BYTES,
+        keep_recent: int = KEEP_RECENT_MESSAGES,
+    ):
+        self._records: List[MessageRecord] = []
+        self._body_store = body_store
+        self._user_id = user_id
+        self._memory_cap = memory_cap_bytes
+        self._keep_recent = keep_recent
+        self.resident_bytes = 0
+        # Corpos descarregados por este histórico: ficam protegidos da limpeza
+        # de delete/archive_stale até o histórico sair de uso
+        self._pinned: List[str] = []
+        weakref.finalize(self, body_store.unpin_bodies, user_id, self._pinned)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __bool__(self) -> bool:
+        return bool(self._records)
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        return iter(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def append(self, role: str, content: str, timestamp: Optional[str] = None):
+        """Adiciona uma mensagem e descarrega as antigas se passar do teto"""
+        record = MessageRecord(role, content, timestamp)
+        self._records.append(record)
+        self.resident_bytes += record.size
+        self._enforce_cap()
+        return record
+
+    def pop(self) -> MessageRecord:
+        """Remove a última mensagem"""
+        record = self._records.pop()
+        if record.spilled:
+            self._pinned.remove(record.content_hash)
+            self._body_store.unpin_bodies(self._user_id, [record.content_hash])
+        else:
+            self.resident_bytes -= record.size
+        return record
+
+    def _load(self, record: MessageRecord) -> Optional[str]:
+        if record._content is not None:
+            return record._content
+        return self._body_store.load_body(self._user_id, record.content_hash)
+
+    def content(self, record: MessageRecord) -> str:
+        """Conteúdo da mensagem, relido do disco se tiver sido descarregado
+
+        Se o corpo sumiu (ex: apagado por outro processo), a tela mostra um
+        aviso no lugar; to_dicts nunca grava esse aviso na conversa.
+        """
+        body = self._load(record)
+        return MISSING_BODY_TEXT if body is None else body
+
+    def token_count(self, record: MessageRecord) -> int:
+        """Tokens da mensagem, contados uma vez e guardados no registro"""
+        if record.tokens is None:
+            record.tokens = count_tokens(self.content(record))
+        return record.tokens
+
+    def to_dicts(self, saved: Optional[List[dict]] = None) -> List[dict]:
+        """Materializa o histórico completo (ex.: para salvar a conversa)
+
+        Com saved (as mensagens já gravadas da conversa), as mensagens
+        descarregadas reaproveitam o conteúdo gravado em vez de reler o corpo
+        do disco a cada salvamento.
+        """
+        saved_contents = {}
+        for message in saved or []:
+            content = message.get("content")
+            if content:
+                saved_contents.setdefault(content_hash(content), content)
+
+        dicts = []
+        for record in self._records:
+            content = record._content
+            if content is None:
+                content = saved_contents.get(record.content_hash)
+            if content is None:
+                content = self._load(record)
+            if content is None:
+                raise FileNotFoundError(
+                    f"Corpo da mensagem {record.content_hash} não encontrado em disco"
+                )
+            dicts.append(
+                {
+                    "role": record.role,
+                    "content": content,
+                    "timestamp": record.timestamp,
+                }
+            )
+        return dicts
+
+    def _enforce_cap(self):
+        spillable = self._records[: -self._keep_recent or None]
+        for record in spillable:
+            if self.resident_bytes <= self._memory_cap:
+                break
+            if record.spilled:
+                continue
+            self._body_store.pin_body(self._user_id, record.content_hash)
+            self._pinned.append(record.content_hash)
+            self._body_store.save_body(
+                self._user_id, record.content_hash, record._content
+            )
+            record._content = None
+            self.resident_bytes -= record.size
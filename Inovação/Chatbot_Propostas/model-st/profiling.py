@@ -0,0 +1,96 @@
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+PROFILE_ENV_VAR = "MODEL_ST_PROFILE"
+
+# Instante em que o processo importou este módulo (≈ início do primeiro script run)
+PROCESS_STARTED_AT = time.perf_counter()
+
+_state = {"runs": 0, "run_started_at": PROCESS_STARTED_AT}
+_first_run: Dict[str, float] = {}
+_last_run: Dict[str, float] = {}
+_lazy_imports: Dict[str, float] = {}
+
+
+# ==================== MEDIÇÕES ====================
+
+
+def begin_run():
+    """Marca o início de uma execução do script (chamado logo após os imports).
+
+    Na primeira execução do processo registra também o tempo gasto nos imports.
+    """
+    now = time.perf_counter()
+    _state["runs"] += 1
+    _last_run.clear()
+    if _state["runs"] == 1:
+        _first_run["imports do app"] = (now - PROCESS_STARTED_AT) * 1000
+    _state["run_started_at"] = now
+
+
+@contextmanager
+def phase(name: str):
+    """Mede a duração de uma etapa da execução atual, em milissegundos"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _last_run[name] = elapsed_ms
+        if _state["runs"] == 1:
+            _first_run[name] = elapsed_ms
+
+
+def mark(name: str):
+    """Registra o tempo desde o início da execução atual até este ponto"""
+    elapsed_ms = (time.perf_counter() - _state["run_started_at"]) * 1000
+    _last_run[name] = elapsed_ms
+    if _state["runs"] == 1:
+        _first_run[name] = elapsed_ms + _first_run.get("imports do app", 0.0)
+
+
+def timed_import(module_name: str):
+    """Importa um módulo sob demanda registrando o custo da primeira importação"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _lazy_imports[module_name] = (time.perf_counter() - started) * 1000
+    return module
+
+
+# ==================== RELATÓRIO ====================
+
+
+def is_enabled(query_params=None) -> bool:
+    """Ativa o perfil por variável de ambiente ou por ?profile=1 na URL"""
+    if os.environ.get(PROFILE_ENV_VAR, "").lower() in ("1", "true", "yes"):
+        return True
+    return bool(query_params) and query_params.get("profile") in ("1", "true")
+
+
+def report() -> Dict[str, List[Tuple[str, float]]]:
+    """Tempos coletados: início a frio, última execução e imports sob demanda"""
+    return {
+        "Início a frio (primeira execução)": list(_first_run.items()),
+        "Última execução": list(_last_run.items()),
+        "Imports sob demanda (SDKs)": list(_lazy_imports.items()),
+    }
+
+
+def format_report_markdown() -> str:
+    """Relatório em tabelas Markdown (evita carregar pandas só para exibir)"""
+    sections = []
+    for title, rows in report().items():
+        if not rows:
+            continue
+        lines = [f"**{title}**", "", "| Etapa | ms |", "|---|---:|"]
+        lines += [f"| {name} | {ms:.1f} |" for name, ms in rows]
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
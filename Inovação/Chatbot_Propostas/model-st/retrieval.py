@@ -0,0 +1,241 @@
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from storage import atomic_write_json
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+INDEX_VERSION = 1
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Passagens maiores que isso são quebradas em blocos menores
+MAX_PASSAGE_WORDS = 180
+
+STAGE_HEADER_RE = re.compile(r"^\s*Etapa\s+\d+", re.IGNORECASE)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+    a ao aos as com como da das de do dos e em entre esta este isso na nas no nos
+    o os ou para pela pelo por que se sem sua suas seu seus um uma uns umas ja
+    mais muito quando onde ser sao foi tem ter ha nao sim the of and to in for
+    """.split())
+
+
+# ==================== MODELOS DE DADOS ====================
+
+
+class Passage(BaseModel):
+    source: str
+    title: str
+    text: str
+    score: float = 0.0
+
+
+# ==================== UTILITÁRIOS ====================
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos e sem stopwords"""
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    without_accents = "".join(c for c in normalized if not unicodedata.combining(c))
+    return [
+        token
+        for token in TOKEN_RE.findall(without_accents)
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def split_passages(source: str, content: str) -> List[dict]:
+    """Divide um arquivo de etapas em passagens (uma por 'Etapa N')"""
+    lines = [line.rstrip() for line in content.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    # A primeira linha descreve o serviço (ex: "Etapas de Chatbots:")
+    title = lines[0].strip().rstrip(":")
+    blocks: List[List[str]] = []
+    for line in lines[1:]:
+        if STAGE_HEADER_RE.match(line) or not blocks:
+            blocks.append([line])
+        else:
+            blocks[-1].append(line)
+
+    passages = []
+    for block in blocks:
+        header, body = block[0], block[1:]
+        chunk: List[str] = []
+        words = 0
+        for line in body or [""]:
+            line_words = len(line.split())
+            if chunk and words + line_words > MAX_PASSAGE_WORDS:
+                passages.append(_make_passage(source, title, header, chunk))
+                chunk, words = [], 0
+            if line:
+                chunk.append(line)
+                words += line_words
+        passages.append(_make_passage(source, title, header, chunk))
+    return passages
+
+
+def _make_passage(source: str, title: str, header: str, lines: List[str]) -> dict:
+    text = "\n".join([header] + lines)
+    return {
+        "source": source,
+        "title": title,
+        "text": text,
+        "tokens": tokenize(f"{title} {text}"),
+    }
+
+
+def _file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+# ==================== ÍNDICE BM25 ====================
+
+
+class StageIndex:
+    """Índice BM25 local dos documentos de etapas, com reconstrução incremental"""
+
+    def __init__(self, docs_dir: str, cache_path: str, pattern: str = "*.txt"):
+        self.docs_dir = docs_dir
+        self.cache_path = cache_path
+        self.pattern = pattern
+        self._lock = threading.Lock()
+        # source -> {"fingerprint", "sha1", "passages"}
+        self._files: Dict[str, dict] = self._load_cache()
+        self._passages: List[dict] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_lengths: List[int] = []
+        self._avg_length = 0.0
+        self._stale = True
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data["files"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        return {}
+
+    def _save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        atomic_write_json(
+            self.cache_path, {"version": INDEX_VERSION, "files": self._files}
+        )
+
+    def refresh(self) -> bool:
+        """Reindexa só os arquivos novos ou alterados; retorna se algo mudou"""
+        with self._lock:
+            paths = sorted(glob.glob(os.path.join(self.docs_dir, self.pattern)))
+            current = {os.path.basename(path): path for path in paths}
+            changed = False
+
+            for source in list(self._files):
+                if source not in current:
+                    del self._files[source]
+                    changed = True
+
+            for source, path in current.items():
+                fingerprint = _file_fingerprint(path)
+                cached = self._files.get(source)
+                if cached and cached["fingerprint"] == fingerprint:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                sha1 = hashlib.sha1(content.encode("utf-8")).hexdigest()
+                if cached and cached["sha1"] == sha1:
+                    # Só o mtime mudou (ex: checkout); mantém as passagens
+                    cached["fingerprint"] = fingerprint
+                else:
+                    self._files[source] = {
+                        "fingerprint": fingerprint,
+                        "sha1": sha1,
+                        "passages": split_passages(source, content),
+                    }
+                changed = True
+
+            if changed:
+                self._save_cache()
+            if changed or self._stale:
+                self._rebuild_postings()
+            return changed
+
+    def _rebuild_postings(self):
+        passages = [
+            passage
+            for source in sorted(self._files)
+            for passage in self._files[source]["passages"]
+        ]
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_lengths = []
+        for doc_id, passage in enumerate(passages):
+            doc_lengths.append(len(passage["tokens"]))
+            for term, freq in Counter(passage["tokens"]).items():
+                postings.setdefault(term, {})[doc_id] = freq
+
+        self._passages = passages
+        self._postings = postings
+        self._doc_lengths = doc_lengths
+        self._avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        self._stale = False
+
+    def search(self, query: str, k: int = 4, min_score: float = 0.0) -> List[Passage]:
+        """Retorna as k passagens mais relevantes para a consulta (BM25)"""
+        self.refresh()
+        with self._lock:
+            return self._rank(tokenize(query), k, min_score)
+
+    def _rank(self, query_tokens: List[str], k: int, min_score: float):
+        total = len(self._passages)
+        if not total:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term in set(query_tokens):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings.items():
+                norm = (
+                    1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self._avg_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (
+                    freq * (BM25_K1 + 1) / (freq + BM25_K1 * norm)
+                )
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [
+            Passage(
+                source=self._passages[doc_id]["source"],
+                title=self._passages[doc_id]["title"],
+                text=self._passages[doc_id]["text"],
+                score=round(score, 4),
+            )
+            for doc_id, score in ranked[:k]
+            if score > min_score
+        ]
+
+
+def format_passages_for_prompt(passages: List[Passage]) -> Optional[str]:
+    """Bloco de contexto com as etapas de referência para o prompt da proposta"""
+    if not passages:
+        return None
+    blocks = [
+        f"[{passage.title} — {passage.source}]\n{passage.text}" for passage in passages
+    ]
+    return "\n\n".join(blocks)
@@ -0,0 +1,425 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fica só o lock entre threads
+    fcntl = None
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+DEFAULT_USER_ID = "anonimo"
+LOCK_FILENAME = ".lock"
+BODIES_DIRNAME = "_bodies"
+ARCHIVE_DIRNAME = "_archive"
+ARCHIVE_INDEX_FILENAME = "index.json"
+# Conversas sem alteração há mais que isso vão para o arquivo compactado
+ARCHIVE_AFTER_DAYS = 30
+# Campos guardados no índice para listar conversas arquivadas sem descompactar
+SUMMARY_FIELDS = ("id", "name", "assistant_key", "created_at", "updated_at")
+
+# Locks entre threads do mesmo processo (o flock cobre os demais processos)
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+# Corpos descarregados por históricos abertos neste processo: não são apagados
+_pinned_bodies: Counter = Counter()
+_pinned_bodies_guard = threading.Lock()
+
+
+# ==================== UTILITÁRIOS ====================
+
+
+def generate_conversation_id() -> str:
+    """Gera ID único para conversas (UUID4, sem colisão sob carga)"""
+    return uuid.uuid4().hex
+
+
+def sanitize_user_id(user_id: Optional[str]) -> str:
+    """Normaliza o identificador do usuário para uso como nome de pasta"""
+    if not user_id:
+        return DEFAULT_USER_ID
+    cleaned = re.sub(r"[^a-z0-9._@-]", "_", user_id.strip().lower())
+    cleaned = cleaned.replace("@", "_at_").strip("._")
+    return cleaned or DEFAULT_USER_ID
+
+
+def content_hash(content: str) -> str:
+    """Hash estável do conteúdo, usado como chave de cache e de descarga"""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def _message_hashes(data: Optional[dict]) -> set:
+    """Hashes do conteúdo das mensagens de uma conversa"""
+    return {
+        content_hash(message["content"])
+        for message in (data or {}).get("messages", [])
+        if message.get("content")
+    }
+
+
+def _is_valid_conversation_id(conversation_id: str) -> bool:
+    """Evita path traversal em IDs vindos da interface"""
+    return bool(re.fullmatch(r"[A-Za-z0-9_-]+", conversation_id or ""))
+
+
+def atomic_write_json(filepath: str, data, indent: Optional[int] = None):
+    """Grava JSON em arquivo temporário e troca pelo definitivo de forma atômica"""
+    directory = os.path.dirname(filepath)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ==================== ARMAZENAMENTO ====================
+
+
+class ConversationStore:
+    """Armazena conversas em partições por usuário com escrita atômica"""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        os.makedirs(self.base_dir, exist_ok=True)
+        self._migrate_legacy_files()
+
+    def user_dir(self, user_id: str) -> str:
+        """Retorna (e cria) a pasta da partição do usuário"""
+        path = os.path.join(self.base_dir, sanitize_user_id(user_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _filepath(self, user_id: str, conversation_id: str) -> str:
+        if not _is_valid_conversation_id(conversation_id):
+            raise ValueError(f"ID de conversa inválido: {conversation_id!r}")
+        return os.path.join(self.user_dir(user_id), f"{conversation_id}.json")
+
+    @contextmanager
+    def lock(self, user_id: str):
+        """Lock exclusivo da partição do usuário (threads e processos)"""
+        directory = self.user_dir(user_id)
+        with _thread_locks_guard:
+            thread_lock = _thread_locks.setdefault(directory, threading.Lock())
+
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(directory, LOCK_FILENAME), "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self, filepath: str) -> Optional[dict]:
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, user_id: str, conversation_id: str, data: dict):
+        """Salva a conversa de forma atômica (write + rename)"""
+        filepath = self._filepath(user_id, conversation_id)
+        with self.lock(user_id):
+            atomic_write_json(filepath, data)
+
+    def load(
+        self, user_id: str, conversation_id: str, rehydrate: bool = True
+    ) -> Optional[dict]:
+        """Carrega a conversa; o rename atômico garante leitura sem lock
+
+        Conversas arquivadas são reidratadas para a partição ativa ao abrir;
+        com rehydrate=False (ex: exportação) são lidas direto do pacote.
+        """
+        filepath = self._filepath(user_id, conversation_id)
+        data = self._read(filepath)
+        if data is None and conversation_id in self._read_index(user_id):
+            if not rehydrate:
+                return self._read_archived(user_id, conversation_id)
+            with self.lock(user_id):
+                data = self._read(filepath) or self._rehydrate(user_id, conversation_id)
+        return data
+
+    def update(
+        self,
+        user_id: str,
+        conversation_id: str,
+        mutate: Callable[[dict], dict],
+    ) -> Optional[dict]:
+        """Lê, altera e grava a conversa dentro do mesmo lock"""
+        filepath = self._filepath(user_id, conversation_id)
+        with self.lock(user_id):
+            data = self._read(filepath) or self._rehydrate(user_id, conversation_id)
+            if data is None:
+                return None
+            data = mutate(data)
+            atomic_write_json(filepath, data)
+            return data
+
+    def list(self, user_id: str) -> List[dict]:
+        """Lista as conversas ativas e os resumos das arquivadas do usuário"""
+        directory = self.user_dir(user_id)
+        conversations = []
+        hot_ids = set()
+        for filename in os.listdir(directory):
+            if filename.endswith(".json") and not filename.startswith("."):
+                data = self._read(os.path.join(directory, filename))
+                if data:
+                    conversations.append(data)
+                    hot_ids.add(data.get("id"))
+        for conversation_id, entry in self._read_index(user_id).items():
+            if conversation_id not in hot_ids:
+                conversations.append(entry["summary"])
+        return conversations
+
+    def delete(self, user_id: str, conversation_id: str):
+        """Remove a conversa da partição do usuário (e os corpos descarregados)"""
+        filepath = self._filepath(user_id, conversation_id)
+        with self.lock(user_id):
+            data = self._read(filepath) or self._read_archived(user_id, conversation_id)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            index = self._read_index(user_id)
+            if index.pop(conversation_id, None):
+                self._write_index(user_id, index)
+            self._remove_bodies(user_id, _message_hashes(data))
+
+    def _bodies_dir(self, user_id: str) -> str:
+        path = os.path.join(self.user_dir(user_id), BODIES_DIRNAME)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _body_path(self, user_id: str, content_hash: str) -> str:
+        return os.path.join(self._bodies_dir(user_id), f"{content_hash}.txt")
+
+    def pin_body(self, user_id: str, content_hash: str):
+        """Impede que o corpo seja apagado enquanto um histórico aberto o usa"""
+        with _pinned_bodies_guard:
+            _pinned_bodies[self._body_path(user_id, content_hash)] += 1
+
+    def unpin_bodies(self, user_id: str, hashes: Iterable[str]):
+        with _pinned_bodies_guard:
+            for content_hash in hashes:
+                filepath = self._body_path(user_id, content_hash)
+                _pinned_bodies[filepath] -= 1
+                if _pinned_bodies[filepath] <= 0:
+                    del _pinned_bodies[filepath]
+
+    def save_body(self, user_id: str, content_hash: str, content: str):
+        """Grava o corpo de uma mensagem endereçado pelo hash do conteúdo"""
+        filepath = self._body_path(user_id, content_hash)
+        if os.path.exists(filepath):
+            return  # Conteúdo idêntico já foi descarregado antes
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix=".tmp_")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, filepath)
+
+    def load_body(self, user_id: str, content_hash: str) -> Optional[str]:
+        """Lê o corpo de uma mensagem descarregada em disco"""
+        filepath = self._body_path(user_id, content_hash)
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove_bodies(self, user_id: str, hashes: set):
+        """Apaga os corpos que nenhuma conversa ativa ainda referencia (com lock)
+
+        Os corpos são endereçados pelo conteúdo, então a mesma mensagem pode
+        pertencer a mais de uma conversa do usuário; os que um histórico aberto
+        ainda usa (pin_body) também ficam.
+        """
+        if not hashes:
+            return
+        directory = self.user_dir(user_id)
+        for filename in os.listdir(directory):
+            if filename.endswith(".json") and not filename.startswith("."):
+                hashes -= _message_hashes(self._read(os.path.join(directory, filename)))
+                if not hashes:
+                    return
+        with _pinned_bodies_guard:
+            for body_hash in hashes:
+                filepath = self._body_path(user_id, body_hash)
+                if filepath in _pinned_bodies:
+                    continue
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+
+    # ---------- Arquivo compactado ----------
+
+    def _archive_dir(self, user_id: str) -> str:
+        path = os.path.join(self.user_dir(user_id), ARCHIVE_DIRNAME)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _read_index(self, user_id: str) -> Dict[str, dict]:
+        """Índice {conversation_id: {"bundle", "summary"}} do arquivo"""
+        filepath = os.path.join(self._archive_dir(user_id), ARCHIVE_INDEX_FILENAME)
+        return self._read(filepath) or {}
+
+    def _write_index(self, user_id: str, index: Dict[str, dict]):
+        archive_dir = self._archive_dir(user_id)
+        atomic_write_json(os.path.join(archive_dir, ARCHIVE_INDEX_FILENAME), index)
+        # Pacotes sem nenhuma conversa referenciada no índice podem sair
+        live_bundles = {entry["bundle"] for entry in index.values()}
+        for name in os.listdir(archive_dir):
+            if name.endswith(".jsonl.gz") and name not in live_bundles:
+                os.remove(os.path.join(archive_dir, name))
+
+    def _read_archived(
+        self, user_id: str, conversation_id: str, index: Optional[dict] = None
+    ) -> Optional[dict]:
+        """Lê a conversa do pacote gzip sem tirá-la do arquivo"""
+        index = self._read_index(user_id) if index is None else index
+        entry = index.get(conversation_id)
+        if entry is None:
+            return None
+        bundle_path = os.path.join(self._archive_dir(user_id), entry["bundle"])
+        try:
+            with gzip.open(bundle_path, "rt", encoding="utf-8") as bundle:
+                for line in bundle:
+                    # Filtro barato antes de decodificar a linha inteira
+                    if conversation_id not in line:
+                        continue
+                    record = json.loads(line)
+                    if record.get("id") == conversation_id:
+                        return record
+        except FileNotFoundError:
+            pass
+        return None
+
+    def _rehydrate(self, user_id: str, conversation_id: str) -> Optional[dict]:
+        """Traz a conversa do pacote de volta à partição ativa (com lock)"""
+        index = self._read_index(user_id)
+        if conversation_id not in index:
+            return None
+        data = self._read_archived(user_id, conversation_id, index)
+        if data is None:
+            return None  # Pacote ilegível: a entrada fica no índice
+        # Só sai do índice depois que a cópia ativa foi gravada
+        atomic_write_json(self._filepath(user_id, conversation_id), data)
+        del index[conversation_id]
+        self._write_index(user_id, index)
+        return data
+
+    def archive_stale(
+        self, user_id: str, older_than_days: float = ARCHIVE_AFTER_DAYS
+    ) -> int:
+        """Move as conversas sem alteração há N dias para um pacote gzip
+
+        Retorna quantas conversas foram arquivadas.
+        """
+        cutoff = time.time() - older_than_days * 24 * 3600
+        with self.lock(user_id):
+            directory = self.user_dir(user_id)
+            stale = []
+            for filename in os.listdir(directory):
+                filepath = os.path.join(directory, filename)
+                if (
+                    filename.endswith(".json")
+                    and not filename.startswith(".")
+                    and os.path.getmtime(filepath) < cutoff
+                ):
+                    stale.append(filepath)
+            if not stale:
+                return 0
+
+            archive_dir = self._archive_dir(user_id)
+            bundle_name = f"bundle_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl.gz"
+            fd, tmp_path = tempfile.mkstemp(dir=archive_dir, prefix=".tmp_")
+            index = self._read_index(user_id)
+            archived = []
+            archived_hashes = set()
+            try:
+                with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+                    fileobj=raw, mode="wb"
+                ) as bundle:
+                    for filepath in stale:
+                        data = self._read(filepath)
+                        if not data or "id" not in data:
+                            continue
+                        line = json.dumps(data, ensure_ascii=False) + "\n"
+                        bundle.write(line.encode("utf-8"))
+                        index[data["id"]] = {
+                            "bundle": bundle_name,
+                            "summary": {
+                                field: data.get(field) for field in SUMMARY_FIELDS
+                            },
+                        }
+                        archived.append(filepath)
+                        archived_hashes |= _message_hashes(data)
+                os.replace(tmp_path, os.path.join(archive_dir, bundle_name))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            # Índice antes de apagar: se cair no meio, a cópia ativa prevalece
+            self._write_index(user_id, index)
+            for filepath in archived:
+                os.remove(filepath)
+            # O pacote guarda o conteúdo completo: os corpos descarregados sobram
+            self._remove_bodies(user_id, archived_hashes)
+            return len(archived)
+
+    def archive_all(self, older_than_days: float = ARCHIVE_AFTER_DAYS) -> int:
+        """Roda o arquivamento em todas as partições de usuário"""
+        total = 0
+        for name in os.listdir(self.base_dir):
+            if os.path.isdir(os.path.join(self.base_dir, name)):
+                total += self.archive_stale(name, older_than_days)
+        return total
+
+    def _migrate_legacy_files(self):
+        """Move conversas do diretório plano antigo para a partição padrão"""
+        legacy = [
+            name
+            for name in os.listdir(self.base_dir)
+            if name.endswith(".json")
+            and os.path.isfile(os.path.join(self.base_dir, name))
+        ]
+        if not legacy:
+            return
+        target_dir = self.user_dir(DEFAULT_USER_ID)
+        for name in legacy:
+            target = os.path.join(target_dir, name)
+            if os.path.exists(target):
+                continue
+            try:
+                os.replace(os.path.join(self.base_dir, name), target)
+            except FileNotFoundError:
+                pass  # Outro processo já migrou este arquivo
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Arquiva conversas antigas")
+    parser.add_argument("base_dir", help="Pasta de conversas (ex: conversations)")
+    parser.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    count = ConversationStore(args.base_dir).archive_all(args.days)
+    print(f"{count} conversa(s) arquivada(s)")
@@ -0,0 +1,34 @@
+import time
+
+import openai
+import streamlit as st
+
+# Módulo importado sob demanda: o SDK da OpenAI só é carregado
+# quando um assistente com streaming é usado pela primeira vez.
+
+# ==================== HANDLERS DE STREAMING ====================
+
+
+class StreamingEventHandler(openai.AssistantEventHandler):
+    def __init__(self, text_placeholder):
+        super().__init__()
+        self.text_placeholder = text_placeholder
+        self.full_response = ""
+        self.start_time = time.time()
+
+    def on_text_delta(self, delta, snapshot):
+        if st.session_state.stop_generation:
+            raise Exception("Generation stopped by user")
+
+        self.full_response += delta.value
+        self.text_placeholder.markdown(self.full_response + "▌")
+
+    def on_text_done(self, text):
+        self.text_placeholder.markdown(self.full_response)
+
+    def on_exception(self, exception):
+        if "stopped by user" not in str(exception):
+            st.error(f"❌ Erro: {exception}")
+
+    def get_full_response(self):
+        return self.full_response
@@ -0,0 +1,23 @@
+import pytest
+
+from exporter import iter_html
+
+
+def _render_html(content: str) -> str:
+    return "".join(iter_html("Conversa", [("assistant", content, None)]))
+
+
+def test_html_export_escapes_script_tags():
+    exported = _render_html(
+        'Oi <script>alert("x")</script>\n\n<div onclick="x()">a</div>'
+    )
+    assert "<script>" not in exported
+    assert "&lt;script&gt;" in exported
+    assert "<div onclick" not in exported
+
+
+def test_html_export_keeps_markdown_formatting():
+    pytest.importorskip("markdown")
+    exported = _render_html("**negrito**\n\n```\na < b\n```")
+    assert "<strong>negrito</strong>" in exported
+    assert "a &lt; b" in exported
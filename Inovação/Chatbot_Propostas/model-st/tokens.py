@@ -0,0 +1,167 @@
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+# ==================== CONFIGURAÇÕES E CONSTANTES ====================
+
+# Caracteres por token quando o tiktoken não está instalado (texto em português)
+CHARS_PER_TOKEN_FALLBACK = 3.6
+TRIM_MARKER = "\n\n[... trecho removido para caber no limite de tokens ...]\n\n"
+# Fração do orçamento mantida do início do texto ao cortar (o resto vem do final)
+TRIM_HEAD_RATIO = 0.7
+# Fração do orçamento garantida à mensagem do usuário: acima do limite, o
+# histórico é encurtado antes de a mensagem ser cortada
+MIN_PROMPT_SHARE = 0.25
+
+
+class ModelProfile(BaseModel):
+    """Preço (US$ por 1M tokens) e vazão aproximada de cada modelo"""
+
+    input_price: float
+    output_price: float
+    prefill_tokens_per_second: float = 4000.0
+    output_tokens_per_second: float = 40.0
+    expected_output_tokens: int = 1500
+    base_latency_seconds: float = 2.0
+
+
+MODEL_PROFILES = {
+    "gpt-4-turbo-preview": ModelProfile(input_price=10.0, output_price=30.0),
+    "gemini-2.5-pro": ModelProfile(
+        input_price=1.25,
+        output_price=10.0,
+        output_tokens_per_second=60.0,
+        expected_output_tokens=3000,  # Inclui o raciocínio (thinking)
+        base_latency_seconds=8.0,  # Busca no Google antes de responder
+    ),
+}
+DEFAULT_PROFILE = MODEL_PROFILES["gpt-4-turbo-preview"]
+
+
+class PreflightReport(BaseModel):
+    input_tokens: int
+    estimated_cost_usd: float
+    estimated_latency_seconds: float
+    over_warning: bool = False
+    trimmed: bool = False
+    trimmed_prompt: Optional[str] = None
+    # Mensagens mais recentes do histórico que cabem (None: todas)
+    history_messages: Optional[int] = None
+    # Nem a fração mínima da mensagem cabe: a chamada não deve ser feita
+    blocked: bool = False
+
+
+# ==================== CONTAGEM ====================
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Conta tokens localmente (tiktoken) ou estima pelo tamanho do texto"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return int(len(text) / CHARS_PER_TOKEN_FALLBACK) + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """Corta o meio do texto para caber no orçamento, preservando início e fim"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max(max_tokens - count_tokens(TRIM_MARKER), 0)
+    head_budget = int(budget * TRIM_HEAD_RATIO)
+    tail_budget = budget - head_budget
+
+    encoding = _get_encoding()
+    if encoding is None:
+        head_chars = int(head_budget * CHARS_PER_TOKEN_FALLBACK)
+        tail_chars = int(tail_budget * CHARS_PER_TOKEN_FALLBACK)
+        head, tail = text[:head_chars], text[len(text) - tail_chars :]
+    else:
+        encoded = encoding.encode(text, disallowed_special=())
+        head = encoding.decode(encoded[:head_budget])
+        tail = encoding.decode(encoded[len(encoded) - tail_budget :])
+    return f"{head}{TRIM_MARKER}{tail}"
+
+
+# ==================== PRÉ-VOO ====================
+
+
+def window_history(message_tokens: Sequence[int], budget: int) -> Tuple[int, int]:
+    """Quantas mensagens mais recentes cabem no orçamento, e quantos tokens somam"""
+    kept = total = 0
+    for tokens in reversed(message_tokens):
+        if total + tokens > budget:
+            break
+        kept += 1
+        total += tokens
+    return kept, total
+
+
+def preflight(
+    prompt: str,
+    model: str,
+    warn_tokens: int,
+    max_tokens: int,
+    history_tokens: int = 0,
+    message_tokens: Sequence[int] = (),
+) -> PreflightReport:
+    """Estima tokens, custo e latência da chamada e ajusta a entrada ao limite
+
+    history_tokens é a entrada fixa (ex: anexos inline); message_tokens traz os
+    tokens de cada mensagem do histórico, da mais antiga à mais recente. Acima
+    do limite, primeiro o histórico fica só com as mensagens mais recentes;
+    depois, se ainda preciso, o meio da mensagem é cortado, sem passar da
+    fração mínima (MIN_PROMPT_SHARE). Se nem isso cabe, a chamada é bloqueada.
+    """
+    profile = MODEL_PROFILES.get(model, DEFAULT_PROFILE)
+    prompt_tokens = count_tokens(prompt)
+    messages_total = sum(message_tokens)
+    trimmed_prompt = None
+    history_messages = None
+    blocked = False
+
+    if prompt_tokens + history_tokens + messages_total > max_tokens:
+        reserved = min(prompt_tokens, int(max_tokens * MIN_PROMPT_SHARE))
+        history_budget = max(max_tokens - history_tokens - reserved, 0)
+        if messages_total > history_budget:
+            history_messages, messages_total = window_history(
+                message_tokens, history_budget
+            )
+        prompt_budget = max_tokens - history_tokens - messages_total
+        if prompt_budget < max(reserved, 1):
+            blocked = True
+        elif prompt_tokens > prompt_budget:
+            trimmed_prompt = trim_to_budget(prompt, prompt_budget)
+            prompt_tokens = count_tokens(trimmed_prompt)
+
+    input_tokens = prompt_tokens + history_tokens + messages_total
+    cost = (
+        input_tokens * profile.input_price
+        + profile.expected_output_tokens * profile.output_price
+    ) / 1_000_000
+    latency = (
+        profile.base_latency_seconds
+        + input_tokens / profile.prefill_tokens_per_second
+        + profile.expected_output_tokens / profile.output_tokens_per_second
+    )
+    return PreflightReport(
+        input_tokens=input_tokens,
+        estimated_cost_usd=round(cost, 4),
+        estimated_latency_seconds=round(latency, 1),
+        over_warning=input_tokens > warn_tokens,
+        trimmed=trimmed_prompt is not None,
+        trimmed_prompt=trimmed_prompt,
+        history_messages=history_messages,
+        blocked=blocked,
+    )
@@ -140,33 +140,46 @@ const ask_gpt = async (message) => {
       }),
     });
 
+    // Errors come back as JSON ({"success": false, "error": ...}), not as a stream
+    const content_type = response.headers.get(`content-type`) || ``;
+    if (!response.ok || !content_type.includes(`text/event-stream`)) {
+      let error = `HTTP ${response.status}`;
+      try {
+        const body = await response.json();
+        error = body.error || body.message || error;
+      } catch (_) {}
+      throw new Error(error);
+    }
+
     const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = ``;
 
+    // Server-Sent Events: each "data: {...}" block is a text or function-call part
     while (true) {
       const { value, done } = await reader.read();
       if (done) break;
 
-      chunk = new TextDecoder().decode(value);
-
-      if (
-        chunk.includes(
-          `<form id="challenge-form" action="/backend-api/v2/conversation?`
-        )
-      ) {
-        chunk = `cloudflare token expired, please refresh the page.`;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split(`\n\n`);
+      buffer = events.pop();
+
+      for (const event of events) {
+        if (!event.startsWith(`data: `)) continue;
+        const part = JSON.parse(event.slice(`data: `.length));
+
+        if (part.type === `text`) {
+          text += part.content;
+        } else if (part.type === `function_call`) {
+          const args = Object.entries(part.args)
+            .map(([key, val]) => `${key}=${val}`)
+            .join(`, `);
+          text += `\nFunction call: ${part.name}(${args})\n`;
+        } else if (part.type === `error`) {
+          throw new Error(part.error);
+        }
       }
 
-      text += chunk;
-
-      // const objects         = chunk.match(/({.+?})/g);
-
-      // try { if (JSON.parse(objects[0]).success === false) throw new Error(JSON.parse(objects[0]).error) } catch (e) {}
-
-      // objects.forEach((object) => {
-      //     console.log(object)
-      //     try { text += h2a(JSON.parse(object).content) } catch(t) { console.log(t); throw new Error(t)}
-      // });
-
       document.getElementById(`gpt_${window.token}`).innerHTML =
         markdown.render(text);
       document.querySelectorAll(`code`).forEach((el) => {
@@ -211,9 +224,10 @@ const ask_gpt = async (message) => {
     if (cursorDiv) cursorDiv.parentNode.removeChild(cursorDiv);
 
     if (e.name != `AbortError`) {
-      let error_message = `oops ! something went wrong, please try again / reload. [stacktrace in console]`;
+      let error_message = `oops ! something went wrong, please try again / reload. [${e.message || `stacktrace in console`}]`;
 
-      document.getElementById(`gpt_${window.token}`).innerHTML = error_message;
+      // textContent: the message may come from the server
+      document.getElementById(`gpt_${window.token}`).textContent = error_message;
       add_message(window.conversation_id, "assistant", error_message);
     } else {
       document.getElementById(`gpt_${window.token}`).innerHTML += ` [aborted]`;
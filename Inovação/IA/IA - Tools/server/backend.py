@@ -1,21 +1,44 @@
+import json
 import os
-import time
+from contextlib import nullcontext
 from datetime import datetime
-from flask import request
+from flask import Response, request, stream_with_context
 from requests import get
 import google.generativeai as genai
 from google.ai.generativelanguage_v1beta.types import content
 
+from server.rate_limit import RateLimiter, estimate_tokens
+from server.sessions import ChatSessionStore, history_from_client
+
 class Backend_Api:
     def __init__(self, app, config: dict) -> None:
         self.app = app
         self.gemini_key = os.getenv("GEMINI_API_KEY")
         self.gemini_api_base = os.getenv("GEMINI_API_BASE")
         self.proxy = config.get('proxy')
+
+        # Chat sessions kept between requests, one per conversation_id
+        session_config = config.get('chat_sessions', {})
+        self.sessions = ChatSessionStore(
+            max_sessions=session_config.get('max_sessions', 200),
+            ttl_seconds=session_config.get('ttl_seconds', 3600),
+            max_memory_bytes=session_config.get('max_memory_mb', 64) * 1024 * 1024,
+        )
+
+        # Shared Gemini quota (requests and tokens per minute) for all request threads
+        limit_config = config.get('rate_limit', {})
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=limit_config.get('requests_per_minute', 10),
+            tokens_per_minute=limit_config.get('tokens_per_minute', 4_000_000),
+        )
         self.routes = {
             '/backend-api/v2/conversation': {
                 'function': self._conversation,
                 'methods': ['POST']
+            },
+            '/backend-api/v2/status': {
+                'function': self._status,
+                'methods': ['GET']
             }
         }
         
@@ -124,26 +147,136 @@ class Backend_Api:
   tool_config={'function_calling_config':'ANY'},
 )
         
-    def send_message(self, message):
-        chat_session = self.model.start_chat()
-        time.sleep(1)  # Basic rate-limit pause
-
-        response = chat_session.send_message(message)
-        response_text = ""
-        for part in response.parts:
-            if part.text:
-                response_text += part.text
-            if part.function_call:
-                args = ", ".join(f"{key}={val}" for key, val in part.function_call.args.items())
-                response_text += f"\nFunction call: {part.function_call.name}({args})\n"
-        return response_text
+    def _prepare(self, message, conversation_id, conversation):
+        if conversation_id is None:
+            chat_session = self.model.start_chat()
+            entry = None
+        else:
+            # Reuses the conversation's session; the history sent by the
+            # browser is only needed if the server lost it (restart/eviction)
+            entry = self.sessions.acquire(
+                conversation_id,
+                lambda: self.model.start_chat(history=history_from_client(conversation)),
+            )
+            chat_session = entry.session
+
+        # Waits only if the per-minute budget is exhausted; the whole session
+        # history counts as input tokens
+        history_bytes = self.sessions.size(conversation_id) if entry else 0
+        estimated = estimate_tokens(message, history_bytes)
+        waited = self.rate_limiter.acquire(estimated)
+        if waited > 0.001:
+            stats = self.rate_limiter.stats()
+            print(f"Rate limit: waited {waited:.2f}s (queue depth {stats['queue_depth']})")
+        return chat_session, entry, estimated
+
+    def _settle(self, response, estimated):
+        usage = getattr(response, 'usage_metadata', None)
+        if usage and usage.total_token_count:
+            self.rate_limiter.settle(estimated, usage.total_token_count)
+
+    @staticmethod
+    def _part_events(part):
+        if part.text:
+            yield {"type": "text", "content": part.text}
+        if part.function_call:
+            args = {key: val for key, val in part.function_call.args.items()}
+            yield {"type": "function_call", "name": part.function_call.name, "args": args}
+
+    @staticmethod
+    def _event_text(event):
+        if event["type"] == "function_call":
+            args = ", ".join(f"{key}={val}" for key, val in event["args"].items())
+            return f"\nFunction call: {event['name']}({args})\n"
+        return event["content"]
+
+    def send_message(self, message, conversation_id=None, conversation=None):
+        chat_session, entry, estimated = self._prepare(message, conversation_id, conversation)
+
+        if entry is None:
+            response = chat_session.send_message(message)
+        else:
+            try:
+                with entry.lock:
+                    try:
+                        response = chat_session.send_message(message)
+                        # Still under the lock: another request may be
+                        # streaming into this history
+                        self.sessions.update_size(conversation_id)
+                    except BaseException:
+                        self.sessions.discard(conversation_id)
+                        raise
+            finally:
+                self.sessions.release(entry)
+
+        self._settle(response, estimated)
+        return "".join(
+            self._event_text(event)
+            for part in response.parts
+            for event in self._part_events(part)
+        )
+
+    def stream_message(self, message, conversation_id=None, conversation=None):
+        # Same as send_message, but yields text and function-call parts as
+        # Gemini generates them
+        chat_session, entry, estimated = self._prepare(message, conversation_id, conversation)
+
+        try:
+            with entry.lock if entry else nullcontext():
+                try:
+                    response = chat_session.send_message(message, stream=True)
+                    for chunk in response:
+                        for part in chunk.parts:
+                            yield from self._part_events(part)
+                    if entry is not None:
+                        # A stream stopped by SAFETY/RECITATION ends without an
+                        # error, but reading its history raises
+                        self.sessions.update_size(conversation_id)
+                except BaseException:
+                    # Interrupted or broken stream: the chat has no finished
+                    # turn and every later message would fail on it, so it is
+                    # rebuilt from the browser history next time
+                    if entry is not None:
+                        self.sessions.discard(conversation_id)
+                    raise
+        finally:
+            if entry is not None:
+                self.sessions.release(entry)
+        self._settle(response, estimated)
+
+    @staticmethod
+    def _sse(events):
+        def event_data(event):
+            return f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+        try:
+            for event in events:
+                yield event_data(event)
+            yield event_data({"type": "done"})
+        except Exception as e:
+            print(e)
+            yield event_data({"type": "error", "error": str(e)})
+
+    def _status(self):
+        return {"rate_limit": self.rate_limiter.stats(), "sessions": self.sessions.stats()}, 200
 
     def _conversation(self):
         try:
             prompt = request.json["meta"]["content"]["parts"][0]
+            conversation_id = request.json.get("conversation_id")
+            conversation = request.json["meta"]["content"].get("conversation")
+
+            # Streams Server-Sent Events when the client asks for them
+            if 'text/event-stream' in request.headers.get('Accept', ''):
+                events = self.stream_message(prompt["content"], conversation_id, conversation)
+                return Response(
+                    stream_with_context(self._sse(events)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                )
 
             # Send message
-            response = self.send_message(prompt["content"])
+            response = self.send_message(prompt["content"], conversation_id, conversation)
             if not response:
                 return {"success": False, "message": "Failed to get response from Gemini"}, 500
             return {"success": True, "response": response}, 200
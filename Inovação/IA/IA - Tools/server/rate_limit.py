@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # refill per second
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        # Seconds until `amount` is available (amounts above the capacity are
+        # capped, otherwise a single huge prompt would wait forever)
+        missing = min(amount, self.capacity) - self.available
+        return max(missing, 0.0) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    # Shared by every request thread: requests and tokens per minute, each one
+    # a token bucket. Callers wait only when a bucket is actually empty, in
+    # arrival order.
+
+    def __init__(self, requests_per_minute: float = 10, tokens_per_minute: float = 4_000_000) -> None:
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._total = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def acquire(self, estimated_tokens: int = 0) -> float:
+        # Blocks until the request fits in both budgets; returns the wait in seconds
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    if self._queue[0] is ticket:
+                        delay = max(self.requests.time_until(1), self.tokens.time_until(estimated_tokens))
+                        if delay <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(estimated_tokens)
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            self._total += 1
+            self._wait_last = waited
+            if waited > 0.001:
+                self._waited += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        # Corrects the token budget once the real usage is known
+        with self._cond:
+            self.tokens.refill(time.monotonic())
+            self.tokens.available = min(self.tokens.capacity, self.tokens.available + estimated_tokens - actual_tokens)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'requests': self._total,
+                'waited_requests': self._waited,
+                'avg_wait_ms': round(1000 * self._wait_total / self._waited, 1) if self._waited else 0.0,
+                'max_wait_ms': round(1000 * self._wait_max, 1),
+                'last_wait_ms': round(1000 * self._wait_last, 1),
+                'requests_available': int(self.requests.available),
+                'tokens_available': int(self.tokens.available),
+            }
+
+
+def estimate_tokens(*texts_or_bytes) -> int:
+    # About 4 characters per token; good enough to reserve budget up front
+    total = 0
+    for value in texts_or_bytes:
+        total += value if isinstance(value, int) else len(value or '')
+    return total // 4 + 1
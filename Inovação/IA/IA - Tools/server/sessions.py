@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Entry:
+    __slots__ = ('session', 'lock', 'last_used', 'users')
+
+    def __init__(self, session) -> None:
+        self.session = session
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.users = 0  # requests between acquire() and release()
+
+
+def estimate_session_bytes(session) -> int:
+    # Rough size of what the session keeps alive: the text and function call
+    # arguments of every turn in its history
+    total = 0
+    for message in session.history:
+        for part in message.parts:
+            if part.text:
+                total += len(part.text.encode('utf-8'))
+            if part.function_call:
+                total += len(str(dict(part.function_call.args)))
+    return total
+
+
+def history_from_client(conversation: list) -> list:
+    # Converts the conversation the browser keeps in localStorage into Gemini
+    # history, used only when the server no longer has the session
+    history = []
+    for message in conversation or []:
+        text = message.get('content')
+        if not text:
+            continue
+        role = 'user' if message.get('role') == 'user' else 'model'
+        history.append({'role': role, 'parts': [text]})
+    return history
+
+
+class ChatSessionStore:
+    def __init__(self, max_sessions: int = 200, ttl_seconds: float = 3600,
+                 max_memory_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, conversation_id: str, factory):
+        # Returns the conversation's entry, most recently used last; factory()
+        # builds a new chat session when there is none (or it expired). The
+        # entry is not evicted until every acquire() has its release().
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                entry = _Entry(factory())
+                self._entries[conversation_id] = entry
+                self._sizes[conversation_id] = 0
+            else:
+                self._entries.move_to_end(conversation_id)
+            entry.last_used = time.monotonic()
+            entry.users += 1
+            return entry
+
+    def release(self, entry) -> None:
+        with self._lock:
+            entry.users -= 1
+            entry.last_used = time.monotonic()
+
+    def update_size(self, conversation_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            self._sizes[conversation_id] = estimate_session_bytes(entry.session)
+            self._evict_over_capacity(keep=conversation_id)
+
+    def size(self, conversation_id: str) -> int:
+        with self._lock:
+            return self._sizes.get(conversation_id, 0)
+
+    def discard(self, conversation_id: str) -> None:
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+            self._sizes.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._entries),
+                'memory_bytes': sum(self._sizes.values()),
+            }
+
+    def _evict_expired(self) -> None:
+        deadline = time.monotonic() - self.ttl_seconds
+        # Entries are kept in LRU order, so expired ones are at the front;
+        # sessions still in use by a request are skipped
+        for conversation_id, entry in list(self._entries.items()):
+            if entry.last_used >= deadline:
+                break
+            if entry.users:
+                continue
+            del self._entries[conversation_id]
+            self._sizes.pop(conversation_id, None)
+
+    def _over_capacity(self) -> bool:
+        return (len(self._entries) > self.max_sessions
+                or sum(self._sizes.values()) > self.max_memory_bytes)
+
+    def _evict_over_capacity(self, keep: str) -> None:
+        # Least recently used first. Sessions in use by a request (and the one
+        # just updated) are never evicted, even if that leaves the store above
+        # the cap until they are released.
+        for conversation_id, entry in list(self._entries.items()):
+            if not self._over_capacity():
+                break
+            if conversation_id == keep or entry.users:
+                continue
+            del self._entries[conversation_id]
+            self._sizes.pop(conversation_id, None)